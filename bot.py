@@ -4,8 +4,13 @@ A comprehensive Discord bot with commands, moderation, music, AI, and more.
 """
 
 import os
+import io
 import asyncio
+import hashlib
+import json
 import logging
+import sys
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -13,17 +18,21 @@ import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from utils.log import setup_logging
+from database import Database
+from utils.metrics import LoopLagMonitor, TimedListenersMixin, metrics, start_metrics_server
+from utils.prefixes import MAX_PREFIX_LENGTH, PrefixCache
+from utils.reloader import CogReloader
+from utils.replies import choose_reply, needs_ai_response, route_message
+from utils.sharding import parse_shard_ids
+
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
+# Configure logging: writes happen on a background thread, per-message records are sampled
+log_listener = setup_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    sample_rates={'message': float(os.getenv('LOG_MESSAGE_SAMPLE_RATE', '0.01'))}
 )
 logger = logging.getLogger(__name__)
 
@@ -32,62 +41,180 @@ DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 BOT_PREFIX = os.getenv('BOT_PREFIX', '!')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Serve Prometheus text on localhost when set
+
+# Sharding: SHARDED=true lets Discord pick the shard count; SHARD_COUNT fixes it and
+# SHARD_IDS (e.g. "0-3") runs only those shards so several processes can split them
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS = parse_shard_ids(os.getenv('SHARD_IDS'))
+SHARDED = bool(SHARD_COUNT or SHARD_IDS) or os.getenv('SHARDED', '').lower() in ('1', 'true', 'yes')
+if SHARD_IDS and not SHARD_COUNT:
+    raise SystemExit('SHARD_IDS requires SHARD_COUNT to be set')
+
+# Cache footprint: MEMBER_CACHE=all keeps every member, voice keeps only members in
+# voice channels (enough for music), none keeps no members. CHUNK_GUILDS downloads
+# full member lists at startup and only makes sense with MEMBER_CACHE=all.
+MEMBER_CACHE = os.getenv('MEMBER_CACHE', 'all').lower()
+CHUNK_GUILDS = os.getenv('CHUNK_GUILDS', 'true' if MEMBER_CACHE == 'all' else 'false').lower() in ('1', 'true', 'yes')
+PRESENCE_INTENT = os.getenv('PRESENCE_INTENT', 'true').lower() in ('1', 'true', 'yes')
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', '1000'))
 
 # Intents
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-intents.presences = True
+intents.presences = PRESENCE_INTENT
+
+
+def member_cache_flags(policy):
+    """Build MemberCacheFlags for a MEMBER_CACHE policy."""
+    if policy == 'none':
+        return discord.MemberCacheFlags.none()
+    if policy == 'voice':
+        return discord.MemberCacheFlags(joined=False)
+    return discord.MemberCacheFlags.from_intents(intents)
+
+
+class InstrumentedBot(TimedListenersMixin, commands.AutoShardedBot if SHARDED else commands.Bot):
+    """Bot that times every event listener and counts listener errors."""
+    
+    async def setup_hook(self):
+        await startup()
+
+
+# Per-guild prefixes, resolved from memory for every message
+prefixes = PrefixCache(Database(), BOT_PREFIX)
 
 # Create bot instance
-bot = commands.Bot(
-    command_prefix=BOT_PREFIX,
+bot = InstrumentedBot(
+    command_prefix=prefixes,
     intents=intents,
+    # Sent with IDENTIFY, so the status survives reconnects without a change_presence call
+    activity=discord.Activity(type=discord.ActivityType.watching, name=f"{BOT_PREFIX}help for commands"),
     help_command=commands.DefaultHelpCommand(),
-    case_insensitive=True
+    case_insensitive=True,
+    member_cache_flags=member_cache_flags(MEMBER_CACHE),
+    chunk_guilds_at_startup=CHUNK_GUILDS,
+    max_messages=MESSAGE_CACHE_SIZE or None,
+    **({'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS} if SHARDED else {})
 )
 
+# Cogs check for commands with bot.prefixes.is_command(message)
+bot.prefixes = prefixes
+
 # Create necessary directories
 Path('data').mkdir(exist_ok=True)
 
+# Hash of the slash command tree at the last successful sync
+COMMAND_TREE_HASH_FILE = Path('data') / 'command_tree_hash.json'
 
-@bot.event
-async def on_ready():
-    """Called when the bot is ready and connected to Discord."""
-    logger.info(f'Bot is ready! Logged in as {bot.user.name}#{bot.user.discriminator}')
-    logger.info(f'Bot ID: {bot.user.id}')
-    logger.info(f'Connected to {len(bot.guilds)} guild(s)')
+SLOW_STAGE_SECONDS = 2.0  # Message stages slower than this are logged
+
+loop_lag = LoopLagMonitor(metrics)
+reloader = CogReloader(bot)
+metrics_runner = None
+
+
+async def startup():
+    """One-time startup, run from setup_hook before the gateway connects.
     
-    # Set bot status
-    await bot.change_presence(
-        activity=discord.Activity(
-            type=discord.ActivityType.watching,
-            name=f"{BOT_PREFIX}help for commands"
-        )
-    )
+    Reconnects only fire on_ready again, so none of this is repeated.
+    """
+    global metrics_runner
+    phases = {}
+    started = time.perf_counter()
+    
+    # Load custom prefixes before any message can arrive
+    phase_start = time.perf_counter()
+    prefixes.load()
+    phases['prefixes'] = time.perf_counter() - phase_start
     
     # Load cogs
+    phase_start = time.perf_counter()
     await load_cogs()
+    phases['cogs'] = time.perf_counter() - phase_start
+    
+    # Start instrumentation
+    phase_start = time.perf_counter()
+    loop_lag.start()
+    if METRICS_PORT:
+        try:
+            metrics_runner = await start_metrics_server(metrics, METRICS_PORT)
+            logger.info(f'Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics')
+        except OSError as e:
+            logger.error(f'Failed to start metrics server: {e}')
+    phases['metrics'] = time.perf_counter() - phase_start
+    
+    # Sync slash commands, only if they changed since the last sync. The tree is
+    # global, so with split shards only the process running shard 0 syncs it
+    phase_start = time.perf_counter()
+    if not SHARD_IDS or 0 in SHARD_IDS:
+        await sync_command_tree()
+    phases['sync'] = time.perf_counter() - phase_start
+    
+    breakdown = ', '.join(f'{name} {elapsed:.2f}s' for name, elapsed in phases.items())
+    logger.info(f'Startup took {time.perf_counter() - started:.2f}s ({breakdown})')
+
+
+def command_tree_hash():
+    """Stable hash of the global slash command tree as it would be sent to Discord."""
+    tree_commands = bot.tree.get_commands()
+    try:
+        payload = [command.to_dict(bot.tree) for command in tree_commands]
+    except TypeError:  # discord.py < 2.4 takes no tree argument
+        payload = [command.to_dict() for command in tree_commands]
+    payload.sort(key=lambda command: (command.get('type', 1), command['name']))
+    
+    # The application id is included so switching bot tokens forces a sync
+    data = json.dumps({'application_id': bot.application_id, 'commands': payload},
+                      sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+async def sync_command_tree(force=False):
+    """Sync slash commands if the tree hash differs from the last successful sync.
+    
+    Returns the number of commands synced, or None if the sync was skipped or failed.
+    """
+    tree_hash = command_tree_hash()
+    try:
+        stored = json.loads(COMMAND_TREE_HASH_FILE.read_text()).get('hash')
+    except (OSError, ValueError):
+        stored = None
+    
+    if not force and stored == tree_hash:
+        logger.info('Slash commands unchanged, skipping sync')
+        return None
     
-    # Sync slash commands
     try:
         synced = await bot.tree.sync()
-        logger.info(f'Synced {len(synced)} slash command(s)')
     except Exception as e:
         logger.error(f'Failed to sync slash commands: {e}')
+        return None
+    
+    COMMAND_TREE_HASH_FILE.write_text(json.dumps({'hash': tree_hash}))
+    logger.info(f'Synced {len(synced)} slash command(s)')
+    return len(synced)
+
+
+@bot.event
+async def on_ready():
+    """Called when the bot is ready and connected to Discord (again after every reconnect)."""
+    logger.info(f'Bot is ready! Logged in as {bot.user.name}#{bot.user.discriminator}')
+    logger.info(f'Bot ID: {bot.user.id}')
+    logger.info(f'Connected to {len(bot.guilds)} guild(s)')
+    if SHARDED:
+        logger.info(f'Running shard(s) {SHARD_IDS or "all"} of {bot.shard_count}')
 
 
 async def load_cogs():
-    """Load all command cogs."""
-    cogs_dir = Path('cogs')
-    if cogs_dir.exists():
-        for file in cogs_dir.glob('*.py'):
-            if file.name != '__init__.py':
-                try:
-                    await bot.load_extension(f'cogs.{file.stem}')
-                    logger.info(f'Loaded cog: {file.stem}')
-                except Exception as e:
-                    logger.error(f'Failed to load cog {file.stem}: {e}')
+    """Load all command cogs concurrently."""
+    for name, result in (await reloader.load_all()).items():
+        cog = name.split(".", 1)[1]
+        if isinstance(result, Exception):
+            logger.error(f'Failed to load cog {cog}: {result}')
+        else:
+            logger.info(f'Loaded cog: {cog} ({result * 1000:.0f}ms)')
 
 
 @bot.event
@@ -100,12 +227,12 @@ async def on_guild_join(guild):
         embed = discord.Embed(
             title="Thanks for inviting me! 🎉",
             description=f"Hi! I'm {bot.user.name}, a feature-rich Discord bot.\n\n"
-                       f"Use `{BOT_PREFIX}help` to see all available commands!",
+                       f"Use `{prefixes.get(guild.id)}help` to see all available commands!",
             color=discord.Color.green()
         )
         embed.add_field(
             name="Quick Start",
-            value=f"Try `{BOT_PREFIX}hello` to greet me!",
+            value=f"Try `{prefixes.get(guild.id)}hello` to greet me!",
             inline=False
         )
         try:
@@ -135,22 +262,21 @@ async def on_member_join(member):
             pass
 
 
-@bot.event
-async def on_message(message):
-    """Process all messages."""
-    # Don't process messages from bots
-    if message.author.bot:
-        return
-    
-    # Debug logging to verify messages are received
-    logger.info(f"Received message from {message.author} in {message.channel.name}: {message.content}")
-    
-    # Process commands FIRST - this should only happen once!
-    await bot.process_commands(message)
-    
-    # If the message was a command, stop here to avoid double-processing
-    ctx = await bot.get_context(message)
-    if ctx.valid:
+async def run_stage(name, coro):
+    """Run one message pipeline stage, recording how long it took."""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe('message_stage_seconds', elapsed, (name,))
+        if elapsed > SLOW_STAGE_SECONDS:
+            logger.warning(f"Slow message stage '{name}': {elapsed:.2f}s")
+
+
+async def ai_reply_stage(message, content, content_lower, tokens):
+    """Reply with the AI cog when a message looks like it wants an answer."""
+    if not needs_ai_response(content, content_lower, tokens):
         return
     
     # Get the AI cog instance
@@ -158,170 +284,88 @@ async def on_message(message):
     if not ai_cog:
         logger.warning("AI cog not loaded")
         return
+    
+    async with message.channel.typing():
+        response = await ai_cog.get_ai_response(content)
+        if not response.startswith("❌"):
+            embed = discord.Embed(
+                description=response,
+                color=discord.Color.blue()
+            )
+            await message.reply(embed=embed, mention_author=False)
+
+
+async def auto_reply_stage(message, words):
+    """Smart positive word detection with contextual responses."""
+    response = choose_reply(words, message.author.mention)
+    if response:
+        try:
+            await message.channel.send(response)
+        except (discord.Forbidden, discord.HTTPException):
+            pass
 
-    content = message.content.strip()
-    if not content or content.startswith(bot.command_prefix):
-        return
 
-    # Check if message needs an AI response (questions, emotional expressions, or statements)
-    needs_response = any([
-        # Questions
-        any(word in content.lower().split() for word in ['who', 'what', 'when', 'where', 'why', 'how']),
-        '?' in content,
-        any(phrase in content.lower() for phrase in ['tell me about', 'explain', 'what is', 'who is']),
-        
-        # Emotional expressions
-        any(word in content.lower() for word in ['angry', 'happy', 'sad', 'excited', 'bored', 'tired']),
-        content.lower().startswith(('i am ', 'i\'m ', 'i feel ')),
-        
-        # General statements that might need a response
-        len(content.split()) > 3 and not content.endswith(('.', '!', '?')),  # Longer statements without punctuation
-        any(word in content.lower() for word in ['fabulous', 'amazing', 'great', 'awesome'])
-    ])
-
-    if needs_response:
-        async with message.channel.typing():
-            response = await ai_cog.get_ai_response(content)
-            if not response.startswith("❌"):
-                embed = discord.Embed(
-                    description=response,
-                    color=discord.Color.blue()
-                )
-                await message.reply(embed=embed, mention_author=False)
-    
-    # Smart positive word detection with contextual responses
-    # Dictionary mapping words to their contextual responses
-    word_responses = {
-        # Excitement words
-        'wow': [f'Wow {message.author.mention}! 😲', f'Amazing {message.author.mention}! ✨', f'That\'s awesome {message.author.mention}! 🎉'],
-        'woah': [f'Woah {message.author.mention}! 😲', f'Wow {message.author.mention}! ✨'],
-        'whoa': [f'Whoa {message.author.mention}! 😲', f'Amazing {message.author.mention}! ✨'],
-        'amazing': [f'Amazing {message.author.mention}! ✨', f'You\'re amazing too {message.author.mention}! 🌟'],
-        'awesome': [f'Awesome {message.author.mention}! 🔥', f'You\'re awesome too {message.author.mention}! 😎'],
-        'fantastic': [f'Fantastic {message.author.mention}! 🌈', f'That\'s fantastic {message.author.mention}! 🎊'],
-        'incredible': [f'Incredible {message.author.mention}! 🔥', f'That\'s incredible {message.author.mention}! 🌟'],
-        'brilliant': [f'Brilliant {message.author.mention}! 💡', f'That\'s brilliant {message.author.mention}! 🌟'],
-        'wonderful': [f'Wonderful {message.author.mention}! 🌈', f'That\'s wonderful {message.author.mention}! ✨'],
-        'super': [f'Super {message.author.mention}! 🚀', f'That\'s super {message.author.mention}! ✨'],
-        'sweet': [f'Sweet {message.author.mention}! 🍬', f'That\'s sweet {message.author.mention}! 😊'],
-        'epic': [f'Epic {message.author.mention}! 🎮', f'That\'s epic {message.author.mention}! 🔥'],
-        'legendary': [f'Legendary {message.author.mention}! 💎', f'That\'s legendary {message.author.mention}! 🌟'],
-        'marvelous': [f'Marvelous {message.author.mention}! ✨', f'That\'s marvelous {message.author.mention}! 🌟'],
-        'magnificent': [f'Magnificent {message.author.mention}! 👑', f'That\'s magnificent {message.author.mention}! 🌟'],
-        
-        # Praise words
-        'great': [f'Great {message.author.mention}! 👍', f'That\'s great {message.author.mention}! 🎊'],
-        'good': [f'That\'s good {message.author.mention}! 👍', f'Good {message.author.mention}! 😊'],
-        'nice': [f'Nice {message.author.mention}! 😊', f'That\'s nice {message.author.mention}! ✨'],
-        'cool': [f'Cool {message.author.mention}! 😎', f'That\'s cool {message.author.mention}! ✨'],
-        'excellent': [f'Excellent {message.author.mention}! 🎯', f'Great job {message.author.mention}! 🌟'],
-        'perfect': [f'Perfect {message.author.mention}! ✅', f'That\'s perfect {message.author.mention}! ✨'],
-        'outstanding': [f'Outstanding {message.author.mention}! 🏆', f'That\'s outstanding {message.author.mention}! 🌟'],
-        'remarkable': [f'Remarkable {message.author.mention}! ✨', f'That\'s remarkable {message.author.mention}! 🌟'],
-        'splendid': [f'Splendid {message.author.mention}! 🌟', f'That\'s splendid {message.author.mention}! ✨'],
-        'terrific': [f'Terrific {message.author.mention}! 🎉', f'That\'s terrific {message.author.mention}! 🌟'],
-        'fabulous': [f'Fabulous {message.author.mention}! ✨', f'That\'s fabulous {message.author.mention}! 🌈'],
-        'phenomenal': [f'Phenomenal {message.author.mention}! 🔥', f'That\'s phenomenal {message.author.mention}! 🌟'],
-        'spectacular': [f'Spectacular {message.author.mention}! 🎆', f'That\'s spectacular {message.author.mention}! ✨'],
-        
-        # Achievement words
-        'congrats': [f'Congratulations {message.author.mention}! 🎉🎊', f'Well done {message.author.mention}! 👏', f'Congrats {message.author.mention}! 🏆'],
-        'congratulations': [f'Congratulations {message.author.mention}! 🎉🎊', f'Amazing achievement {message.author.mention}! 🏆'],
-        'bravo': [f'Bravo {message.author.mention}! 👏', f'Well done {message.author.mention}! 🎉'],
-        'kudos': [f'Kudos {message.author.mention}! 👏', f'Great job {message.author.mention}! 🌟'],
-        
-        # Appreciation words
-        'thanks': [f'You\'re welcome {message.author.mention}! 😊', f'Happy to help {message.author.mention}! 🙌', f'Any time {message.author.mention}! 💙'],
-        'thank': [f'You\'re welcome {message.author.mention}! 😊', f'Happy to help {message.author.mention}! 🙌'],
-        'appreciate': [f'You\'re welcome {message.author.mention}! 😊', f'Happy to help {message.author.mention}! 🙌'],
-        
-        # Agreement words
-        'yeah': [f'Yeah {message.author.mention}! 👍', f'Right on {message.author.mention}! ✨'],
-        'yes': [f'Great {message.author.mention}! 👍', f'Awesome {message.author.mention}! 😊'],
-        'yay': [f'Yay {message.author.mention}! 🎉', f'That\'s great {message.author.mention}! 🌟'],
-        'yep': [f'Yep {message.author.mention}! 👍', f'Right on {message.author.mention}! ✨'],
-        'yup': [f'Yup {message.author.mention}! 👍', f'Exactly {message.author.mention}! 🎯'],
-        'okay': [f'Okay {message.author.mention}! 👍', f'Sounds good {message.author.mention}! 😊'],
-        'ok': [f'Okay {message.author.mention}! 👍', f'Sounds good {message.author.mention}! 😊'],
-        
-        # Fun words
-        'fun': [f'Glad you\'re having fun {message.author.mention}! 🎮', f'Fun is the best {message.author.mention}! 🎈'],
-        'enjoy': [f'Glad you\'re enjoying {message.author.mention}! 🎉', f'Enjoy {message.author.mention}! 🎈'],
-        'enjoying': [f'Glad you\'re enjoying {message.author.mention}! 🎉', f'That\'s great {message.author.mention}! 🎈'],
-        'loved': [f'Glad you loved it {message.author.mention}! ❤️', f'That\'s wonderful {message.author.mention}! 💙'],
-        'love': [f'Love it too {message.author.mention}! ❤️', f'That\'s awesome {message.author.mention}! 💙'],
-        'loving': [f'Glad you\'re loving it {message.author.mention}! ❤️', f'That\'s great {message.author.mention}! 💙'],
-        
-        # Surprise words (including common misspellings)
-        'surprise': [f'Surprise! {message.author.mention}! 🎁', f'Wow {message.author.mention}! That\'s surprising! 😲'],
-        'surprised': [f'Surprised {message.author.mention}? 😲', f'That\'s surprising {message.author.mention}! ✨'],
-        'surprising': [f'That\'s surprising {message.author.mention}! 😲', f'Amazing {message.author.mention}! ✨'],
-        'shocked': [f'Shocked {message.author.mention}? 😲', f'That\'s shocking {message.author.mention}! ⚡'],
-        'shocking': [f'That\'s shocking {message.author.mention}! ⚡', f'Wow {message.author.mention}! 😲'],
-        'shoked': [f'Shocked {message.author.mention}? 😲', f'That\'s shocking {message.author.mention}! ⚡'],  # Common misspelling
-        'shokd': [f'Shocked {message.author.mention}? 😲', f'That\'s shocking {message.author.mention}! ⚡'],  # Common misspelling
-        
-        # Emotion words
-        'happy': [f'Glad you\'re happy {message.author.mention}! 😊', f'Happiness is great {message.author.mention}! 🌈'],
-        'happiness': [f'Happiness is wonderful {message.author.mention}! 😊', f'That\'s great {message.author.mention}! 🌈'],
-        'joy': [f'Joy is amazing {message.author.mention}! 😊', f'Glad you feel joy {message.author.mention}! 🌈'],
-        'joyful': [f'Joyful {message.author.mention}! 😊', f'That\'s wonderful {message.author.mention}! 🌈'],
-        'excited': [f'Excited {message.author.mention}? 🎉', f'That\'s exciting {message.author.mention}! ✨'],
-        'exciting': [f'That\'s exciting {message.author.mention}! 🎉', f'Great {message.author.mention}! ✨'],
-        'thrilled': [f'Thrilled {message.author.mention}? 🎉', f'That\'s thrilling {message.author.mention}! ✨'],
-        'thrilling': [f'That\'s thrilling {message.author.mention}! 🎉', f'Great {message.author.mention}! ✨'],
-        'proud': [f'Proud of you {message.author.mention}! 👏', f'That\'s something to be proud of {message.author.mention}! 🌟'],
-        'pleased': [f'Pleased {message.author.mention}? 😊', f'That\'s great {message.author.mention}! ✨'],
-        'delighted': [f'Delighted {message.author.mention}? 😊', f'That\'s wonderful {message.author.mention}! 🌟'],
-        'glad': [f'Glad to hear {message.author.mention}! 😊', f'That\'s great {message.author.mention}! ✨'],
-        'ecstatic': [f'Ecstatic {message.author.mention}? 🎉', f'That\'s amazing {message.author.mention}! ✨'],
-        'overjoyed': [f'Overjoyed {message.author.mention}? 🎉', f'That\'s wonderful {message.author.mention}! 🌟'],
-        
-        # Lucky words
-        'lucky': [f'Lucky {message.author.mention}! 🍀', f'That\'s lucky {message.author.mention}! ✨'],
-        'luck': [f'Good luck {message.author.mention}! 🍀', f'That\'s lucky {message.author.mention}! ✨'],
-        'fortune': [f'Fortune {message.author.mention}! 🍀', f'That\'s fortunate {message.author.mention}! ✨'],
-    }
-    
-    # Negative words that should NOT trigger responses
-    negative_words = {'sad', 'angry', 'bad', 'terrible', 'awful', 'horrible', 'disappointed', 
-                     'upset', 'mad', 'hate', 'hated', 'depressed', 'lonely', 'tired', 'exhausted',
-                     'bored', 'annoyed', 'frustrated', 'worried', 'scared', 'afraid', 'fear'}
-    
-    # Check if message contains negative words first - don't respond if it does
-    words_in_message = set(content_lower.split())
-    if negative_words.intersection(words_in_message):
-        # Contains negative words - don't respond positively
-        return
+@bot.event
+async def on_message(message):
+    """Process all messages.
     
-    # Find the best matching word (prioritize longer/more specific words)
-    matched_word = None
-    matched_responses = None
+    The context is built once: prefixed messages go to command invocation,
+    everything else to the conversational stages.
+    """
+    # Don't process messages from bots
+    if message.author.bot:
+        return
     
-    # Check for exact matches first (prioritize longer words for better specificity)
-    for word in sorted(word_responses.keys(), key=len, reverse=True):
-        if word in words_in_message:
-            matched_word = word
-            matched_responses = word_responses[word]
-            break
+    # Sampled, structured record that messages are being received
+    logger.info("Received message", extra={
+        'category': 'message',
+        'guild_id': message.guild.id if message.guild else None,
+        'channel_id': message.channel.id,
+        'author_id': message.author.id,
+        'length': len(message.content)
+    })
     
-    if matched_word and matched_responses:
-        import random
-        try:
-            await message.channel.send(random.choice(matched_responses))
-        except (discord.Forbidden, discord.HTTPException):
-            pass
+    ctx = await run_stage('context', bot.get_context(message))
+    route = route_message(message.content, ctx.prefix)
+    if route == 'command':
+        # Unknown commands still reach on_command_error as CommandNotFound
+        await run_stage('command', bot.invoke(ctx))
         return
+    if route is None:
+        return
+    
+    content = message.content.strip()
+    content_lower = content.lower()
+    tokens = content_lower.split()
+    
+    await run_stage('ai_reply', ai_reply_stage(message, content, content_lower, tokens))
+    await run_stage('auto_reply', auto_reply_stage(message, set(tokens)))
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    started_at = getattr(ctx, 'started_at', None)
+    if started_at is not None:
+        metrics.observe('command_seconds', time.perf_counter() - started_at, (ctx.command.qualified_name,))
 
 
 @bot.event
 async def on_command_error(ctx, error):
     """Handle command errors."""
+    command = ctx.command.qualified_name if ctx.command else None
+    if command:
+        metrics.inc('command_errors_total', (command, type(error).__name__))
+    
     if isinstance(error, commands.CommandNotFound):
         # Silently ignore unknown commands
         return
     elif isinstance(error, commands.MissingRequiredArgument):
-        await ctx.send(f"❌ Missing required argument. Use `{BOT_PREFIX}help {ctx.command.name}` for usage.")
+        await ctx.send(f"❌ Missing required argument. Use `{ctx.clean_prefix}help {ctx.command.name}` for usage.")
     elif isinstance(error, commands.MissingPermissions):
         await ctx.send("❌ You don't have permission to use this command.")
     elif isinstance(error, commands.CommandOnCooldown):
@@ -335,36 +379,187 @@ async def on_command_error(ctx, error):
 
 @bot.command(name='reload', aliases=['rl'])
 @commands.is_owner()
-async def reload_cogs(ctx):
-    """Reload all cogs (owner only)."""
-    cogs_dir = Path('cogs')
-    reloaded = []
-    failed = []
-    
-    for file in cogs_dir.glob('*.py'):
-        if file.name != '__init__.py':
+async def reload_cogs(ctx, target: str = None):
+    """Reload changed cogs (owner only). Usage: !reload [cog|all]"""
+    changed, added, removed = reloader.plan()
+    if target == 'all':
+        changed = [name for name in reloader.discover() if name in bot.extensions]
+    elif target:
+        name = target if target.startswith('cogs.') else f'cogs.{target}'
+        if name not in bot.extensions:
+            await ctx.send(f"❌ Cog `{target}` is not loaded.")
+            return
+        changed, added, removed = [name], [], []
+    
+    results = {'✅ Reloaded': [], '🆕 Loaded': [], '🗑️ Unloaded': [], '❌ Failed': []}
+    for names, action, label in ((changed, reloader.reload, '✅ Reloaded'),
+                                 (added, reloader.load, '🆕 Loaded'),
+                                 (removed, reloader.unload, '🗑️ Unloaded')):
+        for name in names:
             try:
-                await bot.reload_extension(f'cogs.{file.stem}')
-                reloaded.append(file.stem)
+                await action(name)
+                results[label].append(name.split('.', 1)[1])
             except Exception as e:
-                failed.append(f"{file.stem}: {str(e)}")
+                results['❌ Failed'].append(f"{name.split('.', 1)[1]}: {str(e)}")
     
     embed = discord.Embed(title="Cog Reload Status", color=discord.Color.blue())
-    if reloaded:
-        embed.add_field(name="✅ Reloaded", value="\n".join(reloaded), inline=False)
-    if failed:
-        embed.add_field(name="❌ Failed", value="\n".join(failed), inline=False)
+    for label, names in results.items():
+        if names:
+            embed.add_field(name=label, value="\n".join(names), inline=False)
+    if not any(results.values()):
+        embed.description = "No cogs changed."
     
     await ctx.send(embed=embed)
 
 
+def format_latency(seconds):
+    return f"{seconds * 1000:.1f}ms"
+
+
+def summarize_histograms(name, limit, key=lambda h: h.quantile(0.95)):
+    """Format the slowest series of a histogram as 'label: p50 / p95 / max (count)' lines."""
+    series = sorted(metrics.histograms.get(name, {}).items(), key=lambda item: key(item[1]), reverse=True)
+    lines = [
+        f"`{' '.join(labels[-1:]) or name}` {format_latency(h.quantile(0.5))} / "
+        f"{format_latency(h.quantile(0.95))} / {format_latency(h.max)} ({h.count:,})"
+        for labels, h in series[:limit]
+    ]
+    return "\n".join(lines) or "No data yet"
+
+
+@bot.command(name='perf', aliases=['metrics'])
+@commands.is_owner()
+async def perf(ctx, export: str = None):
+    """Show latency and error metrics (owner only). Usage: !perf [prom]"""
+    if export == 'prom':
+        text = metrics.render_prometheus()
+        await ctx.send(file=discord.File(io.BytesIO(text.encode()), filename='metrics.txt'))
+        return
+    
+    embed = discord.Embed(title="📈 Performance", color=discord.Color.blue())
+    
+    lag = metrics.histograms.get('event_loop_lag_seconds', {}).get(())
+    if lag:
+        embed.add_field(
+            name="⏱️ Event Loop Lag",
+            value=f"now {format_latency(loop_lag.last)} | p99 {format_latency(lag.quantile(0.99))} | max {format_latency(lag.max)}",
+            inline=False
+        )
+    
+    embed.add_field(name="🎧 Slowest Listeners (p50 / p95 / max)", value=summarize_histograms('event_handler_seconds', 8), inline=False)
+    embed.add_field(name="⌨️ Slowest Commands (p50 / p95 / max)", value=summarize_histograms('command_seconds', 8), inline=False)
+    embed.add_field(name="💬 Message Stages (p50 / p95 / max)", value=summarize_histograms('message_stage_seconds', 5), inline=False)
+    
+    errors = [
+        (labels, count) for name in ('event_errors_total', 'command_errors_total')
+        for labels, count in metrics.counters.get(name, {}).items()
+    ]
+    errors.sort(key=lambda item: item[1], reverse=True)
+    embed.add_field(
+        name="❌ Errors",
+        value="\n".join(f"`{' / '.join(labels)}` {count:,}" for labels, count in errors[:8]) or "None",
+        inline=False
+    )
+    embed.set_footer(text="Use !perf prom for the full Prometheus export")
+    await ctx.send(embed=embed)
+
+
+def process_memory():
+    """Resident memory of this process, where the platform reports it."""
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        return f"{rss / 2 ** 20:.1f} MB resident"
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return "Unavailable"
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return f"{peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10):.1f} MB peak"
+
+
+@bot.command(name='memory', aliases=['mem'])
+@commands.is_owner()
+async def memory(ctx, limit: int = 10):
+    """Show cache sizes overall and per guild (owner only). Usage: !memory [count]"""
+    guilds = sorted(bot.guilds, key=lambda guild: len(guild.members), reverse=True)
+    cached_members = sum(len(guild.members) for guild in guilds)
+    total_members = sum(guild.member_count or 0 for guild in guilds)
+    
+    embed = discord.Embed(title="🧠 Memory", color=discord.Color.blue())
+    embed.add_field(name="💾 Process", value=process_memory(), inline=False)
+    embed.add_field(
+        name="📦 Caches",
+        value=(
+            f"Guilds: {len(guilds):,}\n"
+            f"Members: {cached_members:,} / {total_members:,}\n"
+            f"Users: {len(bot.users):,}\n"
+            f"Messages: {len(bot.cached_messages):,} / {MESSAGE_CACHE_SIZE:,}"
+        ),
+        inline=False
+    )
+    
+    lines = [
+        f"`{guild.name[:24]}` {len(guild.members):,} / {guild.member_count or 0:,}"
+        + ("" if guild.chunked else " (partial)")
+        for guild in guilds[:max(1, min(limit, 25))]
+    ]
+    embed.add_field(name="🏠 Largest Guilds (cached / total members)", value="\n".join(lines) or "None", inline=False)
+    embed.set_footer(
+        text=f"Member cache: {MEMBER_CACHE} | Chunk at startup: {CHUNK_GUILDS} | Presences: {PRESENCE_INTENT}"
+    )
+    await ctx.send(embed=embed)
+
+
+@bot.command(name='sync')
+@commands.is_owner()
+async def sync_commands(ctx):
+    """Force a slash command sync (owner only)."""
+    async with ctx.typing():
+        synced = await sync_command_tree(force=True)
+    if synced is None:
+        await ctx.send("❌ Slash command sync failed. Check the logs.")
+    else:
+        await ctx.send(f"✅ Synced {synced} slash command(s).")
+
+
+@bot.command(name='prefix')
+@commands.guild_only()
+async def prefix(ctx, new_prefix: str = None):
+    """Show or change this server's command prefix. Usage: !prefix [new|reset]"""
+    if new_prefix is None:
+        await ctx.send(f"ℹ️ The prefix here is `{prefixes.get(ctx.guild.id)}`.")
+        return
+    
+    if not ctx.author.guild_permissions.manage_guild:
+        await ctx.send("❌ You need the Manage Server permission to change the prefix.")
+        return
+    
+    if new_prefix.lower() == 'reset':
+        new_prefix = BOT_PREFIX
+    if len(new_prefix) > MAX_PREFIX_LENGTH or any(char.isspace() for char in new_prefix):
+        await ctx.send(f"❌ Prefixes can be at most {MAX_PREFIX_LENGTH} characters with no spaces.")
+        return
+    
+    prefixes.set(ctx.guild.id, new_prefix)
+    await ctx.send(f"✅ Prefix set to `{new_prefix}`.")
+
+
 @bot.command(name='ping')
 async def ping(ctx):
     """Check bot latency."""
     latency = round(bot.latency * 1000)
+    description = f"Latency: {latency}ms"
+    if SHARDED and ctx.guild:
+        shard = bot.get_shard(ctx.guild.shard_id)
+        if shard:
+            description += f"\nShard {shard.id}: {round(shard.latency * 1000)}ms"
     embed = discord.Embed(
         title="🏓 Pong!",
-        description=f"Latency: {latency}ms",
+        description=description,
         color=discord.Color.green()
     )
     await ctx.send(embed=embed)
@@ -406,11 +601,14 @@ def main():
         return
     
     try:
-        bot.run(DISCORD_TOKEN)
+        # Logging is already configured; stop discord.py from adding its own handler
+        bot.run(DISCORD_TOKEN, log_handler=None)
     except discord.LoginFailure:
         logger.error("Invalid token! Please check your DISCORD_TOKEN in .env")
     except Exception as e:
         logger.error(f"Error starting bot: {e}", exc_info=True)
+    finally:
+        log_listener.stop()
 
 
 if __name__ == '__main__':
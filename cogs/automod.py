@@ -0,0 +1,134 @@
+"""
+Auto Moderation Cog
+Detects message spam and times out offenders automatically.
+"""
+
+import discord
+from discord.ext import commands
+import asyncio
+import time
+from database import Database
+from utils.spam import SpamDetector
+
+AUTOMOD_TIMEOUT = 300  # Seconds an offender is timed out for
+AUTOMOD_IDLE_SECONDS = 120  # Windows idle this long are evicted
+AUTOMOD_EVICT_INTERVAL = 300
+
+
+class AutoMod(commands.Cog):
+    """Automatic spam moderation."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = Database()
+        self.detector = SpamDetector()
+        self.enabled = {}  # guild_id -> bool, mirrors server_settings.auto_mod_enabled
+        self.actions = 0
+        self.evict_task = self.bot.loop.create_task(self.evict_idle())
+
+    def is_enabled(self, guild_id):
+        """Check whether automod is on for a guild, reading the database once per guild."""
+        enabled = self.enabled.get(guild_id)
+        if enabled is None:
+            settings = self.db.get_server_settings(guild_id)
+            enabled = self.enabled[guild_id] = bool(settings.get('auto_mod_enabled'))
+        return enabled
+
+    async def evict_idle(self):
+        """Background task to drop windows for users who stopped talking."""
+        await self.bot.wait_until_ready()
+
+        while not self.bot.is_closed():
+            await asyncio.sleep(AUTOMOD_EVICT_INTERVAL)
+            self.detector.evict(time.monotonic() - AUTOMOD_IDLE_SECONDS)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """Check every guild message against the spam thresholds."""
+        if message.author.bot or not message.guild:
+            return
+
+        if not self.is_enabled(message.guild.id):
+            return
+
+        # Moderators are exempt
+        if message.author.guild_permissions.manage_messages:
+            return
+
+        key = (message.guild.id, message.author.id)
+        reason = self.detector.check(
+            key, time.monotonic(), message.content,
+            len(message.raw_mentions) + len(message.raw_role_mentions)
+        )
+        if reason:
+            self.detector.reset(key)
+            await self.punish(message, reason)
+
+    async def punish(self, message, reason):
+        """Time out a spammer through the Moderation cog."""
+        moderation = self.bot.get_cog('Moderation')
+        if not moderation:
+            return
+
+        try:
+            await moderation.apply_timeout(message.author, AUTOMOD_TIMEOUT, f"[AutoMod] {reason}", self.bot.user)
+            self.actions += 1
+        except (discord.Forbidden, discord.HTTPException):
+            return
+
+        embed = discord.Embed(
+            title="🛡️ AutoMod",
+            description=f"{message.author.mention} has been timed out for {AUTOMOD_TIMEOUT // 60} minutes.",
+            color=discord.Color.orange()
+        )
+        embed.add_field(name="Reason", value=reason, inline=False)
+        try:
+            await message.channel.send(embed=embed)
+        except (discord.Forbidden, discord.HTTPException):
+            pass
+
+    @commands.group(name='automod', invoke_without_command=True)
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def automod(self, ctx):
+        """Show automod status. Usage: !automod [on|off|stats]"""
+        status = "🟢 Enabled" if self.is_enabled(ctx.guild.id) else "🔴 Disabled"
+        d = self.detector
+
+        embed = discord.Embed(title="🛡️ AutoMod", description=status, color=discord.Color.blue())
+        embed.add_field(name="Flood", value=f"{d.max_messages} msgs / {d.rate_window:g}s", inline=True)
+        embed.add_field(name="Duplicates", value=f"{d.max_duplicates} / {d.duplicate_window:g}s", inline=True)
+        embed.add_field(name="Mentions", value=f"{d.max_mentions} / {d.mention_window:g}s", inline=True)
+        embed.add_field(name="Action", value=f"Timeout for {AUTOMOD_TIMEOUT // 60} minutes", inline=False)
+        await ctx.send(embed=embed)
+
+    @automod.command(name='on', aliases=['enable'])
+    async def automod_on(self, ctx):
+        """Enable automod for this server."""
+        self.db.update_server_settings(ctx.guild.id, auto_mod_enabled=1)
+        self.enabled[ctx.guild.id] = True
+        await ctx.send("✅ AutoMod enabled.")
+
+    @automod.command(name='off', aliases=['disable'])
+    async def automod_off(self, ctx):
+        """Disable automod for this server."""
+        self.db.update_server_settings(ctx.guild.id, auto_mod_enabled=0)
+        self.enabled[ctx.guild.id] = False
+        await ctx.send("✅ AutoMod disabled.")
+
+    @automod.command(name='stats', aliases=['memory'])
+    async def automod_stats(self, ctx):
+        """Show automod tracking and memory statistics."""
+        embed = discord.Embed(title="🛡️ AutoMod Stats", color=discord.Color.blue())
+        embed.add_field(name="Tracked Users", value=f"{len(self.detector.windows):,}", inline=True)
+        embed.add_field(name="Memory", value=f"{self.detector.footprint() / 1024:,.1f} KiB", inline=True)
+        embed.add_field(name="Timeouts Issued", value=f"{self.actions:,}", inline=True)
+        await ctx.send(embed=embed)
+
+    def cog_unload(self):
+        """Stop the eviction task."""
+        self.evict_task.cancel()
+
+
+async def setup(bot):
+    await bot.add_cog(AutoMod(bot))
@@ -9,7 +9,41 @@ import aiohttp
 import json
 import os
 import asyncio
+import time
 from pathlib import Path
+from utils.memes import MEME_REFRESH_INTERVAL, MemeService
+from utils.presence import PresenceCounter
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.gifv', '.webp')
+
+
+def build_meme_embed(post, subreddit):
+    """Render a Reddit post as a meme embed."""
+    embed = discord.Embed(
+        title=post.get('title', 'Meme')[:256],  # Discord limit
+        url=f"https://reddit.com{post.get('permalink', '')}",
+        color=discord.Color.orange()
+    )
+    
+    # Handle image or video
+    post_url = post.get('url', '')
+    if post_url:
+        if post_url.endswith(IMAGE_EXTENSIONS) or 'i.redd.it' in post_url or 'imgur.com' in post_url:
+            embed.set_image(url=post_url)
+        elif post.get('preview') and post['preview'].get('images'):
+            # Try to get preview image
+            try:
+                images = post['preview']['images'][0]['source']['url']
+                embed.set_image(url=images.replace('&amp;', '&'))
+            except (KeyError, IndexError):
+                embed.description = f"[View Content]({post_url})"
+        else:
+            embed.description = f"[View Content]({post_url})"
+    
+    upvotes = post.get('ups', 0) or 0
+    comments = post.get('num_comments', 0) or 0
+    embed.set_footer(text=f"👍 {upvotes:,} | 💬 {comments:,} | r/{subreddit}")
+    return embed
 
 
 class BasicCommands(commands.Cog):
@@ -19,6 +53,22 @@ class BasicCommands(commands.Cog):
         self.bot = bot
         self.data_dir = Path('data')
         self.data_dir.mkdir(exist_ok=True)
+        self.memes = MemeService()
+        self.presence = PresenceCounter()
+        self.meme_task = self.bot.loop.create_task(self.refresh_memes())
+    
+    async def refresh_memes(self):
+        """Background task to pre-warm and refill meme pools."""
+        await self.bot.wait_until_ready()
+        self.memes.last_used.setdefault('memes', time.monotonic())
+        
+        while not self.bot.is_closed():
+            try:
+                await self.memes.refresh_stale()
+            except Exception as e:
+                print(f"Error refreshing meme pools: {e}")
+            
+            await asyncio.sleep(MEME_REFRESH_INTERVAL)
     
     @commands.command(name='hello', aliases=['hi', 'hey'])
     async def hello(self, ctx):
@@ -39,201 +89,64 @@ class BasicCommands(commands.Cog):
         if subreddit is None:
             subreddit = 'memes'
         
-        # Use typing() instead of trigger_typing() for discord.py 2.x
-        async with ctx.typing():
-            try:
-                async with aiohttp.ClientSession() as session:
-                    # Import random for selecting random posts
-                    import random
-                    import time
-                    
-                    # Use cache-busting parameter to ensure we get different results
-                    cache_buster = int(time.time() * 1000)
-                    
-                    # Try multiple Reddit endpoints with different sorting and cache-busting
-                    # Fetch multiple posts to ensure variety
-                    urls_to_try = [
-                        f"https://www.reddit.com/r/{subreddit}/hot.json?limit=25&t=day&raw_json=1&{cache_buster}",
-                        f"https://www.reddit.com/r/{subreddit}/new.json?limit=25&raw_json=1&{cache_buster}",
-                        f"https://www.reddit.com/r/{subreddit}/top.json?limit=25&t=day&raw_json=1&{cache_buster}",
-                        f"https://www.reddit.com/r/{subreddit}/random.json?raw_json=1&{cache_buster}",
-                    ]
-                    
-                    # Realistic browser headers to avoid blocking
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        'Accept': 'application/json, text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                        'Accept-Language': 'en-US,en;q=0.5',
-                        'Accept-Encoding': 'gzip, deflate',
-                        'Connection': 'keep-alive',
-                        'Upgrade-Insecure-Requests': '1',
-                    }
-                    
-                    response = None
-                    data = None
-                    
-                    # Try each URL until one works
-                    all_posts = []
-                    for url in urls_to_try:
-                        try:
-                            async with session.get(url, headers=headers, allow_redirects=True, timeout=aiohttp.ClientTimeout(total=15)) as resp:
-                                if resp.status == 200:
-                                    try:
-                                        data = await resp.json()
-                                        
-                                        # Extract posts from response
-                                        posts = []
-                                        if isinstance(data, list) and len(data) > 0:
-                                            children = data[0].get('data', {}).get('children', [])
-                                            posts = [child.get('data', {}) for child in children if child.get('data', {}).get('title')]
-                                        elif isinstance(data, dict):
-                                            children = data.get('data', {}).get('children', [])
-                                            posts = [child.get('data', {}) for child in children if child.get('data', {}).get('title')]
-                                        
-                                        # Filter out stickied posts and non-image posts if possible
-                                        valid_posts = []
-                                        for p in posts:
-                                            # Skip stickied posts
-                                            if not p.get('stickied', False):
-                                                valid_posts.append(p)
-                                        
-                                        if valid_posts:
-                                            all_posts.extend(valid_posts)
-                                            # If we got enough posts, break
-                                            if len(all_posts) >= 10:
-                                                break
-                                    except (aiohttp.ContentTypeError, KeyError, IndexError, TypeError):
-                                        continue  # Try next URL
-                                elif resp.status == 403:
-                                    continue  # Try next URL
-                                else:
-                                    continue  # Try next URL
-                        except (aiohttp.ClientError, asyncio.TimeoutError):
-                            continue  # Try next URL
-                    
-                    if not all_posts:
-                        await ctx.send(f"❌ Unable to fetch memes from r/{subreddit}. Reddit may be blocking automated requests.\n\n💡 **Tip:** Try again in a few minutes, or the subreddit might be private/restricted.")
-                        return
-                    
-                    # Randomly select a post from the collected posts
-                    post = random.choice(all_posts)
-                    
-                    if not post or not post.get('title'):
-                        await ctx.send("❌ No meme found. Try again!")
-                        return
-                    
-                    embed = discord.Embed(
-                        title=post.get('title', 'Meme')[:256],  # Discord limit
-                        url=f"https://reddit.com{post.get('permalink', '')}",
-                        color=discord.Color.orange()
-                    )
-                    
-                    # Handle image or video
-                    post_url = post.get('url', '')
-                    if post_url:
-                        # Check if it's an image
-                        if any(post_url.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.gifv', '.webp']):
-                            embed.set_image(url=post_url)
-                        elif 'i.redd.it' in post_url or 'imgur.com' in post_url or 'i.imgur.com' in post_url:
-                            embed.set_image(url=post_url)
-                        elif post.get('preview') and post['preview'].get('images'):
-                            # Try to get preview image
-                            try:
-                                images = post['preview']['images'][0]['source']['url']
-                                embed.set_image(url=images.replace('&amp;', '&'))
-                            except (KeyError, IndexError):
-                                embed.description = f"[View Content]({post_url})"
-                        else:
-                            embed.description = f"[View Content]({post_url})"
-                    
-                    upvotes = post.get('ups', 0) or 0
-                    comments = post.get('num_comments', 0) or 0
-                    embed.set_footer(text=f"👍 {upvotes:,} | 💬 {comments:,} | r/{subreddit}")
-                    
-                    await ctx.send(embed=embed)
-            except aiohttp.ClientError as e:
-                await ctx.send(f"❌ Network error: Could not connect to Reddit. Please try again later.")
-            except asyncio.TimeoutError:
-                await ctx.send(f"❌ Request timed out. Reddit may be slow. Try again!")
-            except Exception as e:
-                await ctx.send(f"❌ Error fetching meme: {str(e)[:200]}")
-                # Log full error for debugging
-                import logging
-                logging.error(f"Meme command error: {e}", exc_info=True)
+        try:
+            # Served from memory when the pool is warm; only a cold subreddit waits on Reddit
+            if self.memes.is_warm(subreddit):
+                post = self.memes.get_meme(subreddit, ctx.channel.id)
+            else:
+                async with ctx.typing():
+                    post = await self.memes.fetch_meme(subreddit, ctx.channel.id)
+        except Exception as e:
+            await ctx.send(f"❌ Error fetching meme: {str(e)[:200]}")
+            # Log full error for debugging
+            import logging
+            logging.error(f"Meme command error: {e}", exc_info=True)
+            return
+        
+        if not post:
+            await ctx.send(f"❌ Unable to fetch memes from r/{subreddit}. Reddit may be blocking automated requests.\n\n💡 **Tip:** Try again in a few minutes, or the subreddit might be private/restricted.")
+            return
+        
+        await ctx.send(embed=build_meme_embed(post, subreddit))
     
     @discord.app_commands.command(name='meme', description='Fetch a random meme from Reddit')
     @discord.app_commands.describe(subreddit='The subreddit to fetch memes from (default: memes)')
     async def meme_slash(self, interaction: discord.Interaction, subreddit: str = 'memes'):
         """Slash command version of meme."""
+        # A warm pool answers immediately; otherwise defer while the pool loads
+        if self.memes.is_warm(subreddit):
+            post = self.memes.get_meme(subreddit, interaction.channel_id)
+            send = interaction.response.send_message
+        else:
+            await interaction.response.defer()
+            send = interaction.followup.send
+            try:
+                post = await self.memes.fetch_meme(subreddit, interaction.channel_id)
+            except Exception as e:
+                await send(f"❌ Error fetching meme: {str(e)[:200]}")
+                return
         
-        await interaction.response.defer()
+        if not post:
+            await send(f"❌ Could not fetch meme from r/{subreddit}")
+            return
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                url = f"https://www.reddit.com/r/{subreddit}/random.json"
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                
-                async with session.get(url, headers=headers, allow_redirects=True) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        post = None
-                        if isinstance(data, list) and len(data) > 0:
-                            post_data = data[0].get('data', {}).get('children', [])
-                            if post_data and len(post_data) > 0:
-                                post = post_data[0].get('data', {})
-                        elif isinstance(data, dict):
-                            children = data.get('data', {}).get('children', [])
-                            if children and len(children) > 0:
-                                post = children[0].get('data', {})
-                        
-                        if not post:
-                            await interaction.followup.send("❌ No meme found. Try again!")
-                            return
-                        
-                        embed = discord.Embed(
-                            title=post.get('title', 'Meme')[:256],
-                            url=f"https://reddit.com{post.get('permalink', '')}",
-                            color=discord.Color.orange()
-                        )
-                        
-                        post_url = post.get('url', '')
-                        if post_url:
-                            if any(post_url.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.gifv', '.webp']):
-                                embed.set_image(url=post_url)
-                            elif 'i.redd.it' in post_url or 'imgur.com' in post_url:
-                                embed.set_image(url=post_url)
-                            elif post.get('preview'):
-                                try:
-                                    images = post['preview']['images'][0]['source']['url']
-                                    embed.set_image(url=images.replace('&amp;', '&'))
-                                except:
-                                    embed.description = f"[View Content]({post_url})"
-                            else:
-                                embed.description = f"[View Content]({post_url})"
-                        
-                        upvotes = post.get('ups', 0)
-                        comments = post.get('num_comments', 0)
-                        embed.set_footer(text=f"👍 {upvotes:,} | 💬 {comments:,} | r/{subreddit}")
-                        
-                        await interaction.followup.send(embed=embed)
-                    else:
-                        await interaction.followup.send(f"❌ Could not fetch meme from r/{subreddit}")
-        except Exception as e:
-            await interaction.followup.send(f"❌ Error fetching meme: {str(e)[:200]}")
+        await send(embed=build_meme_embed(post, subreddit))
     
     @commands.command(name='serverinfo', aliases=['server', 'guildinfo'])
     async def serverinfo(self, ctx):
         """Display server information."""
         guild = ctx.guild
         
-        # Count members by status
-        online = sum(1 for m in guild.members if m.status == discord.Status.online)
-        idle = sum(1 for m in guild.members if m.status == discord.Status.idle)
-        dnd = sum(1 for m in guild.members if m.status == discord.Status.dnd)
-        offline = sum(1 for m in guild.members if m.status == discord.Status.offline)
+        # Count members by status; only exact when every member (and presence) is cached
+        counts = self.presence.get(guild) if guild.chunked else None
+        if counts is not None and self.bot.intents.presences:
+            status = f"🟢 {counts['online']} | 🟡 {counts['idle']} | 🔴 {counts['dnd']} | ⚪ {counts['offline']}"
+        else:
+            try:
+                approximate = await self.bot.fetch_guild(guild.id, with_counts=True)
+                status = f"🟢 ~{approximate.approximate_presence_count:,} online"
+            except discord.HTTPException:
+                status = "Unavailable"
         
         embed = discord.Embed(
             title=f"{guild.name} Server Information",
@@ -244,17 +157,17 @@ class BasicCommands(commands.Cog):
         if guild.icon:
             embed.set_thumbnail(url=guild.icon.url)
         
-        embed.add_field(name="👑 Owner", value=guild.owner.mention if guild.owner else "Unknown", inline=True)
+        embed.add_field(name="👑 Owner", value=f"<@{guild.owner_id}>", inline=True)
         embed.add_field(name="🆔 Server ID", value=guild.id, inline=True)
         embed.add_field(name="📅 Created", value=guild.created_at.strftime("%B %d, %Y"), inline=True)
         
         embed.add_field(name="👥 Members", value=guild.member_count, inline=True)
-        embed.add_field(name="🤖 Bots", value=sum(1 for m in guild.members if m.bot), inline=True)
+        embed.add_field(name="🤖 Bots", value=counts['bots'] if counts is not None else "Unknown", inline=True)
         embed.add_field(name="📝 Roles", value=len(guild.roles), inline=True)
         
         embed.add_field(
             name="💚 Status",
-            value=f"🟢 {online} | 🟡 {idle} | 🔴 {dnd} | ⚪ {offline}",
+            value=status,
             inline=False
         )
         
@@ -264,6 +177,37 @@ class BasicCommands(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        """Keep status counts current."""
+        self.presence.update(after.guild.id, before, after)
+    
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.presence.add(member.guild.id, member)
+    
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.presence.remove(member.guild.id, member)
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.presence.forget(guild.id)
+    
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        """Recount a guild that came back from an outage or was re-sent on reconnect."""
+        self.presence.forget(guild.id)
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Recount every guild after a fresh session; events may have been missed."""
+        self.presence.clear()
+    
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        self.presence.clear()
+    
     @commands.command(name='userinfo', aliases=['user', 'whois'])
     async def userinfo(self, ctx, member: discord.Member = None):
         """Display user information."""
@@ -360,6 +304,12 @@ class BasicCommands(commands.Cog):
         await ctx.send(embed=embed)
 
 
+    async def cog_unload(self):
+        """Stop the meme refresher and close the shared HTTP session."""
+        self.meme_task.cancel()
+        await self.memes.close()
+
+
 async def setup(bot):
     await bot.add_cog(BasicCommands(bot))
 
@@ -6,7 +6,271 @@ Fetch cryptocurrency prices and information.
 import discord
 from discord.ext import commands
 import aiohttp
+import asyncio
+import os
+import time
 from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+from database import Database
+from utils.cache import MISSING, SingleFlight, TTLCache
+from utils.alerts import ALERT_DIRECTIONS, AlertBook, is_triggered
+from utils.sharding import owns_guild
+
+PRICE_TTL = 30  # CoinGecko's free tier refreshes prices about once a minute
+MARKETS_TTL = 60
+PRICE_BATCH_SIZE = 250  # Coin ids per /simple/price request
+MARKETS_PAGE_SIZE = 25  # Fetch the largest !cryptotop page once and slice it
+SNAPSHOT_SIZE = 250  # Coins kept in the background market snapshot
+COIN_LIST_REFRESH = 86400  # Seconds between /coins/list index rebuilds
+COIN_LIST_RETRY = 60  # Seconds before retrying a failed index build
+
+# Common tickers, used until the coin index has loaded (or if it misses)
+COIN_ALIASES = {
+    'btc': 'bitcoin',
+    'eth': 'ethereum',
+    'doge': 'dogecoin',
+    'ada': 'cardano',
+    'sol': 'solana',
+    'xrp': 'ripple',
+    'matic': 'polygon',
+    'bnb': 'binancecoin',
+    'usdt': 'tether',
+    'usdc': 'usd-coin'
+}
+
+# Seconds between background market snapshot refreshes; 0 disables the poller
+MARKET_POLL_INTERVAL = int(os.getenv('CRYPTO_POLL_INTERVAL', '0'))
+
+ALERT_CHECK_INTERVAL = 60
+MAX_ALERTS_PER_USER = 25
+
+
+class MarketSnapshot(NamedTuple):
+    """Immutable top-N market listing, swapped in whole on each refresh."""
+    coins: tuple
+    by_id: Mapping
+    fetched_at: float
+    
+    @classmethod
+    def build(cls, markets):
+        coins = tuple(MappingProxyType(dict(coin)) for coin in markets)
+        return cls(coins, MappingProxyType({coin['id']: coin for coin in coins}), time.monotonic())
+    
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+
+class CoinIndex(NamedTuple):
+    """Immutable id/symbol/name lookup built from /coins/list."""
+    lookup: Mapping  # lowercase id, symbol or name -> coin id
+    names: tuple  # (lowercase name, display name), market-cap ranked coins first
+    fetched_at: float
+    
+    @classmethod
+    def build(cls, coin_list, markets):
+        lookup = {}
+        # Later writes win: names < symbols < ids < anything in the market-cap ranking,
+        # where higher-ranked coins are written last so they win shared tickers like "btc"
+        for field in ('name', 'symbol', 'id'):
+            for coin in coin_list:
+                lookup[coin[field].lower()] = coin['id']
+        for coin in reversed(markets):
+            for field in ('name', 'symbol', 'id'):
+                lookup[coin[field].lower()] = coin['id']
+        
+        ranked = {coin['id'] for coin in markets}
+        names = tuple(
+            [(coin['name'].lower(), coin['name']) for coin in markets] +
+            [(coin['name'].lower(), coin['name']) for coin in coin_list if coin['id'] not in ranked]
+        )
+        return cls(MappingProxyType(lookup), names, time.monotonic())
+    
+    def resolve(self, query):
+        """Resolve a coin id, ticker or name to a coin id."""
+        key = query.lower().strip()
+        return self.lookup.get(key) or self.lookup.get(key.replace(' ', '-'))
+    
+    def suggest(self, query, limit=5):
+        """Suggest coin names containing the query."""
+        key = query.lower().strip()
+        return [name for lower, name in self.names if key in lower][:limit]
+
+
+class CryptoAPIError(Exception):
+    """Raised when CoinGecko returns a non-200 response."""
+    
+    def __init__(self, status):
+        super().__init__(f"CoinGecko returned HTTP {status}")
+        self.status = status
+
+
+class PriceService:
+    """CoinGecko lookups with a per-coin TTL cache, single-flight fetches and batched ids."""
+    
+    def __init__(self, api_url):
+        self.api_url = api_url
+        self.cache = TTLCache(PRICE_TTL, maxsize=4096)  # coin_id -> price data, or None if unknown
+        self.markets = TTLCache(MARKETS_TTL, maxsize=1)
+        self.flights = SingleFlight()
+        self.inflight = {}  # coin_id -> future resolved by the batch fetching it
+        self.session = None
+        self.snapshot = None  # MarketSnapshot, refreshed by the background poller
+        self.index = None  # CoinIndex, rebuilt daily
+    
+    def get_session(self):
+        """Get the shared HTTP session, creating it on first use."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        return self.session
+    
+    async def close(self):
+        """Close the HTTP session."""
+        if self.session and not self.session.closed:
+            await self.session.close()
+    
+    async def request(self, path, params):
+        """GET a CoinGecko endpoint and return the decoded JSON."""
+        async with self.get_session().get(f"{self.api_url}{path}", params=params) as response:
+            if response.status != 200:
+                raise CryptoAPIError(response.status)
+            return await response.json()
+    
+    async def fetch_prices(self, coin_ids):
+        """Fetch prices for many coins, PRICE_BATCH_SIZE ids per request."""
+        data = {}
+        for i in range(0, len(coin_ids), PRICE_BATCH_SIZE):
+            data.update(await self.request('/simple/price', {
+                'ids': ','.join(coin_ids[i:i + PRICE_BATCH_SIZE]),
+                'vs_currencies': 'usd',
+                'include_24hr_change': 'true',
+                'include_market_cap': 'true'
+            }))
+        return data
+    
+    def fresh_snapshot(self):
+        """Get the market snapshot if the poller is keeping it current."""
+        snapshot = self.snapshot
+        if snapshot and MARKET_POLL_INTERVAL and snapshot.age() <= MARKET_POLL_INTERVAL * 2 + MARKETS_TTL:
+            return snapshot
+        return None
+    
+    async def refresh_snapshot(self):
+        """Fetch the top SNAPSHOT_SIZE coins and swap in a new snapshot."""
+        markets = await self.request('/coins/markets', {
+            'vs_currency': 'usd',
+            'order': 'market_cap_desc',
+            'per_page': SNAPSHOT_SIZE,
+            'page': 1
+        })
+        self.snapshot = MarketSnapshot.build(markets)
+        return self.snapshot
+    
+    async def refresh_index(self):
+        """Rebuild the coin lookup index from /coins/list, ranked by the market snapshot."""
+        coin_list = await self.request('/coins/list', {})
+        snapshot = self.snapshot if self.snapshot else await self.refresh_snapshot()
+        self.index = CoinIndex.build(coin_list, snapshot.coins)
+    
+    def resolve_coin_id(self, query):
+        """Normalize a coin name or ticker to a CoinGecko id."""
+        key = query.lower().strip()
+        coin_id = self.index.resolve(key) if self.index else None
+        return coin_id or COIN_ALIASES.get(key) or key.replace(' ', '-')
+    
+    async def suggest(self, query):
+        """Suggest coin names for a query, from the local index when it is loaded."""
+        if self.index:
+            return self.index.suggest(query)
+        coins = await self.search(query)
+        return [coin.get('name', 'Unknown') for coin in coins[:5]]
+    
+    async def get_prices(self, coin_ids):
+        """Get price data for coin ids; unknown coins are left out of the result."""
+        result = {}
+        missing = []
+        waiting = []
+        snapshot = self.fresh_snapshot()
+        
+        for coin_id in dict.fromkeys(coin_ids):
+            if snapshot and coin_id in snapshot.by_id:
+                coin = snapshot.by_id[coin_id]
+                result[coin_id] = {
+                    'usd': coin.get('current_price') or 0,
+                    'usd_24h_change': coin.get('price_change_percentage_24h') or 0,
+                    'usd_market_cap': coin.get('market_cap') or 0
+                }
+                continue
+            
+            cached = self.cache.get(coin_id, MISSING)
+            if cached is not MISSING:
+                if cached is not None:
+                    result[coin_id] = cached
+            elif coin_id in self.inflight:
+                waiting.append((coin_id, self.inflight[coin_id]))
+            else:
+                missing.append(coin_id)
+        
+        if missing:
+            # Register futures first so concurrent callers join this fetch instead of starting their own
+            loop = asyncio.get_running_loop()
+            futures = {coin_id: loop.create_future() for coin_id in missing}
+            self.inflight.update(futures)
+            try:
+                data = await self.fetch_prices(missing)
+            except BaseException as e:
+                for future in futures.values():
+                    if isinstance(e, Exception):
+                        future.set_exception(e)
+                        future.exception()  # Mark retrieved in case nobody else is waiting
+                    else:
+                        future.cancel()
+                raise
+            finally:
+                for coin_id, future in futures.items():
+                    if self.inflight.get(coin_id) is future:
+                        del self.inflight[coin_id]
+            
+            for coin_id, future in futures.items():
+                value = data.get(coin_id)
+                self.cache.set(coin_id, value)
+                future.set_result(value)
+                if value is not None:
+                    result[coin_id] = value
+        
+        for coin_id, future in waiting:
+            value = await asyncio.shield(future)
+            if value is not None:
+                result[coin_id] = value
+        
+        return result
+    
+    async def get_markets(self, limit):
+        """Get the top coins by market cap (limit <= MARKETS_PAGE_SIZE)."""
+        snapshot = self.fresh_snapshot()
+        if snapshot:
+            return snapshot.coins[:limit]
+        
+        markets = self.markets.get('top')
+        if markets is None:
+            markets = await self.flights.do('markets', self.fetch_markets)
+        return markets[:limit]
+    
+    async def fetch_markets(self):
+        """Fetch the top market page and cache it."""
+        markets = await self.request('/coins/markets', {
+            'vs_currency': 'usd',
+            'order': 'market_cap_desc',
+            'per_page': MARKETS_PAGE_SIZE,
+            'page': 1
+        })
+        self.markets.set('top', markets)
+        return markets
+    
+    async def search(self, query):
+        """Search CoinGecko for coins matching a name."""
+        data = await self.request('/search', {'query': query})
+        return data.get('coins', [])
 
 
 class Crypto(commands.Cog):
@@ -15,6 +279,91 @@ class Crypto(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.api_url = "https://api.coingecko.com/api/v3"
+        self.prices = PriceService(self.api_url)
+        self.db = Database()
+        self.alerts = AlertBook()
+        for alert in self.db.get_price_alerts():
+            # Other shard processes check their own guilds' alerts
+            if owns_guild(bot, alert['guild_id']):
+                self.alerts.add(alert)
+        self.poll_task = self.bot.loop.create_task(self.poll_markets())
+        self.alert_task = self.bot.loop.create_task(self.check_alerts())
+    
+    async def poll_markets(self):
+        """Background task to keep the coin index and (optionally) the market snapshot fresh.
+        
+        Runs even with the market poller disabled, and starts without waiting for
+        the gateway since it only needs HTTP.
+        """
+        while not self.bot.is_closed():
+            try:
+                index = self.prices.index
+                if index is None or time.monotonic() - index.fetched_at >= COIN_LIST_REFRESH:
+                    await self.prices.refresh_index()
+                if MARKET_POLL_INTERVAL:
+                    await self.prices.refresh_snapshot()
+            except (CryptoAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Error refreshing market data: {e}")
+            
+            interval = MARKET_POLL_INTERVAL or 300
+            await asyncio.sleep(min(interval, COIN_LIST_RETRY) if self.prices.index is None else interval)
+    
+    async def check_alerts(self):
+        """Background task to evaluate all alerts against one shared price poll."""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            await asyncio.sleep(ALERT_CHECK_INTERVAL)
+            try:
+                await self.fire_alerts()
+            except Exception as e:
+                print(f"Error checking price alerts: {e}")
+    
+    async def fire_alerts(self):
+        """Poll prices for alerted coins, then notify and delete the alerts that fired."""
+        coins = self.alerts.coins()
+        if not coins:
+            return
+        
+        prices = await self.prices.get_prices(coins)
+        fired = []
+        for coin_id, data in prices.items():
+            price = data.get('usd')
+            if price is not None:
+                fired.extend((alert, price) for alert in self.alerts.pop_triggered(coin_id, price))
+        
+        # Deleted only after delivery was attempted, so a failed run re-fires after a restart
+        for alert, price in fired:
+            await self.send_alert(alert, price)
+        self.db.delete_price_alerts([alert['id'] for alert, _ in fired])
+    
+    async def send_alert(self, alert, price):
+        """Notify a user that their alert fired, falling back to a DM."""
+        arrow = "📈" if alert['direction'] == 'above' else "📉"
+        embed = discord.Embed(
+            title=f"{arrow} Price Alert: {alert['coin_id'].title()}",
+            description=f"{alert['coin_id'].title()} is now **{alert['direction']} ${alert['threshold']:,.6g}**",
+            color=discord.Color.green() if alert['direction'] == 'above' else discord.Color.red(),
+            timestamp=datetime.now(timezone.utc)
+        )
+        embed.add_field(name="💵 Price", value=f"${price:,.2f}" if price >= 1 else f"${price:.6f}", inline=True)
+        embed.set_footer(text=f"Alert #{alert['id']} | CoinGecko API")
+        
+        # DM channels aren't cached after a restart, so fetch the channel if needed
+        channel = self.bot.get_channel(alert['channel_id'])
+        try:
+            if channel is None:
+                channel = await self.bot.fetch_channel(alert['channel_id'])
+            await channel.send(f"<@{alert['user_id']}>", embed=embed)
+            return
+        except (discord.Forbidden, discord.HTTPException):
+            pass
+        
+        try:
+            user = await self.bot.fetch_user(alert['user_id'])
+            await user.send(embed=embed)
+        except (discord.Forbidden, discord.HTTPException) as e:
+            print(f"Error delivering price alert #{alert['id']}: {e}")
     
     @commands.command(name='crypto', aliases=['price', 'btc', 'bitcoin'])
     # Removed duplicate 'crypto' from aliases to fix CommandRegistrationError
@@ -23,102 +372,110 @@ class Crypto(commands.Cog):
         """Get cryptocurrency price. Usage: !crypto bitcoin or !crypto ethereum"""
         async with ctx.typing():
             try:
-                # Normalize coin name
-                coin_id = coin.lower().replace(' ', '-')
+                coin_id = self.prices.resolve_coin_id(coin)
+                prices = await self.prices.get_prices([coin_id])
                 
-                # Try common aliases
-                coin_aliases = {
-                    'btc': 'bitcoin',
-                    'eth': 'ethereum',
-                    'doge': 'dogecoin',
-                    'ada': 'cardano',
-                    'sol': 'solana',
-                    'xrp': 'ripple',
-                    'matic': 'polygon',
-                    'bnb': 'binancecoin',
-                    'usdt': 'tether',
-                    'usdc': 'usd-coin'
-                }
+                if coin_id not in prices:
+                    # Suggest similar coins
+                    names = await self.prices.suggest(coin)
+                    
+                    if names:
+                        embed = discord.Embed(
+                            title="❓ Coin Not Found",
+                            description=f"'{coin}' not found. Did you mean:",
+                            color=discord.Color.orange()
+                        )
+                        suggestions = [f"• {name}" for name in names]
+                        embed.description += "\n\n" + "\n".join(suggestions[:5])
+                        await ctx.send(embed=embed)
+                        return
+                    
+                    await ctx.send(f"❌ Cryptocurrency '{coin}' not found. Try: bitcoin, ethereum, dogecoin, etc.")
+                    return
                 
-                if coin_id in coin_aliases:
-                    coin_id = coin_aliases[coin_id]
+                coin_data = prices[coin_id]
+                price = coin_data.get('usd', 0)
+                change_24h = coin_data.get('usd_24h_change', 0) or 0
+                market_cap = coin_data.get('usd_market_cap', 0)
                 
-                async with aiohttp.ClientSession() as session:
-                    url = f"{self.api_url}/simple/price"
-                    params = {
-                        'ids': coin_id,
-                        'vs_currencies': 'usd',
-                        'include_24hr_change': 'true',
-                        'include_market_cap': 'true'
-                    }
-                    
-                    async with session.get(url, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            
-                            if coin_id not in data:
-                                # Try to search for coin
-                                search_url = f"{self.api_url}/search"
-                                async with session.get(search_url, params={'query': coin}) as search_resp:
-                                    if search_resp.status == 200:
-                                        search_data = await search_resp.json()
-                                        coins = search_data.get('coins', [])[:5]
-                                        
-                                        if coins:
-                                            embed = discord.Embed(
-                                                title="❓ Coin Not Found",
-                                                description=f"'{coin}' not found. Did you mean:",
-                                                color=discord.Color.orange()
-                                            )
-                                            suggestions = []
-                                            for coin_info in coins:
-                                                name = coin_info.get('name', 'Unknown')
-                                                suggestions.append(f"• {name}")
-                                            embed.description += "\n\n" + "\n".join(suggestions[:5])
-                                            await ctx.send(embed=embed)
-                                            return
-                                    
-                                    await ctx.send(f"❌ Cryptocurrency '{coin}' not found. Try: bitcoin, ethereum, dogecoin, etc.")
-                                    return
-                            
-                            coin_data = data[coin_id]
-                            price = coin_data.get('usd', 0)
-                            change_24h = coin_data.get('usd_24h_change', 0)
-                            market_cap = coin_data.get('usd_market_cap', 0)
-                            
-                            # Format numbers
-                            if price < 1:
-                                price_str = f"${price:.6f}"
-                            else:
-                                price_str = f"${price:,.2f}"
-                            
-                            market_cap_str = f"${market_cap:,.0f}" if market_cap else "N/A"
-                            
-                            # Color based on 24h change
-                            color = discord.Color.green() if change_24h >= 0 else discord.Color.red()
-                            
-                            embed = discord.Embed(
-                                title=f"💰 {coin_id.title()} Price",
-                                color=color,
-                                timestamp=datetime.now(timezone.utc)
-                            )
-                            
-                            embed.add_field(name="💵 Price", value=price_str, inline=True)
-                            embed.add_field(name="📈 24h Change", value=f"{change_24h:+.2f}%", inline=True)
-                            embed.add_field(name="💼 Market Cap", value=market_cap_str, inline=True)
-                            
-                            # Emoji based on change
-                            emoji = "📈" if change_24h >= 0 else "📉"
-                            embed.set_footer(text=f"{emoji} CoinGecko API")
-                            
-                            await ctx.send(embed=embed)
-                        else:
-                            await ctx.send("❌ Could not fetch cryptocurrency data. Try again later.")
-            except aiohttp.ClientError:
+                # Format numbers
+                if price < 1:
+                    price_str = f"${price:.6f}"
+                else:
+                    price_str = f"${price:,.2f}"
+                
+                market_cap_str = f"${market_cap:,.0f}" if market_cap else "N/A"
+                
+                # Color based on 24h change
+                color = discord.Color.green() if change_24h >= 0 else discord.Color.red()
+                
+                embed = discord.Embed(
+                    title=f"💰 {coin_id.title()} Price",
+                    color=color,
+                    timestamp=datetime.now(timezone.utc)
+                )
+                
+                embed.add_field(name="💵 Price", value=price_str, inline=True)
+                embed.add_field(name="📈 24h Change", value=f"{change_24h:+.2f}%", inline=True)
+                embed.add_field(name="💼 Market Cap", value=market_cap_str, inline=True)
+                
+                # Emoji based on change
+                emoji = "📈" if change_24h >= 0 else "📉"
+                embed.set_footer(text=f"{emoji} CoinGecko API")
+                
+                await ctx.send(embed=embed)
+            except CryptoAPIError:
+                await ctx.send("❌ Could not fetch cryptocurrency data. Try again later.")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
                 await ctx.send("❌ Error connecting to crypto API. Try again later.")
             except Exception as e:
                 await ctx.send(f"❌ Error: {str(e)}")
     
+    @commands.command(name='prices', aliases=['cryptos'])
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def prices_command(self, ctx, *coins: str):
+        """Get several cryptocurrency prices at once. Usage: !prices btc eth sol"""
+        if not coins:
+            await ctx.send("❌ Please list at least one coin. Example: `!prices btc eth sol`")
+            return
+        
+        if len(coins) > 25:
+            await ctx.send("❌ Maximum 25 coins at once.")
+            return
+        
+        async with ctx.typing():
+            try:
+                coin_ids = [self.prices.resolve_coin_id(coin) for coin in coins]
+                prices = await self.prices.get_prices(coin_ids)
+            except CryptoAPIError:
+                await ctx.send("❌ Could not fetch cryptocurrency data. Try again later.")
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                await ctx.send("❌ Error connecting to crypto API. Try again later.")
+                return
+            
+            lines = []
+            for coin, coin_id in zip(coins, coin_ids):
+                coin_data = prices.get(coin_id)
+                if coin_data is None:
+                    lines.append(f"❓ **{coin}** - not found")
+                    continue
+                
+                price = coin_data.get('usd', 0)
+                change = coin_data.get('usd_24h_change', 0) or 0
+                price_str = f"${price:,.2f}" if price >= 1 else f"${price:.6f}"
+                emoji = "📈" if change >= 0 else "📉"
+                lines.append(f"{emoji} **{coin_id.title()}** - {price_str} ({change:+.2f}%)")
+            
+            embed = discord.Embed(
+                title="💰 Crypto Prices",
+                description="\n".join(lines),
+                color=discord.Color.gold(),
+                timestamp=datetime.now(timezone.utc)
+            )
+            embed.set_footer(text="CoinGecko API")
+            await ctx.send(embed=embed)
+    
     @commands.command(name='cryptotop', aliases=['topcrypto'])
     async def cryptotop(self, ctx, limit: int = 10):
         """Get top cryptocurrencies. Usage: !cryptotop [number]"""
@@ -128,45 +485,118 @@ class Crypto(commands.Cog):
         
         async with ctx.typing():
             try:
-                async with aiohttp.ClientSession() as session:
-                    url = f"{self.api_url}/coins/markets"
-                    params = {
-                        'vs_currency': 'usd',
-                        'order': 'market_cap_desc',
-                        'per_page': limit,
-                        'page': 1
-                    }
+                data = await self.prices.get_markets(limit)
+                
+                embed = discord.Embed(
+                    title=f"🏆 Top {limit} Cryptocurrencies",
+                    color=discord.Color.gold()
+                )
+                
+                top_list = []
+                for i, coin in enumerate(data, 1):
+                    name = coin.get('name', 'Unknown')
+                    symbol = coin.get('symbol', '').upper()
+                    price = coin.get('current_price', 0) or 0
+                    change = coin.get('price_change_percentage_24h', 0) or 0
+                    
+                    emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+                    price_str = f"${price:,.2f}" if price >= 1 else f"${price:.6f}"
+                    change_str = f"{change:+.2f}%"
                     
-                    async with session.get(url, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            
-                            embed = discord.Embed(
-                                title=f"🏆 Top {limit} Cryptocurrencies",
-                                color=discord.Color.gold()
-                            )
-                            
-                            top_list = []
-                            for i, coin in enumerate(data, 1):
-                                name = coin.get('name', 'Unknown')
-                                symbol = coin.get('symbol', '').upper()
-                                price = coin.get('current_price', 0)
-                                change = coin.get('price_change_percentage_24h', 0)
-                                
-                                emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-                                price_str = f"${price:,.2f}" if price >= 1 else f"${price:.6f}"
-                                change_str = f"{change:+.2f}%"
-                                
-                                top_list.append(f"{emoji} **{name}** ({symbol}) - {price_str} ({change_str})")
-                            
-                            embed.description = "\n".join(top_list[:limit])
-                            embed.set_footer(text="CoinGecko API")
-                            
-                            await ctx.send(embed=embed)
-                        else:
-                            await ctx.send("❌ Could not fetch top cryptocurrencies.")
+                    top_list.append(f"{emoji} **{name}** ({symbol}) - {price_str} ({change_str})")
+                
+                embed.description = "\n".join(top_list[:limit])
+                embed.set_footer(text="CoinGecko API")
+                
+                await ctx.send(embed=embed)
+            except CryptoAPIError:
+                await ctx.send("❌ Could not fetch top cryptocurrencies.")
             except Exception as e:
                 await ctx.send(f"❌ Error: {str(e)}")
+    
+    @commands.command(name='alert', aliases=['pricealert'])
+    async def alert(self, ctx, coin: str, direction: str, threshold: float):
+        """Get pinged when a coin crosses a price. Usage: !alert btc > 70000"""
+        direction = ALERT_DIRECTIONS.get(direction.lower())
+        if direction is None or threshold <= 0:
+            await ctx.send("❌ Usage: `!alert btc > 70000` or `!alert eth < 2000`")
+            return
+        
+        # Counted in the database: the in-memory book only holds this shard's guilds
+        if self.db.count_price_alerts(ctx.author.id) >= MAX_ALERTS_PER_USER:
+            await ctx.send(f"❌ You can have at most {MAX_ALERTS_PER_USER} alerts. Remove one with `!alertremove`.")
+            return
+        
+        coin_id = self.prices.resolve_coin_id(coin)
+        try:
+            prices = await self.prices.get_prices([coin_id])
+        except (CryptoAPIError, aiohttp.ClientError, asyncio.TimeoutError):
+            await ctx.send("❌ Could not fetch cryptocurrency data. Try again later.")
+            return
+        
+        if coin_id not in prices:
+            await ctx.send(f"❌ Cryptocurrency '{coin}' not found.")
+            return
+        
+        price = prices[coin_id].get('usd', 0)
+        if is_triggered(direction, threshold, price):
+            await ctx.send(
+                f"❌ {coin_id.title()} is already {direction} ${threshold:,.6g} "
+                f"(currently ${price:,.6g}). Pick a price it hasn't reached yet."
+            )
+            return
+        
+        alert = self.db.add_price_alert(
+            ctx.guild.id if ctx.guild else 0, ctx.channel.id, ctx.author.id,
+            coin_id, direction, threshold
+        )
+        self.alerts.add(alert)
+        
+        embed = discord.Embed(
+            title="🔔 Alert Set",
+            description=f"I'll ping you when **{coin_id.title()}** goes {direction} **${threshold:,.6g}**.",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="💵 Current Price", value=f"${price:,.2f}" if price >= 1 else f"${price:.6f}", inline=True)
+        embed.set_footer(text=f"Alert #{alert['id']}")
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='alerts', aliases=['myalerts'])
+    async def alerts_list(self, ctx):
+        """View your pending price alerts."""
+        # Read from the database: the in-memory book only holds this shard's guilds
+        user_alerts = self.db.get_price_alerts(ctx.author.id)
+        if not user_alerts:
+            await ctx.send("✅ You have no price alerts.")
+            return
+        
+        lines = [
+            f"**#{a['id']}** {a['coin_id'].title()} {a['direction']} ${a['threshold']:,.6g}"
+            for a in user_alerts
+        ]
+        embed = discord.Embed(
+            title="🔔 Your Price Alerts",
+            description="\n".join(lines),
+            color=discord.Color.blue()
+        )
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='alertremove', aliases=['delalert', 'unalert'])
+    async def alert_remove(self, ctx, alert_id: int):
+        """Remove a price alert. Usage: !alertremove 12"""
+        if not self.db.remove_price_alert(alert_id, ctx.author.id):
+            await ctx.send("❌ Alert not found.")
+            return
+        
+        # Only indexed here if this process owns the alert's guild; otherwise a no-op
+        self.alerts.remove(alert_id)
+        await ctx.send(f"✅ Removed alert #{alert_id}.")
+    
+    async def cog_unload(self):
+        """Stop background tasks and close the shared HTTP session."""
+        self.poll_task.cancel()
+        self.alert_task.cancel()
+        await self.prices.close()
 
 
 async def setup(bot):
@@ -5,9 +5,62 @@ Handles moderation commands like kick, ban, timeout, warn, purge.
 
 import discord
 from discord.ext import commands
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+import asyncio
+import bisect
 import json
+import re
+import time
 from pathlib import Path
+from database import Database
+from utils.cache import LRUCache
+from utils.helpers import parse_duration
+
+# Number of (guild, member) warning counts kept in memory
+WARNING_CACHE_SIZE = 4096
+
+# Raid response limits
+BULK_CONCURRENCY = 4  # Member actions in flight at once
+BULK_BAN_CHUNK = 200  # Discord's maximum users per bulk ban request
+BULK_MAX_TARGETS = 2000
+BULK_MAX_LOOKBACK = 604800  # 7 days
+BULK_PROGRESS_INTERVAL = 2  # Seconds between progress embed edits
+MEMBER_QUERY_BATCH = 100  # Discord's maximum user ids per gateway member query
+
+# Purge limits
+PURGE_MAX = 5000
+PURGE_BATCH_SIZE = 100  # Discord's maximum messages per bulk delete
+PURGE_BULK_MAX_AGE_DAYS = 13.9  # Bulk delete only accepts messages newer than 14 days
+PURGE_SINGLE_DELAY = 1  # Seconds between single deletes of older messages
+PURGE_SCAN_FACTOR = 10  # Messages scanned per requested deletion when filtering
+PURGE_SCAN_LIMIT = 20000
+
+
+class PurgeFlags(commands.FlagConverter):
+    """Filters for !purge."""
+    user: discord.User = None
+    regex: str = None
+    attachments: bool = False
+    bots: bool = False
+    within: str = None
+
+
+def build_purge_check(flags):
+    """Build a message predicate from purge flags, or None when nothing is filtered."""
+    checks = []
+    if flags.user:
+        checks.append(lambda m: m.author.id == flags.user.id)
+    if flags.regex:
+        pattern = re.compile(flags.regex, re.IGNORECASE)
+        checks.append(lambda m: pattern.search(m.content) is not None)
+    if flags.attachments:
+        checks.append(lambda m: bool(m.attachments))
+    if flags.bots:
+        checks.append(lambda m: m.author.bot)
+    
+    if not checks:
+        return None
+    return lambda m: all(check(m) for check in checks)
 
 
 class Moderation(commands.Cog):
@@ -17,23 +70,209 @@ class Moderation(commands.Cog):
         self.bot = bot
         self.data_dir = Path('data')
         self.data_dir.mkdir(exist_ok=True)
+        self.db = Database()
+        self.warning_counts = LRUCache(WARNING_CACHE_SIZE)
+        self.join_index = {}  # guild_id -> sorted [(joined_at timestamp, member_id)]
+        self.migrate_warnings()
     
-    def load_warnings(self, guild_id):
-        """Load warnings for a guild."""
-        filepath = self.data_dir / f'warnings_{guild_id}.json'
-        if filepath.exists():
+    def migrate_warnings(self):
+        """Import legacy warnings_<guild_id>.json files into the database."""
+        for filepath in self.data_dir.glob('warnings_*.json'):
             try:
+                guild_id = int(filepath.stem.split('_', 1)[1])
                 with open(filepath, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+                    warnings = json.load(f)
+                self.db.import_warnings(guild_id, warnings)
+                filepath.rename(filepath.with_suffix('.json.migrated'))
+            except Exception as e:
+                print(f"Error migrating {filepath.name}: {e}")
+    
+    def get_warning_count(self, guild_id, user_id):
+        """Get a member's warning count, using the in-memory cache when possible."""
+        key = (guild_id, user_id)
+        count = self.warning_counts.get(key)
+        if count is None:
+            count = self.db.count_warnings(guild_id, user_id)
+            self.warning_counts.set(key, count)
+        return count
+    
+    async def get_join_index(self, guild):
+        """Get the guild's member ids sorted by join time, building it on first use."""
+        index = self.join_index.get(guild.id)
+        if index is None:
+            # Without a full member cache, download the member list once without caching it;
+            # join events keep the index current afterwards
+            members = guild.members if guild.chunked else await guild.chunk(cache=False)
+            index = sorted(
+                (m.joined_at.timestamp(), m.id) for m in members if m.joined_at
+            )
+            self.join_index[guild.id] = index
+        return index
+    
+    async def resolve_members(self, guild, member_ids):
+        """Look up members by id, querying the gateway for any that aren't cached.
+        
+        Returns (members, unresolved). Members who have left are simply absent;
+        `unresolved` counts ids whose lookup failed.
+        """
+        members, missing = [], []
+        for member_id in member_ids:
+            member = guild.get_member(member_id)
+            if member is None:
+                missing.append(member_id)
+            else:
+                members.append(member)
+        
+        unresolved = 0
+        for i in range(0, len(missing), MEMBER_QUERY_BATCH):
+            batch = missing[i:i + MEMBER_QUERY_BATCH]
+            try:
+                members.extend(await guild.query_members(user_ids=batch, limit=MEMBER_QUERY_BATCH, cache=False))
+            except asyncio.TimeoutError:
+                unresolved += len(batch)
+        return members, unresolved
+    
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        """Add new members to the join-time index."""
+        index = self.join_index.get(member.guild.id)
+        if index is not None and member.joined_at:
+            bisect.insort(index, (member.joined_at.timestamp(), member.id))
+    
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        """Drop departed members from the join-time index."""
+        index = self.join_index.get(member.guild.id)
+        if index is None or not member.joined_at:
+            return
+        
+        entry = (member.joined_at.timestamp(), member.id)
+        i = bisect.bisect_left(index, entry)
+        if i < len(index) and index[i] == entry:
+            del index[i]
+    
+    async def select_raid_targets(self, ctx, seconds, pattern=None):
+        """Select members who joined in the last `seconds`, optionally matching a name regex.
+        
+        Returns (targets, unresolved) where `unresolved` counts members that could not be looked up.
+        """
+        regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+        index = await self.get_join_index(ctx.guild)
+        cutoff = time.time() - seconds
+        is_owner = ctx.author.id == ctx.guild.owner_id
+        
+        member_ids = [member_id for _, member_id in index[bisect.bisect_left(index, (cutoff, 0)):]]
+        members, unresolved = await self.resolve_members(ctx.guild, member_ids)
+        
+        targets = []
+        for member in members:
+            if member.bot:
+                continue
+            if member.id in (ctx.author.id, ctx.guild.owner_id, ctx.guild.me.id):
+                continue
+            if member.top_role >= ctx.guild.me.top_role:
+                continue
+            if member.top_role >= ctx.author.top_role and not is_owner:
+                continue
+            if regex and not (regex.search(member.name) or regex.search(member.display_name)):
+                continue
+            targets.append(member)
+        return targets, unresolved
     
-    def save_warnings(self, guild_id, warnings):
-        """Save warnings for a guild."""
-        filepath = self.data_dir / f'warnings_{guild_id}.json'
-        with open(filepath, 'w') as f:
-            json.dump(warnings, f, indent=2)
+    async def resolve_raid_targets(self, ctx, since, pattern):
+        """Parse raid command arguments and select targets, reporting problems to the channel."""
+        seconds = parse_duration(since)
+        if not seconds:
+            await ctx.send("❌ Invalid duration format. Use: 10m, 1h, etc.")
+            return None
+        
+        if seconds > BULK_MAX_LOOKBACK:
+            await ctx.send("❌ Maximum lookback is 7 days.")
+            return None
+        
+        try:
+            targets, unresolved = await self.select_raid_targets(ctx, seconds, pattern)
+        except re.error as e:
+            await ctx.send(f"❌ Invalid name pattern: {e}")
+            return None
+        
+        if unresolved:
+            await ctx.send(f"⚠️ {unresolved} recently joined member(s) could not be looked up and will be skipped.")
+        
+        if not targets:
+            await ctx.send(f"✅ No members joined in the last {since}" + (f" matching `{pattern}`." if pattern else "."))
+            return None
+        
+        if len(targets) > BULK_MAX_TARGETS:
+            await ctx.send(f"❌ {len(targets)} members matched; narrow it down to at most {BULK_MAX_TARGETS}.")
+            return None
+        
+        return targets
+    
+    def build_progress_embed(self, title, total, done, failed, finished=False):
+        """Build the progress embed for a bulk action."""
+        embed = discord.Embed(
+            title=f"{'✅' if finished else '⏳'} {title}",
+            color=discord.Color.green() if finished else discord.Color.orange()
+        )
+        embed.add_field(name="Progress", value=f"{done + failed}/{total}", inline=True)
+        embed.add_field(name="Succeeded", value=done, inline=True)
+        embed.add_field(name="Failed", value=failed, inline=True)
+        return embed
+    
+    async def run_bulk_action(self, ctx, title, targets, action):
+        """Apply `action` to every target with bounded concurrency and live progress."""
+        progress = {'done': 0, 'failed': 0}
+        total = len(targets)
+        semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+        status = await ctx.send(embed=self.build_progress_embed(title, total, 0, 0))
+        
+        async def worker(member):
+            async with semaphore:
+                try:
+                    # discord.py waits out 429s itself; the semaphore keeps us off the global limit
+                    await action(member)
+                    progress['done'] += 1
+                except (discord.Forbidden, discord.HTTPException):
+                    progress['failed'] += 1
+        
+        async def report():
+            while True:
+                await asyncio.sleep(BULK_PROGRESS_INTERVAL)
+                try:
+                    await status.edit(embed=self.build_progress_embed(title, total, progress['done'], progress['failed']))
+                except discord.HTTPException:
+                    pass
+        
+        reporter = asyncio.create_task(report())
+        try:
+            await asyncio.gather(*(worker(member) for member in targets))
+        finally:
+            reporter.cancel()
+        
+        await status.edit(embed=self.build_progress_embed(title, total, progress['done'], progress['failed'], finished=True))
+    
+    async def run_bulk_ban(self, ctx, targets, reason):
+        """Ban targets through Discord's bulk ban endpoint, falling back to single bans."""
+        # Bulk bans need Manage Server as well as Ban Members (and discord.py 2.4+)
+        if not hasattr(ctx.guild, 'bulk_ban') or not ctx.guild.me.guild_permissions.manage_guild:
+            await self.run_bulk_action(ctx, "Raid Ban", targets, lambda m: m.ban(reason=reason))
+            return
+        
+        title = "Raid Ban"
+        total = len(targets)
+        done = failed = 0
+        status = await ctx.send(embed=self.build_progress_embed(title, total, 0, 0))
+        
+        for i in range(0, total, BULK_BAN_CHUNK):
+            chunk = targets[i:i + BULK_BAN_CHUNK]
+            try:
+                result = await ctx.guild.bulk_ban(chunk, reason=reason, delete_message_seconds=0)
+                done += len(result.banned)
+                failed += len(result.failed)
+            except discord.HTTPException:
+                failed += len(chunk)
+            await status.edit(embed=self.build_progress_embed(title, total, done, failed, finished=i + BULK_BAN_CHUNK >= total))
     
     @commands.command(name='kick')
     @commands.has_permissions(kick_members=True)
@@ -116,8 +355,7 @@ class Moderation(commands.Cog):
             return
         
         try:
-            timeout_duration = timedelta(seconds=seconds)
-            await member.timeout(timeout_duration, reason=f"Timed out by {ctx.author}: {reason}")
+            await self.apply_timeout(member, seconds, reason, ctx.author)
             
             embed = discord.Embed(
                 title="✅ Member Timed Out",
@@ -134,6 +372,10 @@ class Moderation(commands.Cog):
         except Exception as e:
             await ctx.send(f"❌ Error timing out member: {str(e)}")
     
+    async def apply_timeout(self, member, seconds, reason, moderator):
+        """Time out a member; shared by !timeout, !raid timeout and automod."""
+        await member.timeout(timedelta(seconds=seconds), reason=f"Timed out by {moderator}: {reason}")
+    
     @commands.command(name='untimeout', aliases=['unmute'])
     @commands.has_permissions(moderate_members=True)
     @commands.bot_has_permissions(moderate_members=True)
@@ -157,48 +399,109 @@ class Moderation(commands.Cog):
     
     @commands.command(name='purge', aliases=['clear', 'delete'])
     @commands.has_permissions(manage_messages=True)
-    @commands.bot_has_permissions(manage_messages=True)
-    async def purge(self, ctx, amount: int = 10):
-        """Delete multiple messages at once."""
-        if amount < 1 or amount > 100:
-            await ctx.send("❌ Please specify a number between 1 and 100.")
+    @commands.bot_has_permissions(manage_messages=True, read_message_history=True)
+    async def purge(self, ctx, amount: int = 10, *, flags: PurgeFlags):
+        """Delete messages, optionally filtered.
+        Usage: !purge 500 user: @spammer regex: free.*nitro attachments: yes bots: yes within: 2h
+        """
+        if amount < 1 or amount > PURGE_MAX:
+            await ctx.send(f"❌ Please specify a number between 1 and {PURGE_MAX}.")
             return
         
         try:
-            deleted = await ctx.channel.purge(limit=amount + 1)  # +1 to include command message
-            
-            embed = discord.Embed(
-                title="✅ Messages Purged",
-                description=f"Deleted {len(deleted) - 1} message(s).",
-                color=discord.Color.green()
-            )
+            check = build_purge_check(flags)
+        except re.error as e:
+            await ctx.send(f"❌ Invalid regex: {e}")
+            return
+        
+        after = None
+        if flags.within:
+            seconds = parse_duration(flags.within)
+            if not seconds:
+                await ctx.send("❌ Invalid `within:` duration. Use: 30m, 2h, etc.")
+                return
+            after = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+        
+        # Filters may skip most messages, so scan further back than the amount requested
+        filtered = check is not None
+        scan_limit = min(amount * PURGE_SCAN_FACTOR, PURGE_SCAN_LIMIT) if filtered else amount
+        bulk_cutoff = datetime.now(timezone.utc) - timedelta(days=PURGE_BULK_MAX_AGE_DAYS)
+        
+        progress = {'scanned': 0, 'deleted': 0}
+        status = await ctx.send(embed=self.build_purge_embed(progress, amount))
+        last_report = time.monotonic()
+        batch = []
+        finished = False
+        
+        async def flush():
+            if batch:
+                await ctx.channel.delete_messages(batch)
+                progress['deleted'] += len(batch)
+                batch.clear()
+        
+        try:
+            async for message in ctx.channel.history(
+                limit=scan_limit, before=ctx.message, after=after, oldest_first=False
+            ):
+                progress['scanned'] += 1
+                if check and not check(message):
+                    continue
+                
+                if message.created_at > bulk_cutoff:
+                    batch.append(message)
+                    if len(batch) == PURGE_BATCH_SIZE:
+                        await flush()
+                else:
+                    # Bulk delete rejects messages older than 14 days; delete those one at a time
+                    await flush()
+                    await message.delete()
+                    progress['deleted'] += 1
+                    await asyncio.sleep(PURGE_SINGLE_DELAY)
+                
+                if progress['deleted'] + len(batch) >= amount:
+                    break
+                
+                if time.monotonic() - last_report >= BULK_PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    await status.edit(embed=self.build_purge_embed(progress, amount))
             
-            msg = await ctx.send(embed=embed)
-            await msg.delete(delay=5)
+            await flush()
+            await ctx.message.delete()
+            finished = True
         except discord.Forbidden:
             await ctx.send("❌ I don't have permission to delete messages.")
         except Exception as e:
             await ctx.send(f"❌ Error purging messages: {str(e)}")
+        finally:
+            # Never leave the "Purging" embed behind when the purge stops early
+            try:
+                if finished:
+                    await status.edit(embed=self.build_purge_embed(progress, amount, finished=True))
+                    await status.delete(delay=5)
+                else:
+                    await status.delete()
+            except discord.HTTPException:
+                pass
+    
+    def build_purge_embed(self, progress, amount, finished=False):
+        """Build the progress embed for a purge."""
+        embed = discord.Embed(
+            title="✅ Messages Purged" if finished else "⏳ Purging Messages",
+            description=f"Deleted {progress['deleted']} message(s).",
+            color=discord.Color.green() if finished else discord.Color.orange()
+        )
+        if not finished:
+            embed.set_footer(text=f"Scanned {progress['scanned']} | Target {amount}")
+        return embed
     
     @commands.command(name='warn')
     @commands.has_permissions(manage_messages=True)
     async def warn(self, ctx, member: discord.Member, *, reason="No reason provided"):
         """Warn a member."""
-        warnings = self.load_warnings(ctx.guild.id)
-        
-        if str(member.id) not in warnings:
-            warnings[str(member.id)] = []
-        
-        warning = {
-            'reason': reason,
-            'moderator': str(ctx.author),
-            'timestamp': str(ctx.message.created_at)
-        }
-        
-        warnings[str(member.id)].append(warning)
-        self.save_warnings(ctx.guild.id, warnings)
-        
-        warn_count = len(warnings[str(member.id)])
+        warn_count = self.db.add_warning(
+            ctx.guild.id, member.id, str(ctx.author), reason, ctx.message.created_at
+        )
+        self.warning_counts.set((ctx.guild.id, member.id), warn_count)
         
         embed = discord.Embed(
             title="⚠️ Warning Issued",
@@ -229,20 +532,21 @@ class Moderation(commands.Cog):
         """View warnings for a member."""
         member = member or ctx.author
         
-        warnings = self.load_warnings(ctx.guild.id)
-        user_warnings = warnings.get(str(member.id), [])
+        warn_count = self.get_warning_count(ctx.guild.id, member.id)
         
-        if not user_warnings:
+        if not warn_count:
             await ctx.send(f"✅ {member.mention} has no warnings.")
             return
         
+        user_warnings = self.db.get_warnings(ctx.guild.id, member.id, limit=5)  # Show last 5
+        
         embed = discord.Embed(
             title=f"⚠️ Warnings for {member.display_name}",
-            description=f"Total: {len(user_warnings)}",
+            description=f"Total: {warn_count}",
             color=discord.Color.orange()
         )
         
-        for i, warning in enumerate(user_warnings[-5:], 1):  # Show last 5
+        for i, warning in enumerate(user_warnings, 1):
             embed.add_field(
                 name=f"Warning #{i}",
                 value=f"**Reason:** {warning.get('reason', 'N/A')}\n**By:** {warning.get('moderator', 'Unknown')}\n**Date:** {warning.get('timestamp', 'Unknown')}",
@@ -250,6 +554,82 @@ class Moderation(commands.Cog):
             )
         
         await ctx.send(embed=embed)
+    
+    @commands.group(name='raid', invoke_without_command=True)
+    @commands.guild_only()
+    async def raid(self, ctx):
+        """Bulk moderation for raids. Usage: !raid <preview|ban|kick|timeout> <since> [pattern]"""
+        embed = discord.Embed(
+            title="🛡️ Raid Response",
+            description="Act on everyone who joined recently, optionally filtered by a name regex.",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Dry run", value="`!raid preview 10m [pattern]`", inline=False)
+        embed.add_field(name="Ban", value="`!raid ban 10m [pattern]`", inline=False)
+        embed.add_field(name="Kick", value="`!raid kick 10m [pattern]`", inline=False)
+        embed.add_field(name="Timeout", value="`!raid timeout 10m 1h [pattern]`", inline=False)
+        await ctx.send(embed=embed)
+    
+    @raid.command(name='preview', aliases=['dryrun'])
+    @commands.has_permissions(kick_members=True)
+    async def raid_preview(self, ctx, since: str, *, pattern: str = None):
+        """List the members a raid action would hit, without acting."""
+        targets = await self.resolve_raid_targets(ctx, since, pattern)
+        if not targets:
+            return
+        
+        now = datetime.now(timezone.utc)
+        lines = [
+            f"• {m} ({int((now - m.joined_at).total_seconds() // 60)}m ago)"
+            for m in targets[-20:]
+        ]
+        
+        embed = discord.Embed(
+            title="🔍 Raid Preview (dry run)",
+            description="\n".join(lines),
+            color=discord.Color.orange()
+        )
+        if len(targets) > 20:
+            embed.set_footer(text=f"Showing newest 20 of {len(targets)} members")
+        else:
+            embed.set_footer(text=f"{len(targets)} member(s) matched")
+        await ctx.send(embed=embed)
+    
+    @raid.command(name='ban')
+    @commands.has_permissions(ban_members=True)
+    @commands.bot_has_permissions(ban_members=True)
+    async def raid_ban(self, ctx, since: str, *, pattern: str = None):
+        """Ban everyone who joined in the last `since`. Usage: !raid ban 10m [pattern]"""
+        targets = await self.resolve_raid_targets(ctx, since, pattern)
+        if targets:
+            await self.run_bulk_ban(ctx, targets, f"Raid cleanup by {ctx.author}")
+    
+    @raid.command(name='kick')
+    @commands.has_permissions(kick_members=True)
+    @commands.bot_has_permissions(kick_members=True)
+    async def raid_kick(self, ctx, since: str, *, pattern: str = None):
+        """Kick everyone who joined in the last `since`. Usage: !raid kick 10m [pattern]"""
+        targets = await self.resolve_raid_targets(ctx, since, pattern)
+        if targets:
+            reason = f"Raid cleanup by {ctx.author}"
+            await self.run_bulk_action(ctx, "Raid Kick", targets, lambda m: m.kick(reason=reason))
+    
+    @raid.command(name='timeout', aliases=['mute'])
+    @commands.has_permissions(moderate_members=True)
+    @commands.bot_has_permissions(moderate_members=True)
+    async def raid_timeout(self, ctx, since: str, duration: str, *, pattern: str = None):
+        """Timeout everyone who joined in the last `since`. Usage: !raid timeout 10m 1h [pattern]"""
+        seconds = parse_duration(duration)
+        if not seconds or seconds > 2419200:  # Discord allows up to 28 days
+            await ctx.send("❌ Invalid timeout duration. Use: 1h, 30m, etc. (max 28 days)")
+            return
+        
+        targets = await self.resolve_raid_targets(ctx, since, pattern)
+        if targets:
+            await self.run_bulk_action(
+                ctx, "Raid Timeout", targets,
+                lambda m: self.apply_timeout(m, seconds, "Raid cleanup", ctx.author)
+            )
 
 
 async def setup(bot):
@@ -5,24 +5,10 @@ MUSIC COG - FIXED DUPLICATE MESSAGE ISSUE
 import discord
 from discord.ext import commands
 from discord import FFmpegPCMAudio
-import yt_dlp
 import asyncio
 import os
 
-# yt-dlp options
-ytdl_opts = {
-    'format': 'bestaudio/best',
-    'noplaylist': True,
-    'quiet': False,
-    'no_warnings': False,
-    'default_search': 'ytsearch',
-    'extractaudio': True,
-    'audioformat': 'mp3',
-    'nocheckcertificate': True,
-    'ignoreerrors': False,
-    'logtostderr': False,
-    'geo_bypass': True
-}
+from utils.media import extract_info
 
 ffmpeg_opts = {
     'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
@@ -37,6 +23,13 @@ class Music(commands.Cog):
         self.current_songs = {}
         self.ffmpeg_path = 'ffmpeg.exe' if os.path.exists('ffmpeg.exe') else 'ffmpeg'
     
+    def export_state(self):
+        """Hand live queues and voice connections to the reloaded cog."""
+        return self.queues, self.voice_clients, self.current_songs
+    
+    def import_state(self, state):
+        self.queues, self.voice_clients, self.current_songs = state
+    
     def get_queue(self, guild_id):
         if guild_id not in self.queues:
             self.queues[guild_id] = []
@@ -61,126 +54,126 @@ class Music(commands.Cog):
         search_msg = await ctx.send("🔍 **Searching for your song...**")
         
         try:
-            with yt_dlp.YoutubeDL(ytdl_opts) as ytdl:
-                # Format query for search
-                if not query.startswith(('http://', 'https://', 'www.')):
-                    search_query = f"ytsearch:{query}"
-                else:
-                    search_query = query
-                
-                print(f"Searching for: {search_query}")
-                
-                info = ytdl.extract_info(search_query, download=False)
-                
-                # Handle search results
-                if 'entries' in info:
-                    if info['entries']:
-                        video = info['entries'][0]
-                    else:
-                        await search_msg.delete()
-                        await ctx.send("❌ No results found!")
-                        return
+            # Format query for search
+            if not query.startswith(('http://', 'https://', 'www.')):
+                search_query = f"ytsearch:{query}"
+            else:
+                search_query = query
+            
+            print(f"Searching for: {search_query}")
+            
+            # yt-dlp blocks on network I/O, so keep it off the event loop
+            info = await self.bot.loop.run_in_executor(None, extract_info, search_query)
+            
+            # Handle search results
+            if 'entries' in info:
+                if info['entries']:
+                    video = info['entries'][0]
                 else:
-                    video = info
-                
-                # Get the URL
-                url = None
-                if 'url' in video:
-                    url = video['url']
-                elif 'formats' in video:
-                    for fmt in video['formats']:
-                        if fmt.get('acodec') != 'none':
-                            url = fmt.get('url')
-                            if url:
-                                break
-                
-                if not url:
                     await search_msg.delete()
-                    await ctx.send("❌ Could not get audio URL")
+                    await ctx.send("❌ No results found!")
                     return
-                
-                title = video.get('title', 'Unknown Title')
-                webpage_url = video.get('webpage_url', video.get('original_url', ''))
-                thumbnail = video.get('thumbnail', '')
-                
-                song = {
-                    'url': url,
-                    'title': title,
-                    'webpage_url': webpage_url,
-                    'thumbnail': thumbnail
-                }
-                
-                queue = self.get_queue(ctx.guild.id)
-                current_song = self.current_songs.get(ctx.guild.id)
-                
+            else:
+                video = info
+            
+            # Get the URL
+            url = None
+            if 'url' in video:
+                url = video['url']
+            elif 'formats' in video:
+                for fmt in video['formats']:
+                    if fmt.get('acodec') != 'none':
+                        url = fmt.get('url')
+                        if url:
+                            break
+            
+            if not url:
                 await search_msg.delete()
-                
-                # Check if already playing this exact song
-                if current_song and current_song['url'] == song['url']:
-                    embed = discord.Embed(
-                        title="ℹ️ Already Playing",
-                        description=f"[{title}]({webpage_url}) is currently playing!",
-                        color=discord.Color.orange()
-                    )
-                    if thumbnail:
-                        embed.set_thumbnail(url=thumbnail)
-                    await ctx.send(embed=embed)
-                    return
-                
-                # Check if song is already in queue
-                is_in_queue = any(s['url'] == song['url'] for s in queue)
-                if is_in_queue:
-                    embed = discord.Embed(
-                        title="ℹ️ Already in Queue",
-                        description=f"[{title}]({webpage_url}) is already in the queue!",
-                        color=discord.Color.orange()
-                    )
-                    if thumbnail:
-                        embed.set_thumbnail(url=thumbnail)
-                    await ctx.send(embed=embed)
-                    return
-                
-                # Check if currently playing anything
-                is_playing = (self.voice_clients[ctx.guild.id].is_playing() or 
-                            self.voice_clients[ctx.guild.id].is_paused())
-                
-                if not is_playing and not queue:
-                    # Case 1: First song - play immediately without adding to queue
-                    self.current_songs[ctx.guild.id] = song
-                    await self._play_song(ctx.guild.id, song)
-                    
-                    embed = discord.Embed(
-                        title="▶️ Now Playing",
-                        description=f"[{title}]({webpage_url})",
-                        color=discord.Color.green()
-                    )
-                elif is_playing:
-                    # Case 2: Something is already playing - add to queue
-                    queue.append(song)
-                    embed = discord.Embed(
-                        title="🎵 Added to Queue",
-                        description=f"[{title}]({webpage_url})",
-                        color=discord.Color.blue()
-                    )
-                    embed.set_footer(text=f"Position in queue: {len(queue)}")
-                else:
-                    # Case 3: Queue is not empty but nothing is playing - start playing from queue
-                    queue.insert(0, song)  # Add to front of queue
-                    next_song = queue.pop(0)
-                    self.current_songs[ctx.guild.id] = next_song
-                    await self._play_song(ctx.guild.id, next_song)
-                    
-                    embed = discord.Embed(
-                        title="▶️ Now Playing",
-                        description=f"[{title}]({webpage_url})",
-                        color=discord.Color.green()
-                    )
-                
-                # Send the appropriate embed message
+                await ctx.send("❌ Could not get audio URL")
+                return
+            
+            title = video.get('title', 'Unknown Title')
+            webpage_url = video.get('webpage_url', video.get('original_url', ''))
+            thumbnail = video.get('thumbnail', '')
+            
+            song = {
+                'url': url,
+                'title': title,
+                'webpage_url': webpage_url,
+                'thumbnail': thumbnail
+            }
+            
+            queue = self.get_queue(ctx.guild.id)
+            current_song = self.current_songs.get(ctx.guild.id)
+            
+            await search_msg.delete()
+            
+            # Check if already playing this exact song
+            if current_song and current_song['url'] == song['url']:
+                embed = discord.Embed(
+                    title="ℹ️ Already Playing",
+                    description=f"[{title}]({webpage_url}) is currently playing!",
+                    color=discord.Color.orange()
+                )
                 if thumbnail:
                     embed.set_thumbnail(url=thumbnail)
                 await ctx.send(embed=embed)
-                    
+                return
+            
+            # Check if song is already in queue
+            is_in_queue = any(s['url'] == song['url'] for s in queue)
+            if is_in_queue:
+                embed = discord.Embed(
+                    title="ℹ️ Already in Queue",
+                    description=f"[{title}]({webpage_url}) is already in the queue!",
+                    color=discord.Color.orange()
+                )
+                if thumbnail:
+                    embed.set_thumbnail(url=thumbnail)
+                await ctx.send(embed=embed)
+                return
+            
+            # Check if currently playing anything
+            is_playing = (self.voice_clients[ctx.guild.id].is_playing() or 
+                        self.voice_clients[ctx.guild.id].is_paused())
+            
+            if not is_playing and not queue:
+                # Case 1: First song - play immediately without adding to queue
+                self.current_songs[ctx.guild.id] = song
+                await self._play_song(ctx.guild.id, song)
+                
+                embed = discord.Embed(
+                    title="▶️ Now Playing",
+                    description=f"[{title}]({webpage_url})",
+                    color=discord.Color.green()
+                )
+            elif is_playing:
+                # Case 2: Something is already playing - add to queue
+                queue.append(song)
+                embed = discord.Embed(
+                    title="🎵 Added to Queue",
+                    description=f"[{title}]({webpage_url})",
+                    color=discord.Color.blue()
+                )
+                embed.set_footer(text=f"Position in queue: {len(queue)}")
+            else:
+                # Case 3: Queue is not empty but nothing is playing - start playing from queue
+                queue.insert(0, song)  # Add to front of queue
+                next_song = queue.pop(0)
+                self.current_songs[ctx.guild.id] = next_song
+                await self._play_song(ctx.guild.id, next_song)
+                
+                embed = discord.Embed(
+                    title="▶️ Now Playing",
+                    description=f"[{title}]({webpage_url})",
+                    color=discord.Color.green()
+                )
+            
+            # Send the appropriate embed message
+            if thumbnail:
+                embed.set_thumbnail(url=thumbnail)
+            await ctx.send(embed=embed)
+        
         except Exception as e:
             await search_msg.delete()
             print(f"Error: {e}")
@@ -199,8 +192,9 @@ class Music(commands.Cog):
             if guild_id in self.current_songs:
                 del self.current_songs[guild_id]
             
-            # Play next song from queue
-            asyncio.run_coroutine_threadsafe(self._play_next(guild_id), self.bot.loop) 
+            # Play next song from queue (on the current cog instance if it was reloaded)
+            music = self.bot.get_cog('Music') or self
+            asyncio.run_coroutine_threadsafe(music._play_next(guild_id), self.bot.loop)
         
         try:
             # Stop any currently playing track
@@ -6,8 +6,39 @@ Fetch news from various sources using NewsAPI.
 import discord
 from discord.ext import commands
 import aiohttp
+import asyncio
 import os
 from datetime import datetime, timezone
+from database import Database
+from utils.news import CATEGORY_MAP, NewsAPIError, NewsService
+from utils.sharding import owns_guild
+
+DIGEST_CHECK_INTERVAL = 300  # Seconds between checks for due digests
+DIGEST_SIZE = 5
+DIGEST_CONCURRENCY = 5  # Concurrent channel sends when fanning out a digest
+
+
+def build_headlines_embed(category, articles, limit, title=None):
+    """Render top headlines as an embed."""
+    embed = discord.Embed(
+        title=title or f"📰 Latest {category.title()} News",
+        color=discord.Color.blue(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    for i, article in enumerate(articles[:limit], 1):
+        headline = article.get('title', 'No title')[:250]
+        url = article.get('url', '#')
+        source = article.get('source', {}).get('name', 'Unknown')
+        
+        embed.add_field(
+            name=f"{i}. {headline}",
+            value=f"[Read more]({url}) | Source: {source}",
+            inline=False
+        )
+    
+    embed.set_footer(text=f"NewsAPI | {min(len(articles), limit)} article(s)")
+    return embed
 
 
 class News(commands.Cog):
@@ -17,6 +48,9 @@ class News(commands.Cog):
         self.bot = bot
         self.api_key = os.getenv('NEWS_API_KEY')
         self.api_url = "https://newsapi.org/v2"
+        self.service = NewsService(self.api_key, self.api_url)
+        self.db = Database()
+        self.digest_task = self.bot.loop.create_task(self.send_digests())
     
     @commands.command(name='news')
     @commands.cooldown(1, 10, commands.BucketType.user)
@@ -36,64 +70,29 @@ class News(commands.Cog):
         if limit < 1 or limit > 10:
             limit = 5
         
-        category_map = {
-            'tech': 'technology',
-            'business': 'business',
-            'sports': 'sports',
-            'health': 'health',
-            'science': 'science',
-            'general': 'general'
-        }
-        
-        category = category_map.get(category.lower(), 'general')
+        category = CATEGORY_MAP.get(category.lower(), 'general')
         
         async with ctx.typing():
             try:
-                async with aiohttp.ClientSession() as session:
-                    headers = {'X-Api-Key': self.api_key}
-                    url = f"{self.api_url}/top-headlines"
-                    params = {
-                        'category': category,
-                        'country': 'us',  # Can be changed to other countries
-                        'pageSize': limit
-                    }
-                    
-                    async with session.get(url, headers=headers, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            articles = data.get('articles', [])
-                            
-                            if not articles:
-                                await ctx.send(f"❌ No news found for category '{category}'.")
-                                return
-                            
-                            embed = discord.Embed(
-                                title=f"📰 Latest {category.title()} News",
-                                color=discord.Color.blue(),
-                                timestamp=datetime.now(timezone.utc)
-                            )
-                            
-                            for i, article in enumerate(articles[:limit], 1):
-                                title = article.get('title', 'No title')[:256]
-                                url = article.get('url', '#')
-                                source = article.get('source', {}).get('name', 'Unknown')
-                                
-                                embed.add_field(
-                                    name=f"{i}. {title}",
-                                    value=f"[Read more]({url}) | Source: {source}",
-                                    inline=False
-                                )
-                            
-                            embed.set_footer(text=f"NewsAPI | {len(articles)} article(s)")
-                            await ctx.send(embed=embed)
-                        elif response.status == 401:
-                            await ctx.send("❌ Invalid News API key. Check your NEWS_API_KEY.")
-                        else:
-                            await ctx.send("❌ Could not fetch news. Try again later.")
+                articles = await self.service.get_headlines(category)
+            except NewsAPIError as e:
+                if e.status == 401:
+                    await ctx.send("❌ Invalid News API key. Check your NEWS_API_KEY.")
+                else:
+                    await ctx.send("❌ Could not fetch news. Try again later.")
+                return
             except aiohttp.ClientError:
                 await ctx.send("❌ Error connecting to news service. Try again later.")
+                return
             except Exception as e:
                 await ctx.send(f"❌ Error: {str(e)}")
+                return
+            
+            if not articles:
+                await ctx.send(f"❌ No news found for category '{category}'.")
+                return
+            
+            await ctx.send(embed=build_headlines_embed(category, articles, limit))
     
     @commands.command(name='newssearch', aliases=['searchnews'])
     @commands.cooldown(1, 10, commands.BucketType.user)
@@ -105,49 +104,164 @@ class News(commands.Cog):
         
         async with ctx.typing():
             try:
-                async with aiohttp.ClientSession() as session:
-                    headers = {'X-Api-Key': self.api_key}
-                    url = f"{self.api_url}/everything"
-                    params = {
-                        'q': query,
-                        'sortBy': 'publishedAt',
-                        'pageSize': 5,
-                        'language': 'en'
-                    }
-                    
-                    async with session.get(url, headers=headers, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            articles = data.get('articles', [])
-                            
-                            if not articles:
-                                await ctx.send(f"❌ No articles found for '{query}'.")
-                                return
-                            
-                            embed = discord.Embed(
-                                title=f"🔍 News Search: {query}",
-                                color=discord.Color.blue()
-                            )
-                            
-                            for i, article in enumerate(articles, 1):
-                                title = article.get('title', 'No title')[:256]
-                                url = article.get('url', '#')
-                                source = article.get('source', {}).get('name', 'Unknown')
-                                published = article.get('publishedAt', '')[:10]
-                                
-                                embed.add_field(
-                                    name=f"{i}. {title}",
-                                    value=f"[Read more]({url})\nSource: {source} | {published}",
-                                    inline=False
-                                )
-                            
-                            await ctx.send(embed=embed)
-                        else:
-                            await ctx.send("❌ Could not search news. Try again later.")
+                articles = await self.service.search(query)
+            except (NewsAPIError, aiohttp.ClientError):
+                await ctx.send("❌ Could not search news. Try again later.")
+                return
             except Exception as e:
                 await ctx.send(f"❌ Error: {str(e)}")
+                return
+            
+            if not articles:
+                await ctx.send(f"❌ No articles found for '{query}'.")
+                return
+            
+            embed = discord.Embed(
+                title=f"🔍 News Search: {query}",
+                color=discord.Color.blue()
+            )
+            
+            for i, article in enumerate(articles[:5], 1):
+                title = article.get('title', 'No title')[:250]
+                url = article.get('url', '#')
+                source = article.get('source', {}).get('name', 'Unknown')
+                published = article.get('publishedAt', '')[:10]
+                
+                embed.add_field(
+                    name=f"{i}. {title}",
+                    value=f"[Read more]({url})\nSource: {source} | {published}",
+                    inline=False
+                )
+            
+            await ctx.send(embed=embed)
+    
+    async def send_digests(self):
+        """Background task to deliver due digests, fetching each category once."""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            if self.api_key:
+                try:
+                    await self.deliver_due_digests()
+                except Exception as e:
+                    print(f"Error sending news digests: {e}")
+            
+            await asyncio.sleep(DIGEST_CHECK_INTERVAL)
+    
+    async def deliver_due_digests(self):
+        """Fetch headlines once per due category and fan them out to subscribed channels."""
+        now = datetime.now(timezone.utc)
+        by_category = {}
+        removed_guilds = set()
+        for sub in self.db.get_due_news_subscriptions(now):
+            if not owns_guild(self.bot, sub['guild_id']):
+                continue  # Delivered by the process running that guild's shard
+            if sub['guild_id'] in removed_guilds:
+                continue
+            if self.bot.get_channel(sub['channel_id']) is None:
+                guild = self.bot.get_guild(sub['guild_id'])
+                if guild is None:
+                    # Left while offline, so on_guild_remove never fired
+                    self.db.clear_news_subscriptions(guild_id=sub['guild_id'])
+                    removed_guilds.add(sub['guild_id'])
+                    continue
+                if guild.unavailable:
+                    continue  # Outage; retried on the next check without fetching headlines
+            by_category.setdefault(sub['category'], []).append(sub)
+        
+        semaphore = asyncio.Semaphore(DIGEST_CONCURRENCY)
+        
+        async def deliver(sub, embed):
+            """Send one digest, dropping the subscription if its channel is gone."""
+            channel = self.bot.get_channel(sub['channel_id'])
+            async with semaphore:
+                try:
+                    if channel is None:
+                        channel = await self.bot.fetch_channel(sub['channel_id'])
+                    await channel.send(embed=embed)
+                except discord.NotFound:
+                    self.db.remove_news_subscription(sub['channel_id'], sub['category'])
+                except (discord.Forbidden, discord.HTTPException) as e:
+                    print(f"Error sending news digest to {sub['channel_id']}: {e}")
+        
+        for category, subs in by_category.items():
+            try:
+                articles = await self.service.get_headlines(category)
+            except (NewsAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Error fetching {category} digest: {e}")
+                continue  # Retried on the next check
+            
+            if articles:
+                embed = build_headlines_embed(
+                    category, articles, DIGEST_SIZE, title=f"🗞️ Daily {category.title()} Digest"
+                )
+                await asyncio.gather(*(deliver(sub, embed) for sub in subs))
+            self.db.mark_news_sent([sub['id'] for sub in subs], now)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        """Drop digests for a deleted channel."""
+        self.db.clear_news_subscriptions(channel_id=channel.id)
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        """Drop digests for a guild the bot left."""
+        self.db.clear_news_subscriptions(guild_id=guild.id)
+    
+    @commands.command(name='newssub', aliases=['newssubscribe', 'digest'])
+    @commands.guild_only()
+    @commands.has_permissions(manage_channels=True)
+    async def newssub(self, ctx, category: str = 'general', hour: int = 8):
+        """Post a daily headline digest in this channel. Usage: !newssub [category] [hour UTC]"""
+        if not self.api_key:
+            await ctx.send("❌ News API key not configured. Get one at: https://newsapi.org/register")
+            return
+        
+        if category.lower() not in CATEGORY_MAP:
+            await ctx.send(f"❌ Unknown category. Choose from: {', '.join(sorted(set(CATEGORY_MAP.values())))}")
+            return
+        
+        if not 0 <= hour <= 23:
+            await ctx.send("❌ Hour must be between 0 and 23 (UTC).")
+            return
+        
+        category = CATEGORY_MAP[category.lower()]
+        self.db.add_news_subscription(ctx.guild.id, ctx.channel.id, category, hour)
+        await ctx.send(f"✅ {ctx.channel.mention} will get the {category} digest daily at {hour:02d}:00 UTC.")
+    
+    @commands.command(name='newsunsub', aliases=['newsunsubscribe'])
+    @commands.guild_only()
+    @commands.has_permissions(manage_channels=True)
+    async def newsunsub(self, ctx, category: str = 'general'):
+        """Stop a daily digest in this channel. Usage: !newsunsub [category]"""
+        category = CATEGORY_MAP.get(category.lower(), category.lower())
+        if self.db.remove_news_subscription(ctx.channel.id, category):
+            await ctx.send(f"✅ Unsubscribed {ctx.channel.mention} from the {category} digest.")
+        else:
+            await ctx.send(f"❌ {ctx.channel.mention} is not subscribed to the {category} digest.")
+    
+    @commands.command(name='newssubs', aliases=['digests'])
+    @commands.guild_only()
+    async def newssubs(self, ctx):
+        """List this server's news digest subscriptions."""
+        subs = self.db.get_news_subscriptions(ctx.guild.id)
+        if not subs:
+            await ctx.send("❌ No news digests are set up. Use `!newssub [category] [hour]`.")
+            return
+        
+        lines = [f"<#{sub['channel_id']}> • {sub['category'].title()} at {sub['hour']:02d}:00 UTC" for sub in subs]
+        embed = discord.Embed(
+            title="🗞️ News Digests",
+            description="\n".join(lines),
+            color=discord.Color.blue()
+        )
+        await ctx.send(embed=embed)
+    
+    async def cog_unload(self):
+        """Stop the digest scheduler and close the shared HTTP session."""
+        self.digest_task.cancel()
+        await self.service.close()
 
 
 async def setup(bot):
     await bot.add_cog(News(bot))
-
@@ -7,6 +7,15 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncio
+from datetime import datetime, timedelta, timezone
+from database import Database
+from utils.sharding import owns_guild
+
+# How long reaction polls are tallied: older ones are not reloaded on startup
+# and are dropped from memory once their votes are saved
+POLL_TALLY_DAYS = 30
+# Seconds between flushes of changed vote counts to the database
+POLL_FLUSH_INTERVAL = 30
 
 
 class Polls(commands.Cog):
@@ -14,7 +23,106 @@ class Polls(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.active_polls = {}  # Store active polls
+        self.db = Database()
+        self.active_polls = {}  # message_id -> reaction poll tally
+        self.latest_polls = {}  # channel_id -> message_id of newest poll
+        self.dirty_polls = set()  # message_ids with unsaved vote changes
+        self.load_polls()
+        self.flush_task = self.bot.loop.create_task(self.flush_votes())
+    
+    def load_polls(self):
+        """Load recent reaction polls into the in-memory tally."""
+        since = datetime.now(timezone.utc) - timedelta(days=POLL_TALLY_DAYS)
+        for poll in self.db.get_polls_since(since):
+            if not owns_guild(self.bot, poll['guild_id']):
+                continue
+            self.active_polls[poll['message_id']] = poll
+            self.latest_polls[poll['channel_id']] = poll['message_id']
+    
+    def register_poll(self, ctx, msg, question, options):
+        """Start tallying reactions on a newly created poll message."""
+        poll_id = self.db.add_poll(
+            ctx.guild.id if ctx.guild else 0, ctx.channel.id, msg.id,
+            question, options, ctx.author.id
+        )
+        self.active_polls[msg.id] = {
+            'poll_id': poll_id,
+            'guild_id': ctx.guild.id if ctx.guild else 0,
+            'channel_id': ctx.channel.id,
+            'message_id': msg.id,
+            'question': question,
+            'options': options,
+            'votes': {option['emoji']: 0 for option in options},
+            'creator_id': ctx.author.id
+        }
+        self.latest_polls[ctx.channel.id] = msg.id
+    
+    def save_votes(self):
+        """Write changed vote counts to the database."""
+        if not self.dirty_polls:
+            return
+        
+        dirty, self.dirty_polls = self.dirty_polls, set()
+        self.db.update_poll_votes({
+            message_id: self.active_polls[message_id]['votes']
+            for message_id in dirty if message_id in self.active_polls
+        })
+    
+    def prune_polls(self):
+        """Stop tallying polls older than POLL_TALLY_DAYS whose votes are saved."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=POLL_TALLY_DAYS)
+        expired = [
+            message_id for message_id in self.active_polls
+            if message_id not in self.dirty_polls and discord.utils.snowflake_time(message_id) < cutoff
+        ]
+        for message_id in expired:
+            poll = self.active_polls.pop(message_id)
+            if self.latest_polls.get(poll['channel_id']) == message_id:
+                del self.latest_polls[poll['channel_id']]
+        return len(expired)
+    
+    async def flush_votes(self):
+        """Background task to persist vote counts periodically."""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            await asyncio.sleep(POLL_FLUSH_INTERVAL)
+            try:
+                self.save_votes()
+                self.prune_polls()
+            except Exception as e:
+                print(f"Error saving poll votes: {e}")
+    
+    def apply_reaction(self, payload, delta):
+        """Adjust the tally for a raw reaction event on a tracked poll."""
+        poll = self.active_polls.get(payload.message_id)
+        if poll is None or payload.user_id == self.bot.user.id:
+            return
+        
+        emoji = str(payload.emoji)
+        if emoji not in poll['votes']:
+            return
+        
+        poll['votes'][emoji] = max(poll['votes'][emoji] + delta, 0)
+        self.dirty_polls.add(payload.message_id)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        """Count a vote when a poll option reaction is added."""
+        self.apply_reaction(payload, 1)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        """Remove a vote when a poll option reaction is removed."""
+        self.apply_reaction(payload, -1)
+    
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        """Stop tallying polls whose message was deleted."""
+        if self.active_polls.pop(payload.message_id, None) is not None:
+            self.dirty_polls.discard(payload.message_id)
+            if self.latest_polls.get(payload.channel_id) == payload.message_id:
+                del self.latest_polls[payload.channel_id]
     
     @commands.command(name='poll', aliases=['vote'])
     async def poll(self, ctx, question: str, *, options: str = None):
@@ -30,6 +138,10 @@ class Polls(commands.Cog):
             embed.add_field(name="❌ No", value="React with ❌", inline=True)
             
             msg = await ctx.send(embed=embed)
+            self.register_poll(ctx, msg, question, [
+                {'emoji': '✅', 'label': 'Yes'},
+                {'emoji': '❌', 'label': 'No'}
+            ])
             await msg.add_reaction('✅')
             await msg.add_reaction('❌')
         else:
@@ -58,6 +170,10 @@ class Polls(commands.Cog):
             embed.set_footer(text=f"Poll created by {ctx.author.display_name}")
             
             msg = await ctx.send(embed=embed)
+            self.register_poll(ctx, msg, question, [
+                {'emoji': number_emojis[i], 'label': option}
+                for i, option in enumerate(option_list)
+            ])
             
             # Add reactions
             for i in range(len(option_list)):
@@ -78,6 +194,54 @@ class Polls(commands.Cog):
         # Create buttons
         view = PollView(question)
         await ctx.send(embed=embed, view=view)
+    
+    @commands.command(name='pollresults', aliases=['results'])
+    @commands.guild_only()
+    async def pollresults(self, ctx, message_id: int = None):
+        """Show results of a reaction poll. Usage: !pollresults [message_id]"""
+        if message_id is None:
+            message_id = self.latest_polls.get(ctx.channel.id)
+        
+        poll = self.active_polls.get(message_id) if message_id else None
+        # Polls are looked up by message ID, so don't reveal other servers' polls
+        if not poll or poll['guild_id'] != ctx.guild.id:
+            await ctx.send("❌ No poll found. Pass a poll message ID, or create one with `!poll`.")
+            return
+        
+        total = sum(poll['votes'].values())
+        
+        embed = discord.Embed(
+            title=f"📊 Results: {poll['question']}",
+            color=discord.Color.blue()
+        )
+        
+        for option in poll['options']:
+            count = poll['votes'].get(option['emoji'], 0)
+            percent = int(count / total * 100) if total else 0
+            bar = "█" * int(count / total * 20) if total else ""
+            embed.add_field(
+                name=f"{option['emoji']} {option['label']} ({count})",
+                value=f"{bar} {percent}%" if bar else f"{percent}%",
+                inline=False
+            )
+        
+        jump_url = f"https://discord.com/channels/{poll['guild_id'] or '@me'}/{poll['channel_id']}/{poll['message_id']}"
+        embed.description = f"[Jump to poll]({jump_url})"
+        embed.set_footer(text=f"Total votes: {total}")
+        
+        await ctx.send(embed=embed)
+    
+    def export_state(self):
+        """Hand live tallies to the reloaded cog instead of re-reading them from the database."""
+        return self.active_polls, self.latest_polls
+    
+    def import_state(self, state):
+        self.active_polls, self.latest_polls = state
+    
+    def cog_unload(self):
+        """Stop the flush task and save pending votes."""
+        self.flush_task.cancel()
+        self.save_votes()
 
 
 class PollView(discord.ui.View):
@@ -69,7 +69,7 @@ class AutoReactions(commands.Cog):
             return
         
         # Don't react to commands
-        if message.content.startswith(self.bot.command_prefix):
+        if self.bot.prefixes.is_command(message):
             return
         
         content_lower = message.content.lower()
@@ -7,9 +7,9 @@ import discord
 from discord.ext import commands
 import asyncio
 from datetime import datetime, timedelta
-from pathlib import Path
-import json
 from utils.helpers import parse_duration
+from utils.sharding import owns_guild
+from utils.storage import open_store
 
 
 class Reminders(commands.Cog):
@@ -17,26 +17,12 @@ class Reminders(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_dir = Path('data')
-        self.data_dir.mkdir(exist_ok=True)
-        self.reminders_file = self.data_dir / 'reminders.json'
-        self.reminders = self.load_reminders()
+        self.reminders = open_store('reminders')  # reminder_id -> reminder
         self.bot.loop.create_task(self.check_reminders())
     
-    def load_reminders(self):
-        """Load reminders from file."""
-        if self.reminders_file.exists():
-            try:
-                with open(self.reminders_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-    
-    def save_reminders(self):
-        """Save reminders to file."""
-        with open(self.reminders_file, 'w') as f:
-            json.dump(self.reminders, f, indent=2)
+    async def save_reminders(self):
+        """Persist added and removed reminders."""
+        await self.reminders.flush_async()
     
     async def check_reminders(self):
         """Background task to check and send reminders."""
@@ -47,36 +33,28 @@ class Reminders(commands.Cog):
                 current_time = datetime.utcnow()
                 reminders_to_remove = []
                 
-                for reminder_id, reminder_data in self.reminders.items():
+                for reminder_id, reminder_data in list(self.reminders.items()):
+                    if not owns_guild(self.bot, reminder_data.get('guild_id', 0)):
+                        continue
+                    
                     remind_time = datetime.fromisoformat(reminder_data['remind_at'])
                     
                     if current_time >= remind_time:
                         # Send reminder
                         try:
                             user = self.bot.get_user(reminder_data['user_id'])
-                            if user:
-                                embed = discord.Embed(
-                                    title="⏰ Reminder",
-                                    description=reminder_data['message'],
-                                    color=discord.Color.blue(),
-                                    timestamp=datetime.utcnow()
-                                )
-                                await user.send(embed=embed)
-                            else:
-                                # Try to get from guild
-                                guild = self.bot.get_guild(reminder_data.get('guild_id', 0))
-                                if guild:
-                                    member = guild.get_member(reminder_data['user_id'])
-                                    if member:
-                                        embed = discord.Embed(
-                                            title="⏰ Reminder",
-                                            description=reminder_data['message'],
-                                            color=discord.Color.blue(),
-                                            timestamp=datetime.utcnow()
-                                        )
-                                        await member.send(embed=embed)
-                        except discord.Forbidden:
-                            pass  # User has DMs disabled
+                            if user is None:
+                                # Not cached under a reduced member cache; a DM only needs the id
+                                user = await self.bot.fetch_user(reminder_data['user_id'])
+                            embed = discord.Embed(
+                                title="⏰ Reminder",
+                                description=reminder_data['message'],
+                                color=discord.Color.blue(),
+                                timestamp=datetime.utcnow()
+                            )
+                            await user.send(embed=embed)
+                        except (discord.Forbidden, discord.NotFound):
+                            pass  # User has DMs disabled or no longer exists
                         except Exception as e:
                             print(f"Error sending reminder: {e}")
                         
@@ -87,7 +65,7 @@ class Reminders(commands.Cog):
                     del self.reminders[reminder_id]
                 
                 if reminders_to_remove:
-                    self.save_reminders()
+                    await self.save_reminders()
                 
                 await asyncio.sleep(30)  # Check every 30 seconds
             except Exception as e:
@@ -118,7 +96,7 @@ class Reminders(commands.Cog):
             'created_at': datetime.utcnow().isoformat()
         }
         
-        self.save_reminders()
+        await self.save_reminders()
         
         embed = discord.Embed(
             title="✅ Reminder Set",
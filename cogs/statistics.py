@@ -5,10 +5,12 @@ Tracks and displays user statistics and server activity.
 
 import discord
 from discord.ext import commands
+import asyncio
 from datetime import datetime, timezone
-import json
-from pathlib import Path
-from utils.helpers import load_json, save_json
+from utils.storage import open_store
+
+# Seconds between flushes of changed statistics
+STATS_FLUSH_INTERVAL = 60
 
 
 class Statistics(commands.Cog):
@@ -16,10 +18,19 @@ class Statistics(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_dir = Path('data')
-        self.data_dir.mkdir(exist_ok=True)
-        self.stats_file = self.data_dir / 'user_stats.json'
-        self.stats = load_json('user_stats.json')
+        self.stats = open_store('user_stats')  # guild_id -> user_id -> stats
+        self.flush_task = self.bot.loop.create_task(self.flush_stats())
+    
+    async def flush_stats(self):
+        """Background task to persist changed guilds periodically."""
+        await self.bot.wait_until_ready()
+        
+        while not self.bot.is_closed():
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+            try:
+                await self.stats.flush_async()
+            except Exception as e:
+                print(f"Error saving statistics: {e}")
     
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -45,12 +56,10 @@ class Statistics(commands.Cog):
         self.stats[guild_id][user_id]['last_seen'] = datetime.now(timezone.utc).isoformat()
         
         # Check if it's a command
-        if message.content.startswith(self.bot.command_prefix):
+        if self.bot.prefixes.is_command(message):
             self.stats[guild_id][user_id]['commands_used'] += 1
         
-        # Save periodically (every 10 messages to reduce I/O)
-        if self.stats[guild_id][user_id]['messages'] % 10 == 0:
-            save_json('user_stats.json', self.stats)
+        self.stats.mark_dirty(guild_id)
     
     @commands.command(name='stats', aliases=['statistics', 'userstats'])
     async def stats(self, ctx, member: discord.Member = None):
@@ -151,18 +160,29 @@ class Statistics(commands.Cog):
         leaderboard_text = []
         for i, (user_id, stats) in enumerate(sorted_users, 1):
             user = ctx.guild.get_member(int(user_id))
-            if user:
-                emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-                value = stats.get(metric_key, 0)
-                leaderboard_text.append(f"{emoji} {user.mention} - {value:,}")
+            if user is None and ctx.guild.chunked:
+                continue  # Left the server
+            # Without a full member cache, mention by id rather than dropping the entry
+            mention = user.mention if user else f"<@{user_id}>"
+            emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+            value = stats.get(metric_key, 0)
+            leaderboard_text.append(f"{emoji} {mention} - {value:,}")
         
         embed.description = "\n".join(leaderboard_text) if leaderboard_text else "No data available"
         
         await ctx.send(embed=embed)
     
+    def export_state(self):
+        """Hand in-memory statistics to the reloaded cog."""
+        return self.stats
+    
+    def import_state(self, state):
+        self.stats = state
+    
     def cog_unload(self):
-        """Save statistics when cog is unloaded."""
-        save_json('user_stats.json', self.stats)
+        """Stop the flush task and save pending statistics."""
+        self.flush_task.cancel()
+        self.stats.flush()
 
 
 async def setup(bot):
@@ -6,7 +6,11 @@ Handles weather-related commands using OpenWeatherMap API.
 import discord
 from discord.ext import commands
 import aiohttp
+import asyncio
 import os
+import re
+from datetime import datetime, timezone
+from utils.weather import MAX_CITIES, WeatherAPIError, WeatherService, summarize_forecast
 
 
 class Weather(commands.Cog):
@@ -17,6 +21,7 @@ class Weather(commands.Cog):
         # Get API key and strip any whitespace
         api_key = os.getenv('WEATHER_API_KEY', '').strip()
         self.api_key = api_key if api_key else None
+        self.service = WeatherService(self.api_key)
     
     @commands.command(name='weather')
     @commands.cooldown(1, 10, commands.BucketType.user)
@@ -33,63 +38,158 @@ class Weather(commands.Cog):
         
         async with ctx.typing():
             try:
-                # Get weather data
-                base_url = "http://api.openweathermap.org/data/2.5/weather"
-                params = {
-                    'q': location,
-                    'appid': self.api_key,
-                    'units': 'metric'  # Use metric units (Celsius)
-                }
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(base_url, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            
-                            # Extract data
-                            city = data['name']
-                            country = data['sys'].get('country', '')
-                            temp = data['main']['temp']
-                            feels_like = data['main']['feels_like']
-                            humidity = data['main']['humidity']
-                            pressure = data['main']['pressure']
-                            description = data['weather'][0]['description'].title()
-                            icon = data['weather'][0]['icon']
-                            wind_speed = data['wind'].get('speed', 0)
-                            visibility = data.get('visibility', 0) / 1000  # Convert to km
-                            
-                            embed = discord.Embed(
-                                title=f"🌤️ Weather in {city}, {country}",
-                                description=f"**{description}**",
-                                color=discord.Color.blue()
-                            )
-                            
-                            embed.set_thumbnail(url=f"http://openweathermap.org/img/wn/{icon}@2x.png")
-                            
-                            embed.add_field(name="🌡️ Temperature", value=f"{temp}°C", inline=True)
-                            embed.add_field(name="🤔 Feels Like", value=f"{feels_like}°C", inline=True)
-                            embed.add_field(name="💧 Humidity", value=f"{humidity}%", inline=True)
-                            embed.add_field(name="🌬️ Wind Speed", value=f"{wind_speed} m/s", inline=True)
-                            embed.add_field(name="📊 Pressure", value=f"{pressure} hPa", inline=True)
-                            embed.add_field(name="👁️ Visibility", value=f"{visibility} km", inline=True)
-                            
-                            await ctx.send(embed=embed)
-                        elif response.status == 401:
-                            await ctx.send(f"❌ Invalid API key. Your weather API key may need activation time (10 minutes - 2 hours) or may be incorrect.\n\nCheck your key at: https://home.openweathermap.org/api_keys")
-                        elif response.status == 404:
-                            await ctx.send(f"❌ Location '{location}' not found. Please check the spelling.")
-                        else:
-                            try:
-                                error_data = await response.json()
-                                await ctx.send(f"❌ Error: {error_data.get('message', 'Unknown error')}")
-                            except:
-                                await ctx.send(f"❌ Error: HTTP {response.status}. Check your API key at https://home.openweathermap.org/api_keys")
+                data = await self.service.get_current(location)
+            except WeatherAPIError as e:
+                if e.status == 401:
+                    await ctx.send(f"❌ Invalid API key. Your weather API key may need activation time (10 minutes - 2 hours) or may be incorrect.\n\nCheck your key at: https://home.openweathermap.org/api_keys")
+                else:
+                    await ctx.send(f"❌ Error: {e}")
+                return
             except aiohttp.ClientError:
                 await ctx.send("❌ Error connecting to weather service. Please try again later.")
+                return
             except Exception as e:
                 await ctx.send(f"❌ Error fetching weather: {str(e)}")
+                return
+            
+            if data is None:
+                await ctx.send(f"❌ Location '{location}' not found. Please check the spelling.")
+                return
+            
+            # Extract data
+            city = data['name']
+            country = data['sys'].get('country', '')
+            temp = data['main']['temp']
+            feels_like = data['main']['feels_like']
+            humidity = data['main']['humidity']
+            pressure = data['main']['pressure']
+            description = data['weather'][0]['description'].title()
+            icon = data['weather'][0]['icon']
+            wind_speed = data['wind'].get('speed', 0)
+            visibility = data.get('visibility', 0) / 1000  # Convert to km
+            
+            embed = discord.Embed(
+                title=f"🌤️ Weather in {city}, {country}",
+                description=f"**{description}**",
+                color=discord.Color.blue()
+            )
+            
+            embed.set_thumbnail(url=f"http://openweathermap.org/img/wn/{icon}@2x.png")
+            
+            embed.add_field(name="🌡️ Temperature", value=f"{temp}°C", inline=True)
+            embed.add_field(name="🤔 Feels Like", value=f"{feels_like}°C", inline=True)
+            embed.add_field(name="💧 Humidity", value=f"{humidity}%", inline=True)
+            embed.add_field(name="🌬️ Wind Speed", value=f"{wind_speed} m/s", inline=True)
+            embed.add_field(name="📊 Pressure", value=f"{pressure} hPa", inline=True)
+            embed.add_field(name="👁️ Visibility", value=f"{visibility} km", inline=True)
+            
+            if data.get('dt'):
+                embed.timestamp = datetime.fromtimestamp(data['dt'], timezone.utc)
+                embed.set_footer(text="Observed")
+            
+            await ctx.send(embed=embed)
+    
+    async def check_configured(self, ctx):
+        """Tell the user when no API key is set."""
+        if self.api_key:
+            return True
+        await ctx.send("❌ Weather API key is not set. Please configure WEATHER_API_KEY in your .env file.")
+        return False
+    
+    async def send_api_error(self, ctx, error):
+        """Report a failed weather lookup."""
+        if isinstance(error, WeatherAPIError) and error.status == 401:
+            await ctx.send("❌ Invalid API key. Check your key at: https://home.openweathermap.org/api_keys")
+        elif isinstance(error, WeatherAPIError):
+            await ctx.send(f"❌ Error: {error}")
+        elif isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+            await ctx.send("❌ Error connecting to weather service. Please try again later.")
+        else:
+            await ctx.send(f"❌ Error fetching weather: {str(error)}")
+    
+    @commands.command(name='forecast')
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def forecast(self, ctx, *, location: str):
+        """Get a 5 day forecast for a location."""
+        if not await self.check_configured(ctx):
+            return
+        
+        async with ctx.typing():
+            try:
+                place, forecast = await self.service.get_forecast(location)
+            except Exception as e:
+                await self.send_api_error(ctx, e)
+                return
+            
+            if forecast is None:
+                await ctx.send(f"❌ Location '{location}' not found. Please check the spelling.")
+                return
+            
+            rows = summarize_forecast(forecast)
+            embed = discord.Embed(
+                title=f"📅 Forecast for {place['name']}, {place['country']}",
+                color=discord.Color.blue()
+            )
+            if rows:
+                embed.set_thumbnail(url=f"http://openweathermap.org/img/wn/{rows[0][4]}@2x.png")
+            for day, low, high, description, _ in rows:
+                embed.add_field(
+                    name=day.strftime('%a %d %b'),
+                    value=f"**{description}**\n🌡️ {low:.0f}° / {high:.0f}°C",
+                    inline=True
+                )
+            embed.set_footer(text="OpenWeatherMap 5 day / 3 hour forecast")
+            await ctx.send(embed=embed)
+    
+    @commands.command(name='weathermulti', aliases=['multiweather', 'weathers'])
+    @commands.cooldown(1, 15, commands.BucketType.user)
+    async def weather_multi(self, ctx, *, locations: str):
+        """Get current weather for several places. Usage: !weathermulti London; Paris; Tokyo,JP"""
+        if not await self.check_configured(ctx):
+            return
+        
+        # Semicolons separate places so commas stay available for "city,country"
+        places = list(dict.fromkeys(p.strip() for p in re.split(r'[;|\n]', locations) if p.strip()))
+        if not places:
+            await ctx.send("❌ Usage: `!weathermulti London; Paris; Tokyo,JP`")
+            return
+        if len(places) > MAX_CITIES:
+            await ctx.send(f"❌ You can look up at most {MAX_CITIES} places at once.")
+            return
+        
+        async with ctx.typing():
+            results = await self.service.get_many(places)
+        
+        errors = [error for _, _, error in results if error]
+        if errors and len(errors) == len(results):
+            await self.send_api_error(ctx, errors[0])
+            return
+        
+        width = min(max(len(p) for p in places), 20)
+        lines = [f"{'Place':<{width}}  {'Temp':>6}  {'Hum':>4}  Conditions"]
+        for place, data, error in results:
+            name = place[:width]
+            if error:
+                lines.append(f"{name:<{width}}  {'-':>6}  {'-':>4}  error")
+            elif data is None:
+                lines.append(f"{name:<{width}}  {'-':>6}  {'-':>4}  not found")
+            else:
+                lines.append(
+                    f"{name:<{width}}  {data['main']['temp']:>5.1f}°  {data['main']['humidity']:>3}%  "
+                    f"{data['weather'][0]['description'][:24]}"
+                )
+        
+        embed = discord.Embed(
+            title="🌍 Weather",
+            description="```\n" + "\n".join(lines) + "\n```",
+            color=discord.Color.blue()
+        )
+        await ctx.send(embed=embed)
+    
+    async def cog_unload(self):
+        """Close the shared HTTP session."""
+        await self.service.close()
 
 
 async def setup(bot):
     await bot.add_cog(Weather(bot))
-
@@ -9,6 +9,9 @@ import os
 from datetime import datetime, timezone
 from typing import Optional, Dict, List, Any
 
+# Seconds a connection waits for another process's write lock before failing
+DB_BUSY_TIMEOUT = 10.0
+
 
 class Database:
     """SQLite database handler."""
@@ -20,8 +23,11 @@ class Database:
         self.init_database()
     
     def get_connection(self):
-        """Get database connection."""
-        conn = sqlite3.connect(self.db_path)
+        """Get database connection.
+        
+        Shard processes share the database, so writers wait for locks instead of failing.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT)
         conn.row_factory = sqlite3.Row
         return conn
     
@@ -30,6 +36,9 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        # WAL lets readers in other processes run while one process writes
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # User statistics table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS user_stats (
@@ -62,7 +71,7 @@ class Database:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS server_settings (
                 guild_id INTEGER PRIMARY KEY,
-                prefix TEXT DEFAULT '!',
+                prefix TEXT,
                 log_channel_id INTEGER,
                 welcome_channel_id INTEGER,
                 auto_mod_enabled INTEGER DEFAULT 0,
@@ -70,6 +79,13 @@ class Database:
             )
         ''')
         
+        # A NULL prefix means the bot's default. Rows created before prefixes were
+        # configurable only ever held the old '!' column default, so clear those once.
+        cursor.execute('PRAGMA user_version')
+        if cursor.fetchone()[0] < 1:
+            cursor.execute("UPDATE server_settings SET prefix = NULL WHERE prefix = '!'")
+            cursor.execute('PRAGMA user_version = 1')
+        
         # User preferences table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS user_preferences (
@@ -94,6 +110,65 @@ class Database:
             )
         ''')
         
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_poll_results_message
+            ON poll_results (message_id)
+        ''')
+        
+        # Warnings table (append-only)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS warnings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                moderator TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_warnings_member
+            ON warnings (guild_id, user_id, timestamp)
+        ''')
+        
+        # Crypto price alerts table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS price_alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                coin_id TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        
+        # Key-value documents for utils.storage (one row per top-level key)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS kv_store (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+        
+        # News digest subscriptions table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS news_subscriptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                last_sent TEXT,
+                UNIQUE(channel_id, category)
+            )
+        ''')
+        
         conn.commit()
         conn.close()
     
@@ -257,7 +332,9 @@ class Database:
                     values
                 )
             else:
-                # Insert
+                # Insert; older databases still carry a '!' column default, so an
+                # unspecified prefix is written as NULL to keep following the default
+                regular_fields.setdefault('prefix', None)
                 fields = ['guild_id'] + list(regular_fields.keys())
                 values = [guild_id] + list(regular_fields.values())
                 placeholders = ', '.join(['?'] * len(values))
@@ -268,4 +345,349 @@ class Database:
         
         conn.commit()
         conn.close()
+    
+    def get_guild_prefixes(self) -> Dict[int, str]:
+        """Get every custom command prefix."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT guild_id, prefix FROM server_settings WHERE prefix IS NOT NULL')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {row['guild_id']: row['prefix'] for row in rows}
+    
+    def set_guild_prefix(self, guild_id: int, prefix: Optional[str]):
+        """Set a guild's command prefix (None for the default)."""
+        self.update_server_settings(guild_id, prefix=prefix)
+    
+    # Poll Methods
+    def add_poll(self, guild_id: int, channel_id: int, message_id: int,
+                 question: str, options: List[Dict], creator_id: int) -> int:
+        """Add a reaction poll with zeroed vote counts."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        votes = {option['emoji']: 0 for option in options}
+        cursor.execute('''
+            INSERT INTO poll_results
+            (guild_id, channel_id, message_id, question, options_json, votes_json, created_at, creator_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            guild_id, channel_id, message_id, question,
+            json.dumps(options), json.dumps(votes),
+            datetime.now(timezone.utc).isoformat(), creator_id
+        ))
+        
+        poll_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return poll_id
+    
+    def get_polls_since(self, since: datetime) -> List[Dict]:
+        """Get polls created at or after the given time."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'SELECT * FROM poll_results WHERE created_at >= ? ORDER BY created_at',
+            (since.isoformat(),)
+        )
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        polls = []
+        for row in rows:
+            poll = dict(row)
+            poll['options'] = json.loads(poll.pop('options_json'))
+            poll['votes'] = json.loads(poll.pop('votes_json'))
+            polls.append(poll)
+        return polls
+    
+    def update_poll_votes(self, votes_by_message: Dict[int, Dict[str, int]]):
+        """Persist vote counts for several polls in one transaction."""
+        if not votes_by_message:
+            return
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany(
+            'UPDATE poll_results SET votes_json = ? WHERE message_id = ?',
+            [(json.dumps(votes), message_id) for message_id, votes in votes_by_message.items()]
+        )
+        
+        conn.commit()
+        conn.close()
+
+    # Warnings Methods
+    def add_warning(self, guild_id: int, user_id: int, moderator: str,
+                    reason: str, timestamp: datetime) -> int:
+        """Add a warning and return the member's new warning count."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
 
+        cursor.execute(
+            'INSERT INTO warnings (guild_id, user_id, moderator, reason, timestamp) VALUES (?, ?, ?, ?, ?)',
+            (guild_id, user_id, moderator, reason, timestamp.isoformat())
+        )
+        cursor.execute(
+            'SELECT COUNT(*) FROM warnings WHERE guild_id = ? AND user_id = ?',
+            (guild_id, user_id)
+        )
+        
+        count = cursor.fetchone()[0]
+        conn.commit()
+        conn.close()
+        return count
+    
+    def get_warnings(self, guild_id: int, user_id: int, limit: int = 5) -> List[Dict]:
+        """Get a member's most recent warnings, oldest first."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            '''SELECT * FROM warnings WHERE guild_id = ? AND user_id = ?
+               ORDER BY timestamp DESC, id DESC LIMIT ?''',
+            (guild_id, user_id, limit)
+        )
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in reversed(rows)]
+    
+    def count_warnings(self, guild_id: int, user_id: int) -> int:
+        """Count a member's warnings."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'SELECT COUNT(*) FROM warnings WHERE guild_id = ? AND user_id = ?',
+            (guild_id, user_id)
+        )
+        
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
+    def import_warnings(self, guild_id: int, warnings: Dict[str, List[Dict]]) -> int:
+        """Import warnings in the legacy warnings_<guild_id>.json format."""
+        rows = [
+            (guild_id, int(user_id), warning.get('moderator', 'Unknown'),
+             warning.get('reason', 'No reason provided'),
+             # Legacy files used str(datetime); store ISO format so rows sort together
+             warning.get('timestamp', '').replace(' ', 'T', 1))
+            for user_id, user_warnings in warnings.items()
+            for warning in user_warnings
+        ]
+        if not rows:
+            return 0
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany(
+            'INSERT INTO warnings (guild_id, user_id, moderator, reason, timestamp) VALUES (?, ?, ?, ?, ?)',
+            rows
+        )
+        
+        conn.commit()
+        conn.close()
+        return len(rows)
+
+    # Price Alert Methods
+    def add_price_alert(self, guild_id: int, channel_id: int, user_id: int,
+                        coin_id: str, direction: str, threshold: float) -> Dict:
+        """Add a price alert and return it."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        created_at = datetime.now(timezone.utc).isoformat()
+        cursor.execute('''
+            INSERT INTO price_alerts
+            (guild_id, channel_id, user_id, coin_id, direction, threshold, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (guild_id, channel_id, user_id, coin_id, direction, threshold, created_at))
+        
+        alert_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return {
+            'id': alert_id, 'guild_id': guild_id, 'channel_id': channel_id, 'user_id': user_id,
+            'coin_id': coin_id, 'direction': direction, 'threshold': threshold, 'created_at': created_at
+        }
+    
+    def get_price_alerts(self, user_id: Optional[int] = None) -> List[Dict]:
+        """Get all pending price alerts, or only one user's."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        if user_id is None:
+            cursor.execute('SELECT * FROM price_alerts')
+        else:
+            cursor.execute('SELECT * FROM price_alerts WHERE user_id = ? ORDER BY id', (user_id,))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    def count_price_alerts(self, user_id: int) -> int:
+        """Count a user's pending price alerts across all guilds."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT COUNT(*) FROM price_alerts WHERE user_id = ?', (user_id,))
+        
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
+    def delete_price_alerts(self, alert_ids: List[int]):
+        """Delete price alerts by id."""
+        if not alert_ids:
+            return
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany('DELETE FROM price_alerts WHERE id = ?', [(i,) for i in alert_ids])
+        conn.commit()
+        conn.close()
+    
+    def remove_price_alert(self, alert_id: int, user_id: int) -> bool:
+        """Delete one of a user's price alerts. Returns True if it existed."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM price_alerts WHERE id = ? AND user_id = ?', (alert_id, user_id))
+        
+        removed = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return removed
+    
+    # News Subscription Methods
+    def add_news_subscription(self, guild_id: int, channel_id: int, category: str, hour: int):
+        """Subscribe a channel to a daily category digest at `hour` UTC."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO news_subscriptions (guild_id, channel_id, category, hour)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(channel_id, category) DO UPDATE SET hour = excluded.hour
+        ''', (guild_id, channel_id, category, hour))
+        
+        conn.commit()
+        conn.close()
+    
+    def remove_news_subscription(self, channel_id: int, category: str) -> bool:
+        """Remove a channel's digest subscription. Returns True if one existed."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'DELETE FROM news_subscriptions WHERE channel_id = ? AND category = ?',
+            (channel_id, category)
+        )
+        
+        removed = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return removed
+    
+    def clear_news_subscriptions(self, guild_id: int = None, channel_id: int = None) -> int:
+        """Remove every digest subscription of a deleted channel or a departed guild."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        if channel_id is not None:
+            cursor.execute('DELETE FROM news_subscriptions WHERE channel_id = ?', (channel_id,))
+        else:
+            cursor.execute('DELETE FROM news_subscriptions WHERE guild_id = ?', (guild_id,))
+        
+        removed = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return removed
+    
+    def get_news_subscriptions(self, guild_id: int) -> List[Dict]:
+        """Get all digest subscriptions in a guild."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'SELECT * FROM news_subscriptions WHERE guild_id = ? ORDER BY channel_id, category',
+            (guild_id,)
+        )
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    def get_due_news_subscriptions(self, now: datetime) -> List[Dict]:
+        """Get subscriptions whose hour has passed today (UTC) and were not sent today."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        today = now.date().isoformat()
+        cursor.execute('''
+            SELECT * FROM news_subscriptions
+            WHERE hour <= ? AND (last_sent IS NULL OR last_sent < ?)
+        ''', (now.hour, today))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    def mark_news_sent(self, subscription_ids: List[int], now: datetime):
+        """Record that subscriptions received today's digest."""
+        if not subscription_ids:
+            return
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        today = now.date().isoformat()
+        cursor.executemany(
+            'UPDATE news_subscriptions SET last_sent = ? WHERE id = ?',
+            [(today, i) for i in subscription_ids]
+        )
+        conn.commit()
+        conn.close()
+    
+    # Key-Value Store Methods
+    def kv_load(self, namespace: str) -> Dict[str, str]:
+        """Get all raw values in a namespace."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT key, value FROM kv_store WHERE namespace = ?', (namespace,))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {row['key']: row['value'] for row in rows}
+    
+    def kv_save(self, namespace: str, items: Dict[str, str], deleted: List[str] = ()):
+        """Upsert changed values and delete removed keys in one transaction."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT INTO kv_store (namespace, key, value) VALUES (?, ?, ?)
+            ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value
+        ''', [(namespace, key, value) for key, value in items.items()])
+        cursor.executemany(
+            'DELETE FROM kv_store WHERE namespace = ? AND key = ?',
+            [(namespace, key) for key in deleted]
+        )
+        
+        conn.commit()
+        conn.close()
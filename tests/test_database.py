@@ -0,0 +1,112 @@
+"""Tests for the SQLite database handler."""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from database import Database
+
+
+class TestDatabase(unittest.TestCase):
+    """Database handler test cases."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmpdir.name, 'bot.db'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_poll_votes_round_trip(self):
+        """Test that poll vote counts are persisted and reloaded."""
+        options = [{'emoji': '✅', 'label': 'Yes'}, {'emoji': '❌', 'label': 'No'}]
+        self.db.add_poll(1, 2, 3, "Tabs?", options, 4)
+        self.db.update_poll_votes({3: {'✅': 5, '❌': 2}})
+
+        since = datetime.now(timezone.utc) - timedelta(days=1)
+        polls = self.db.get_polls_since(since)
+        self.assertEqual(len(polls), 1)
+        self.assertEqual(polls[0]['question'], "Tabs?")
+        self.assertEqual(polls[0]['options'], options)
+        self.assertEqual(polls[0]['votes'], {'✅': 5, '❌': 2})
+
+    def test_warnings_append_and_import(self):
+        """Test warning inserts, counts and legacy JSON import."""
+        now = datetime.now(timezone.utc)
+        self.db.import_warnings(1, {'2': [
+            {'reason': 'old', 'moderator': 'mod', 'timestamp': '2024-01-01 00:00:00+00:00'}
+        ]})
+        for i in range(6):
+            count = self.db.add_warning(1, 2, 'mod', f'reason {i}', now + timedelta(seconds=i))
+
+        self.assertEqual(count, 7)
+        self.assertEqual(self.db.count_warnings(1, 2), 7)
+        self.assertEqual(self.db.count_warnings(1, 3), 0)
+
+        recent = self.db.get_warnings(1, 2, limit=5)
+        self.assertEqual([w['reason'] for w in recent], [f'reason {i}' for i in range(1, 6)])
+
+    def test_price_alerts(self):
+        """Test price alert persistence and batched deletion."""
+        first = self.db.add_price_alert(1, 2, 3, 'bitcoin', 'above', 70000.0)
+        second = self.db.add_price_alert(1, 2, 3, 'ethereum', 'below', 2000.0)
+
+        alerts = {a['id']: a for a in self.db.get_price_alerts()}
+        self.assertEqual(alerts[first['id']]['threshold'], 70000.0)
+        self.assertEqual(alerts[second['id']]['direction'], 'below')
+        self.assertEqual(self.db.count_price_alerts(3), 2)
+        self.assertEqual(self.db.count_price_alerts(4), 0)
+
+        self.db.delete_price_alerts([first['id']])
+        self.assertEqual([a['id'] for a in self.db.get_price_alerts()], [second['id']])
+
+        self.db.add_price_alert(5, 6, 4, 'solana', 'above', 300.0)
+        self.assertEqual([a['id'] for a in self.db.get_price_alerts(3)], [second['id']])
+        self.assertFalse(self.db.remove_price_alert(second['id'], 4))
+        self.assertTrue(self.db.remove_price_alert(second['id'], 3))
+        self.assertEqual(self.db.get_price_alerts(3), [])
+
+    def test_news_subscriptions_due_once_per_day(self):
+        """Test that digests come due after their hour and only once per day."""
+        self.db.add_news_subscription(1, 10, 'technology', 8)
+        self.db.add_news_subscription(1, 11, 'business', 20)
+        self.db.add_news_subscription(1, 10, 'technology', 9)  # Re-subscribing moves the hour
+
+        morning = datetime(2024, 5, 1, 9, 30, tzinfo=timezone.utc)
+        due = self.db.get_due_news_subscriptions(morning)
+        self.assertEqual([(d['channel_id'], d['hour']) for d in due], [(10, 9)])
+
+        self.db.mark_news_sent([d['id'] for d in due], morning)
+        self.assertEqual(self.db.get_due_news_subscriptions(morning + timedelta(hours=1)), [])
+        self.assertEqual(len(self.db.get_due_news_subscriptions(morning + timedelta(days=1))), 1)
+
+        self.assertTrue(self.db.remove_news_subscription(11, 'business'))
+        self.assertFalse(self.db.remove_news_subscription(11, 'business'))
+        self.assertEqual(len(self.db.get_news_subscriptions(1)), 1)
+
+        self.db.add_news_subscription(2, 12, 'science', 8)
+        self.assertEqual(self.db.clear_news_subscriptions(channel_id=10), 1)
+        self.assertEqual(self.db.clear_news_subscriptions(guild_id=2), 1)
+        self.assertEqual(self.db.get_news_subscriptions(1), [])
+
+    def test_key_value_store(self):
+        """Test that kv_save upserts changed keys and deletes removed ones."""
+        self.db.kv_save('stats', {'1': '{"a":1}', '2': '{"b":2}'})
+        self.db.kv_save('stats', {'1': '{"a":3}'}, ['2'])
+        self.db.kv_save('other', {'1': '[]'})
+
+        self.assertEqual(self.db.kv_load('stats'), {'1': '{"a":3}'})
+        self.assertEqual(self.db.kv_load('other'), {'1': '[]'})
+
+    def test_settings_rows_keep_default_prefix(self):
+        """Test that rows created for other settings don't pin a prefix."""
+        self.db.update_server_settings(1, auto_mod_enabled=1)
+        self.db.set_guild_prefix(2, '?')
+        self.assertEqual(self.db.get_guild_prefixes(), {2: '?'})
+
+        self.db.set_guild_prefix(2, None)
+        self.assertEqual(self.db.get_guild_prefixes(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,620 @@
+"""Tests for utility modules."""
+import asyncio
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from database import Database
+from utils.alerts import AlertBook, is_triggered
+from utils.cache import LRUCache, SingleFlight, TTLCache
+from utils.log import JsonFormatter, SamplingFilter
+from utils.memes import MEME_EMPTY_TTL, MEME_POOL_TTL, MEME_SORTS, MemeService
+from utils.metrics import Histogram, Metrics, TimedListenersMixin
+from utils.news import dedupe_articles
+from utils.prefixes import PrefixCache
+from utils.presence import PresenceCounter
+from utils.reloader import CogReloader
+from utils.replies import choose_reply, needs_ai_response, route_message
+from utils.sharding import owns_guild, parse_shard_ids
+from utils.spam import SpamDetector
+from utils.storage import JSONFileBackend, SQLiteBackend, Store, atomic_write, open_store
+from utils.weather import WeatherService, normalize_location
+
+
+class TestLRUCache(unittest.TestCase):
+    """LRU cache test cases."""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched entry is evicted first."""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(len(cache), 2)
+
+
+class TestTTLCache(unittest.TestCase):
+    """TTL cache test cases."""
+
+    def test_entries_expire(self):
+        """Test that entries are dropped once their TTL passes."""
+        cache = TTLCache(ttl=10)
+        with patch('utils.cache.time.monotonic', return_value=100.0):
+            cache.set('a', None)
+            cache.set('b', 2, ttl=60)
+        with patch('utils.cache.time.monotonic', return_value=105.0):
+            self.assertIn('a', cache)
+            self.assertIsNone(cache.get('a', 'miss'))
+        with patch('utils.cache.time.monotonic', return_value=111.0):
+            self.assertEqual(cache.get('a', 'miss'), 'miss')
+            self.assertEqual(cache.get('b'), 2)
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Single-flight test cases."""
+
+    async def test_concurrent_calls_share_one_fetch(self):
+        """Test that concurrent callers for one key share a single call."""
+        flights = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'value'
+
+        results = await asyncio.gather(*(flights.do('k', fetch) for _ in range(5)))
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertNotIn('k', flights)
+
+
+class TestAlertBook(unittest.TestCase):
+    """Price alert test cases."""
+
+    def test_already_satisfied_alerts_are_detected(self):
+        """Test that an alert whose condition already holds is recognised up front."""
+        self.assertTrue(is_triggered('above', 70000, 72000))
+        self.assertFalse(is_triggered('above', 70000, 68000))
+        self.assertTrue(is_triggered('below', 2000, 2000))
+        self.assertFalse(is_triggered('below', 2000, 2100))
+
+    def test_pop_triggered_only_returns_crossed_alerts(self):
+        """Test that a price tick fires crossed alerts once and keeps the rest."""
+        book = AlertBook()
+        for alert_id, direction, threshold in ((1, 'above', 70000), (2, 'above', 80000), (3, 'below', 60000)):
+            book.add({'id': alert_id, 'user_id': 9, 'coin_id': 'bitcoin', 'direction': direction, 'threshold': threshold})
+
+        self.assertEqual([a['id'] for a in book.pop_triggered('bitcoin', 72000)], [1])
+        self.assertEqual([a['id'] for a in book.pop_triggered('bitcoin', 72000)], [])
+        self.assertEqual(sorted(a['id'] for a in book.for_user(9)), [2, 3])
+
+
+class TestReplies(unittest.TestCase):
+    """Message routing and reply heuristic test cases."""
+
+    @staticmethod
+    def wants_ai(content):
+        content_lower = content.lower()
+        return needs_ai_response(content, content_lower, content_lower.split())
+
+    def test_prefixed_messages_are_commands(self):
+        """Test that prefixed messages only go to command invocation."""
+        self.assertEqual(route_message('!help what is this?', '!'), 'command')
+        self.assertEqual(route_message('what is this?', None), 'chat')
+        self.assertIsNone(route_message('   ', None))
+
+    def test_questions_and_feelings_want_ai(self):
+        """Test that questions, mentions asking something and emotions get an AI reply."""
+        self.assertTrue(self.wants_ai('how does this work'))
+        self.assertTrue(self.wants_ai('<@123> can you help?'))
+        self.assertTrue(self.wants_ai("I'm so tired today."))
+        self.assertFalse(self.wants_ai('ok.'))
+        self.assertFalse(self.wants_ai('lol'))
+
+    def test_keyword_replies_mention_the_author(self):
+        """Test that keywords reply with the author's mention and negative words suppress them."""
+        reply = choose_reply({'thanks', 'a', 'lot'}, '<@42>')
+        self.assertIn('<@42>', reply)
+        self.assertIsNone(choose_reply({'great', 'but', 'sad'}, '<@42>'))
+        self.assertIsNone(choose_reply({'just', 'chatting'}, '<@42>'))
+
+    def test_longer_keywords_win(self):
+        """Test that the more specific keyword picks the reply."""
+        with patch('utils.replies.random.choice', side_effect=lambda options: options[0]):
+            self.assertEqual(choose_reply({'congratulations', 'good'}, '@x'), 'Congratulations @x! 🎉🎊')
+
+
+class TestSpamDetector(unittest.TestCase):
+    """Spam detector test cases."""
+
+    def test_message_flood(self):
+        """Test that too many messages in the rate window trip the detector."""
+        detector = SpamDetector(max_messages=3, rate_window=5.0)
+        self.assertIsNone(detector.check('u', 0.0, 'a'))
+        self.assertIsNone(detector.check('u', 1.0, 'b'))
+        self.assertIsNotNone(detector.check('u', 2.0, 'c'))
+        self.assertIsNone(detector.check('v', 2.0, 'c'))
+
+    def test_duplicates_and_mentions(self):
+        """Test duplicate-content and mass-mention thresholds."""
+        detector = SpamDetector(max_messages=100, max_duplicates=3, max_mentions=5)
+        self.assertIsNone(detector.check('u', 0.0, 'Buy now'))
+        self.assertIsNone(detector.check('u', 1.0, 'buy now'))
+        self.assertIn('Repeating', detector.check('u', 2.0, 'BUY NOW'))
+        self.assertIsNone(detector.check('m', 0.0, 'hi', 3))
+        self.assertIn('mention', detector.check('m', 1.0, 'hey', 3))
+
+    def test_evict_idle_users(self):
+        """Test that idle windows are evicted and footprint shrinks."""
+        detector = SpamDetector()
+        detector.check('old', 0.0, 'x')
+        detector.check('new', 100.0, 'y')
+        before = detector.footprint()
+        self.assertEqual(detector.evict(50.0), 1)
+        self.assertEqual(list(detector.windows), ['new'])
+        self.assertLess(detector.footprint(), before)
+
+
+class TestDedupeArticles(unittest.TestCase):
+    """News deduplication test cases."""
+
+    def test_same_url_is_collapsed(self):
+        """Test that tracking params, www. and trailing slashes don't make a new article."""
+        articles = [
+            {'title': 'Rates held', 'url': 'https://www.example.com/a/rates/?utm=x'},
+            {'title': 'Rates held steady', 'url': 'https://example.com/a/rates'},
+            {'title': '[Removed]', 'url': 'https://example.com/removed'},
+        ]
+        self.assertEqual([a['title'] for a in dedupe_articles(articles)], ['Rates held'])
+
+    def test_syndicated_titles_are_collapsed(self):
+        """Test that the same title from different sources is kept once."""
+        articles = [
+            {'title': 'Rates held - Reuters', 'url': 'https://reuters.com/1', 'source': {'name': 'Reuters'}},
+            {'title': 'Rates Held!', 'url': 'https://other.com/2', 'source': {'name': 'Other'}},
+        ]
+        self.assertEqual(len(dedupe_articles(articles)), 1)
+
+    def test_articles_without_urls_are_kept(self):
+        """Test that articles with no URL are not collapsed into each other."""
+        articles = [{'title': 'First story', 'url': None}, {'title': 'Second story'}]
+        self.assertEqual(len(dedupe_articles(articles)), 2)
+
+
+class TestMemeService(unittest.IsolatedAsyncioTestCase):
+    """Meme pool test cases."""
+
+    async def test_empty_subreddit_is_cached(self):
+        """Test that a missing subreddit isn't refetched until the empty TTL passes."""
+        service = MemeService()
+        with patch.object(service, 'fetch_listing', AsyncMock(return_value=[])) as fetch:
+            self.assertIsNone(await service.fetch_meme('nosuchsub', 1))
+            self.assertIsNone(await service.fetch_meme('NoSuchSub', 1))
+            self.assertEqual(fetch.await_count, len(MEME_SORTS))
+            self.assertTrue(service.is_warm('nosuchsub'))
+
+            service.pools.set('nosuchsub', ([], time.monotonic() - MEME_EMPTY_TTL - 1))
+            self.assertFalse(service.is_warm('nosuchsub'))
+
+    async def test_posts_are_not_repeated_per_channel(self):
+        """Test that a channel sees every post before any repeats."""
+        service = MemeService()
+        posts = [{'id': str(i), 'title': f'Meme {i}'} for i in range(5)]
+        with patch.object(service, 'fetch_listing', AsyncMock(return_value=posts)):
+            first = [(await service.fetch_meme('memes', 1))['id'] for _ in posts]
+        self.assertCountEqual(first, [post['id'] for post in posts])
+
+        # Other channels keep their own history
+        self.assertIsNotNone(service.get_meme('memes', 2))
+        self.assertIn(service.get_meme('memes', 1)['id'], first)
+
+    async def test_stale_pool_refill_is_tracked(self):
+        """Test that a background refill is referenced until it finishes."""
+        service = MemeService()
+        service.pools.set('memes', ([{'id': 'old', 'title': 'Old'}], time.monotonic() - MEME_POOL_TTL - 1))
+        new = [{'id': 'new', 'title': 'New'}]
+        with patch.object(service, 'fetch_listing', AsyncMock(return_value=new)):
+            self.assertEqual(service.get_meme('memes', 1)['id'], 'old')
+            self.assertEqual(len(service.refills), 1)
+            await asyncio.gather(*service.refills)
+        await asyncio.sleep(0)
+        self.assertEqual(service.refills, set())
+        self.assertEqual(service.get_meme('memes', 1)['id'], 'new')
+
+    async def test_failed_refill_backs_off(self):
+        """Test that a refill that gets nothing keeps the old posts without retrying per request."""
+        service = MemeService()
+        service.pools.set('memes', ([{'id': 'old', 'title': 'Old'}], time.monotonic() - MEME_POOL_TTL - 1))
+        with patch.object(service, 'fetch_listing', AsyncMock(return_value=[])) as fetch:
+            self.assertEqual(await service.refill('memes'), [{'id': 'old', 'title': 'Old'}])
+            self.assertEqual(service.get_meme('memes', 1)['id'], 'old')
+            self.assertEqual(service.refills, set())
+            self.assertEqual(fetch.await_count, len(MEME_SORTS))
+
+
+class TestPresenceCounter(unittest.TestCase):
+    """Presence counter test cases."""
+
+    def test_counts_follow_events(self):
+        """Test that counts built once stay correct through presence and member events."""
+        alice = SimpleNamespace(status='online', bot=False)
+        bot = SimpleNamespace(status='invisible', bot=True)
+        guild = SimpleNamespace(id=1, members=[alice, bot], chunked=True)
+        presence = PresenceCounter()
+
+        counts = presence.get(guild)
+        self.assertEqual((counts['online'], counts['offline'], counts['bots']), (1, 1, 1))
+
+        presence.update(1, alice, SimpleNamespace(status='dnd', bot=False))
+        presence.add(1, SimpleNamespace(status='idle', bot=False))
+        presence.remove(1, bot)
+
+        counts = presence.get(guild)
+        self.assertEqual(
+            [counts[key] for key in ('online', 'idle', 'dnd', 'offline', 'bots')],
+            [0, 1, 1, 0, 0]
+        )
+
+    def test_drifted_counts_are_rebuilt(self):
+        """Test that counts are recounted after a reconnect or when they go negative."""
+        alice = SimpleNamespace(status='online', bot=False)
+        guild = SimpleNamespace(id=1, members=[alice], chunked=True)
+        presence = PresenceCounter()
+
+        presence.get(guild)
+        presence.remove(1, SimpleNamespace(status='idle', bot=False))  # a join we never saw
+        self.assertEqual(presence.get(guild)['idle'], 0)
+
+        presence.update(1, alice, SimpleNamespace(status='dnd', bot=False))
+        presence.clear()
+        counts = presence.get(guild)
+        self.assertEqual((counts['online'], counts['dnd']), (1, 0))
+
+
+class TestLogging(unittest.TestCase):
+    """Logging helper test cases."""
+
+    def make_record(self, level=logging.INFO, **extra):
+        record = logging.LogRecord('bot', level, __file__, 1, 'hello %s', ('world',), None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_fields(self):
+        """Test that records become JSON with their extra fields."""
+        entry = json.loads(JsonFormatter().format(self.make_record(guild_id=42)))
+        self.assertEqual(entry['msg'], 'hello world')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['guild_id'], 42)
+
+    def test_sampling_filter_keeps_one_in_n(self):
+        """Test that tagged records are sampled while others always pass."""
+        sampler = SamplingFilter({'message': 0.25, 'typing': 0})
+        kept = sum(sampler.filter(self.make_record(category='message')) for _ in range(100))
+        self.assertEqual(kept, 25)
+        self.assertFalse(sampler.filter(self.make_record(category='typing')))
+        self.assertTrue(sampler.filter(self.make_record(logging.WARNING, category='typing')))
+        self.assertTrue(sampler.filter(self.make_record()))
+
+
+class TestMetrics(unittest.TestCase):
+    """Metrics registry test cases."""
+
+    def test_histogram_quantiles(self):
+        """Test that quantiles land in the right bucket and never exceed the max."""
+        histogram = Histogram()
+        for value in [0.002] * 90 + [0.3] * 10:
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 0.005)
+        self.assertEqual(histogram.quantile(0.99), 0.3)
+        self.assertAlmostEqual(histogram.mean, 0.0318)
+
+    def test_prometheus_rendering(self):
+        """Test the Prometheus text output for counters and histograms."""
+        registry = Metrics()
+        registry.describe('command_seconds', 'Command latency.', ('command',))
+        registry.observe('command_seconds', 0.02, ('ping',))
+        registry.inc('errors_total', ('ping',))
+        text = registry.render_prometheus()
+        self.assertIn('# TYPE command_seconds histogram', text)
+        self.assertIn('command_seconds_bucket{command="ping",le="0.025"} 1', text)
+        self.assertIn('command_seconds_count{command="ping"} 1', text)
+        self.assertIn('errors_total 1', text)
+
+    def test_listeners_are_timed_and_removable(self):
+        """Test that registered listeners are timed, count errors and can be removed."""
+        class FakeBot:
+            def __init__(self):
+                self.extra_events = {}
+
+            def event(self, coro):
+                setattr(self, coro.__name__, coro)
+                return coro
+
+            def add_listener(self, func, name):
+                self.extra_events.setdefault(name, []).append(func)
+
+            def remove_listener(self, func, name):
+                self.extra_events[name].remove(func)
+
+        class Bot(TimedListenersMixin, FakeBot):
+            listener_metrics = Metrics()
+
+        class Cog:
+            async def on_message(self, message):
+                if message == 'bad':
+                    raise ValueError(message)
+
+        bot, cog = Bot(), Cog()
+        bot.add_listener(cog.on_message)
+
+        @bot.event
+        async def on_ready():
+            pass
+
+        async def dispatch():
+            await bot.on_ready()
+            await bot.extra_events['on_message'][0]('hi')
+            with self.assertRaises(ValueError):
+                await bot.extra_events['on_message'][0]('bad')
+
+        asyncio.run(dispatch())
+        registry = Bot.listener_metrics
+        timings = registry.histograms['event_handler_seconds']
+        listener = ('on_message', Cog.on_message.__qualname__)
+        self.assertEqual(timings[('on_ready', on_ready.__wrapped__.__qualname__)].count, 1)
+        self.assertEqual(timings[listener].count, 2)
+        self.assertEqual(registry.counters['event_errors_total'], {listener: 1})
+
+        # Cogs unload with a fresh bound method, which must still find the wrapper
+        bot.remove_listener(cog.on_message, 'on_message')
+        self.assertEqual(bot.extra_events['on_message'], [])
+
+
+class TestCogReloader(unittest.TestCase):
+    """Cog reloader test cases."""
+
+    def test_plan_only_reports_changed_files(self):
+        """Test that touched-but-identical files are skipped and edits are detected."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cogs = os.path.join(tmp, 'cogs')
+            os.mkdir(cogs)
+            for name in ('a', 'b'):
+                with open(os.path.join(cogs, f'{name}.py'), 'w') as f:
+                    f.write('x = 1\n')
+            bot = SimpleNamespace(extensions={'cogs.a': None, 'cogs.b': None, 'cogs.gone': None})
+            reloader = CogReloader(bot, cogs)
+            reloader.record_loaded()
+
+            os.utime(os.path.join(cogs, 'a.py'), ns=(0, 10 ** 9))
+            with open(os.path.join(cogs, 'b.py'), 'w') as f:
+                f.write('x = 2\n')
+            os.utime(os.path.join(cogs, 'b.py'), ns=(0, 2 * 10 ** 9))
+            with open(os.path.join(cogs, 'c.py'), 'w') as f:
+                f.write('')
+
+            self.assertEqual(reloader.plan(), (['cogs.b'], ['cogs.c'], ['cogs.gone']))
+
+    def test_load_all_keeps_going_past_failures(self):
+        """Test that startup loading reports a broken cog and still loads the rest."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cogs = os.path.join(tmp, 'cogs')
+            os.mkdir(cogs)
+            sources = {
+                '__init__': '',
+                'broken': 'raise RuntimeError("boom")\n',
+                'music': 'from utils.media import extract_info\n',
+            }
+            for name, source in sources.items():
+                with open(os.path.join(cogs, f'{name}.py'), 'w') as f:
+                    f.write(source)
+            bot = SimpleNamespace(extensions={})
+
+            async def load_extension(name):
+                path = os.path.join(cogs, name.split('.', 1)[1] + '.py')
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                bot.extensions[name] = module
+
+            bot.load_extension = load_extension
+            reloader = CogReloader(bot, cogs)
+            with patch.dict(sys.modules):
+                sys.modules.pop('yt_dlp', None)
+                sys.modules.pop('utils.media', None)
+                results = asyncio.run(reloader.load_all())
+                self.assertNotIn('yt_dlp', sys.modules)
+
+            self.assertEqual(list(results), ['cogs.broken', 'cogs.music'])
+            self.assertIsInstance(results['cogs.broken'], RuntimeError)
+            self.assertGreaterEqual(results['cogs.music'], 0)
+            self.assertEqual(list(reloader.fingerprints), ['cogs.music'])
+
+
+class TestMedia(unittest.TestCase):
+    """Lazy yt-dlp loading test cases."""
+
+    def test_import_does_not_load_yt_dlp(self):
+        """Test that importing the extractor module leaves yt-dlp unimported."""
+        with patch.dict(sys.modules):
+            sys.modules.pop('yt_dlp', None)
+            sys.modules.pop('utils.media', None)
+            importlib.import_module('utils.media')
+            self.assertNotIn('yt_dlp', sys.modules)
+
+    def test_extract_info_imports_yt_dlp_once(self):
+        """Test that the extractor is imported on first use and then reused."""
+        media = importlib.import_module('utils.media')
+        calls = []
+
+        class FakeYoutubeDL:
+            def __init__(self, options):
+                self.options = options
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def extract_info(self, query, download):
+                calls.append((query, download, self.options['default_search']))
+                return {'title': query}
+
+        fake = SimpleNamespace(YoutubeDL=FakeYoutubeDL)
+        with patch.dict(sys.modules, {'yt_dlp': fake}), patch.object(media, '_yt_dlp', None):
+            self.assertEqual(media.extract_info('lofi'), {'title': 'lofi'})
+            self.assertIs(media.get_yt_dlp(), fake)
+            sys.modules['yt_dlp'] = None  # a second import would now fail
+            self.assertEqual(media.extract_info('jazz'), {'title': 'jazz'})
+        self.assertEqual(calls, [('lofi', False, 'ytsearch'), ('jazz', False, 'ytsearch')])
+
+
+class TestStorage(unittest.TestCase):
+    """Persistence layer test cases."""
+
+    def test_atomic_write_leaves_no_temp_files(self):
+        """Test that atomic_write replaces the file and cleans up."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'data.json')
+            atomic_write(path, b'{"a":1}')
+            atomic_write(path, b'{"a":2}')
+            self.assertEqual(os.listdir(tmp), ['data.json'])
+            with open(path) as f:
+                self.assertEqual(json.load(f), {'a': 2})
+
+    def test_store_flushes_only_dirty_keys(self):
+        """Test that the SQLite backend writes changed keys and deletes removed ones."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bot.db'))
+            store = Store('stats', SQLiteBackend(db))
+            store['1'] = {'messages': 1}
+            store['2'] = {'messages': 5}
+            self.assertEqual(store.flush(), 2)
+            self.assertEqual(store.flush(), 0)
+
+            store['1']['messages'] += 1
+            store.mark_dirty('1')
+            del store['2']
+            with patch.object(db, 'kv_save', wraps=db.kv_save) as kv_save:
+                store.flush()
+            kv_save.assert_called_once_with('stats', {'1': '{"messages":2}'}, ['2'])
+            self.assertEqual(Store('stats', SQLiteBackend(db)).data, {'1': {'messages': 2}})
+
+    def test_sqlite_store_imports_json_file(self):
+        """Test that opening an empty SQLite store migrates the legacy JSON file."""
+        with tempfile.TemporaryDirectory() as tmp:
+            atomic_write(os.path.join(tmp, 'reminders.json'), b'{"r1":{"message":"hi"}}')
+            store = open_store('reminders', SQLiteBackend(Database(os.path.join(tmp, 'bot.db'))), tmp)
+            self.assertEqual(store.data, {'r1': {'message': 'hi'}})
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'reminders.json.migrated')))
+
+    def test_concurrent_json_import_tolerates_lost_rename(self):
+        """Test that a shard process losing the migration rename race still loads the data."""
+        with tempfile.TemporaryDirectory() as tmp:
+            atomic_write(os.path.join(tmp, 'reminders.json'), b'{"r1":{"message":"hi"}}')
+            db = Database(os.path.join(tmp, 'bot.db'))
+            with patch('pathlib.Path.rename', side_effect=FileNotFoundError) as rename:
+                store = open_store('reminders', SQLiteBackend(db), tmp)
+            rename.assert_called_once()
+            self.assertEqual(store.data, {'r1': {'message': 'hi'}})
+            self.assertEqual(store.dirty, set())
+
+    def test_flush_async_writes_off_the_loop(self):
+        """Test that flush_async writes in a worker thread and keeps keys dirty on failure."""
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = JSONFileBackend(tmp)
+            store = Store('stats', backend)
+            store['1'] = {'messages': 1}
+            with patch.object(backend, 'write', side_effect=OSError('disk full')):
+                with self.assertRaises(OSError):
+                    asyncio.run(store.flush_async())
+            self.assertEqual(store.dirty, {'1'})
+
+            with patch('utils.storage.asyncio.to_thread', wraps=asyncio.to_thread) as to_thread:
+                self.assertEqual(asyncio.run(store.flush_async()), 1)
+            to_thread.assert_called_once()
+            self.assertEqual(Store('stats', backend).data, {'1': {'messages': 1}})
+
+
+class TestSharding(unittest.TestCase):
+    """Shard configuration test cases."""
+
+    def test_parse_shard_ids(self):
+        """Test ranges, lists and the empty spec."""
+        self.assertEqual(parse_shard_ids('0-3, 8'), [0, 1, 2, 3, 8])
+        self.assertIsNone(parse_shard_ids(''))
+
+    def test_owns_guild(self):
+        """Test that guilds are owned by the process running their shard."""
+        guild_id = (5 << 22) | 1234  # Shard 1 of 4
+        bot = SimpleNamespace(shard_ids=[0, 1], shard_count=4)
+        self.assertTrue(owns_guild(bot, guild_id))
+        self.assertTrue(owns_guild(bot, 0))  # DMs arrive on shard 0
+        self.assertFalse(owns_guild(SimpleNamespace(shard_ids=[2, 3], shard_count=4), guild_id))
+        self.assertTrue(owns_guild(SimpleNamespace(shard_count=None), guild_id))
+
+
+class TestPrefixCache(unittest.TestCase):
+    """Per-guild prefix cache test cases."""
+
+    def test_resolves_from_memory(self):
+        """Test that prefixes load in bulk, write through and fall back to the default."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bot.db'))
+            db.set_guild_prefix(1, '?')
+            prefixes = PrefixCache(db, '!')
+            self.assertEqual(prefixes.load(), 1)
+
+            with patch.object(db, 'get_connection', side_effect=AssertionError('no DB reads')):
+                message = SimpleNamespace(guild=SimpleNamespace(id=1), content='?help')
+                self.assertEqual(prefixes.resolve(message), '?')
+                self.assertTrue(prefixes.is_command(message))
+                self.assertEqual(prefixes.resolve(SimpleNamespace(guild=None, content='!help')), '!')
+
+            prefixes.set(2, '$')
+            prefixes.set(1, '!')  # Back to the default
+            self.assertEqual(db.get_guild_prefixes(), {2: '$'})
+            self.assertEqual(prefixes.get(1), '!')
+
+
+class TestWeatherService(unittest.IsolatedAsyncioTestCase):
+    """Weather lookup caching test cases."""
+
+    def test_normalize_location(self):
+        """Test that spacing and case variants share one key."""
+        self.assertEqual(normalize_location('  New  York , US '), 'new york,us')
+        self.assertEqual(normalize_location('new york,us'), 'new york,us')
+
+    async def test_not_found_is_cached(self):
+        """Test that an unknown location is only requested once."""
+        service = WeatherService('key')
+        with patch.object(service, 'request', AsyncMock(return_value=None)) as request:
+            self.assertIsNone(await service.get_current('Atlantis'))
+            self.assertIsNone(await service.get_current('atlantis '))
+        request.assert_awaited_once()
+
+    async def test_second_lookup_hits_cache(self):
+        """Test that a resolved location (and its canonical name) is served from the cache."""
+        service = WeatherService('key')
+        data = {'id': 5128581, 'name': 'New York', 'sys': {'country': 'US'}, 'main': {'temp': 20}}
+        with patch.object(service, 'request', AsyncMock(return_value=data)) as request:
+            self.assertEqual(await service.get_current('NYC'), data)
+            self.assertEqual(await service.get_current('nyc'), data)
+            self.assertEqual(await service.get_current('New York, US'), data)
+        request.assert_awaited_once_with('/data/2.5/weather', {'q': 'NYC'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Price alert bookkeeping: pending alerts indexed by coin and threshold.
+"""
+
+import bisect
+
+ALERT_DIRECTIONS = {
+    '>': 'above', '>=': 'above', 'above': 'above',
+    '<': 'below', '<=': 'below', 'below': 'below'
+}
+
+
+def is_triggered(direction, threshold, price):
+    """Whether an alert's condition holds at `price`."""
+    return price >= threshold if direction == 'above' else price <= threshold
+
+
+class AlertBook:
+    """Pending price alerts, indexed per coin in sorted threshold lists.
+
+    A price tick only touches the alerts it crosses: "above" alerts fire for
+    every threshold <= price (a prefix of the sorted list) and "below" alerts
+    for every threshold >= price (a suffix), both found with bisect.
+    """
+
+    def __init__(self):
+        self.alerts = {}  # alert_id -> alert
+        self.above = {}  # coin_id -> sorted [(threshold, alert_id)]
+        self.below = {}  # coin_id -> sorted [(threshold, alert_id)]
+        self.users = {}  # user_id -> {alert_id}
+
+    def add(self, alert):
+        """Index an alert."""
+        self.alerts[alert['id']] = alert
+        self.users.setdefault(alert['user_id'], set()).add(alert['id'])
+        side = self.above if alert['direction'] == 'above' else self.below
+        bisect.insort(side.setdefault(alert['coin_id'], []), (alert['threshold'], alert['id']))
+
+    def remove(self, alert_id):
+        """Remove an alert, returning it (or None if unknown)."""
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        self._forget_user(alert)
+    
+        side = self.above if alert['direction'] == 'above' else self.below
+        entries = side[alert['coin_id']]
+        entry = (alert['threshold'], alert_id)
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+        if not entries:
+            del side[alert['coin_id']]
+        return alert
+
+    def _forget_user(self, alert):
+        ids = self.users[alert['user_id']]
+        ids.discard(alert['id'])
+        if not ids:
+            del self.users[alert['user_id']]
+
+    def coins(self):
+        """Coin ids that have at least one pending alert."""
+        return list(self.above.keys() | self.below.keys())
+
+    def for_user(self, user_id):
+        """Alerts belonging to a user."""
+        return [self.alerts[alert_id] for alert_id in self.users.get(user_id, ())]
+
+    def pop_triggered(self, coin_id, price):
+        """Remove and return the alerts crossed by `price`."""
+        triggered = []
+    
+        entries = self.above.get(coin_id)
+        if entries:
+            i = bisect.bisect_right(entries, (price, float('inf')))
+            triggered.extend(entries[:i])
+            del entries[:i]
+            if not entries:
+                del self.above[coin_id]
+    
+        entries = self.below.get(coin_id)
+        if entries:
+            i = bisect.bisect_left(entries, (price, float('-inf')))
+            triggered.extend(entries[i:])
+            del entries[i:]
+            if not entries:
+                del self.below[coin_id]
+    
+        fired = [self.alerts.pop(alert_id) for _, alert_id in triggered]
+        for alert in fired:
+            self._forget_user(alert)
+        return fired
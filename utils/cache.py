@@ -0,0 +1,112 @@
+"""
+Caching utilities for the Discord bot.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+# Sentinel for cache misses, so that None can be cached as a value
+MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry."""
+    
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+    
+    def get(self, key, default=None):
+        """Get a value and mark it as recently used."""
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+    
+    def set(self, key, value):
+        """Store a value, evicting the oldest entry when full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        """Remove a value if present."""
+        return self._data.pop(key, default)
+    
+    def clear(self):
+        """Remove all values."""
+        self._data.clear()
+    
+    def __contains__(self, key):
+        return key in self._data
+    
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache:
+    """Bounded mapping whose entries expire after a time-to-live."""
+    
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value)
+    
+    def get(self, key, default=None):
+        """Get a value if it has not expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            return default
+        return entry[1]
+    
+    def set(self, key, value, ttl=None):
+        """Store a value for `ttl` seconds (defaults to the cache's TTL)."""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        """Remove a value if present."""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+    
+    def clear(self):
+        """Remove all values."""
+        self._data.clear()
+    
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+    
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight task."""
+    
+    def __init__(self):
+        self._inflight = {}
+    
+    async def do(self, key, func):
+        """Await `func()` for `key`, sharing the result with concurrent callers."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # Shield so one caller being cancelled doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+    
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+    
+    def __contains__(self, key):
+        return key in self._inflight
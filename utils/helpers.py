@@ -2,32 +2,19 @@
 Helper utility functions for the Discord bot.
 """
 
-import json
-from pathlib import Path
 from datetime import datetime
 import os
+from utils.storage import DATA_DIR, atomic_write, dumps, read_json_file
 
 
 def load_json(filename):
     """Load data from a JSON file."""
-    filepath = Path('data') / filename
-    if filepath.exists():
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-    return {}
+    return read_json_file(DATA_DIR / filename)
 
 
 def save_json(filename, data):
-    """Save data to a JSON file."""
-    data_dir = Path('data')
-    data_dir.mkdir(exist_ok=True)
-    
-    filepath = data_dir / filename
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    """Save data to a JSON file atomically."""
+    atomic_write(DATA_DIR / filename, dumps(data))
 
 
 def format_time(seconds):
@@ -0,0 +1,85 @@
+"""
+Logging setup: records are queued on the event loop and written by a background thread.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every N records per `category`, for high-volume events.
+
+    Records are tagged with `extra={'category': ...}`; untagged records and
+    warnings or worse always pass.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        # category -> keep every Nth record
+        self.every = {category: max(1, round(1 / rate)) for category, rate in rates.items() if rate > 0}
+        self.dropped = {category for category, rate in rates.items() if rate <= 0}
+        self.counts = dict.fromkeys(rates, 0)
+
+    def filter(self, record):
+        category = getattr(record, 'category', None)
+        if category not in self.counts or record.levelno >= logging.WARNING:
+            return True
+        if category in self.dropped:
+            return False
+        count = self.counts[category]
+        self.counts[category] = count + 1
+        return count % self.every[category] == 0
+
+
+def setup_logging(level=logging.INFO, log_file='bot.log', max_bytes=10 * 1024 * 1024,
+                  backup_count=5, sample_rates=None):
+    """Route all logging through a queue to a rotating JSON file and the console.
+
+    Returns the started QueueListener; call `stop()` on shutdown to flush it.
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,35 @@
+"""
+yt-dlp lookups for music playback, imported only when first needed.
+"""
+
+# yt-dlp options
+YTDL_OPTIONS = {
+    'format': 'bestaudio/best',
+    'noplaylist': True,
+    'quiet': False,
+    'no_warnings': False,
+    'default_search': 'ytsearch',
+    'extractaudio': True,
+    'audioformat': 'mp3',
+    'nocheckcertificate': True,
+    'ignoreerrors': False,
+    'logtostderr': False,
+    'geo_bypass': True
+}
+
+_yt_dlp = None
+
+
+def get_yt_dlp():
+    """Import yt-dlp on first use: it is slow to import and only !play needs it."""
+    global _yt_dlp
+    if _yt_dlp is None:
+        import yt_dlp
+        _yt_dlp = yt_dlp
+    return _yt_dlp
+
+
+def extract_info(query):
+    """Resolve a search or URL with yt-dlp (blocking; run it in an executor)."""
+    with get_yt_dlp().YoutubeDL(YTDL_OPTIONS) as ytdl:
+        return ytdl.extract_info(query, download=False)
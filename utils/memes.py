@@ -0,0 +1,150 @@
+"""
+Reddit meme fetching shared by the prefix and slash meme commands.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+
+from utils.cache import LRUCache, SingleFlight
+
+MEME_SORTS = ('hot', 'new', 'top')  # Listings merged into each subreddit's pool
+MEME_POOL_TTL = 600  # Pools older than this are refilled in the background
+MEME_EMPTY_TTL = 120  # How long a missing or empty subreddit is remembered before retrying
+MEME_REFRESH_INTERVAL = 300
+MEME_IDLE_SECONDS = 3600  # Pools not requested for this long stop being refreshed
+MEME_MAX_POOLS = 64
+MEME_SEEN_PER_CHANNEL = 50  # Recent posts a channel won't be shown again
+
+# Realistic browser headers to avoid blocking
+REDDIT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json, text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+
+class MemeService:
+    """Reddit meme fetching shared by !meme and /meme.
+    
+    Posts are kept in per-subreddit pools that are refilled in the background
+    and served without repeats per channel.
+    """
+    
+    def __init__(self):
+        self.pools = LRUCache(maxsize=MEME_MAX_POOLS)  # subreddit -> (posts, fetched_at)
+        self.last_used = {}  # subreddit -> monotonic time of last request
+        self.seen = LRUCache(maxsize=1024)  # (channel_id, subreddit) -> deque of recent post ids
+        self.flights = SingleFlight()
+        self.refills = set()  # background refill tasks, referenced so they aren't collected mid-run
+        self.session = None
+    
+    def get_session(self):
+        """Get the shared HTTP session, creating it on first use."""
+        import aiohttp  # Deferred so the pool logic imports without the HTTP stack
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                headers=REDDIT_HEADERS, timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self.session
+    
+    async def close(self):
+        """Cancel pending refills and close the HTTP session."""
+        for task in list(self.refills):
+            task.cancel()
+        if self.session and not self.session.closed:
+            await self.session.close()
+    
+    async def fetch_listing(self, subreddit, sort):
+        """Fetch one listing, returning its non-stickied posts (empty on any failure)."""
+        import aiohttp
+        url = f"https://www.reddit.com/r/{subreddit}/{sort}.json"
+        params = {'limit': 50, 'raw_json': 1}
+        if sort == 'top':
+            params['t'] = 'day'
+        try:
+            async with self.get_session().get(url, params=params) as resp:
+                if resp.status != 200:
+                    return []
+                data = await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return []
+        
+        if isinstance(data, list):
+            data = data[0] if data else {}
+        children = data.get('data', {}).get('children', []) if isinstance(data, dict) else []
+        return [
+            child['data'] for child in children
+            if child.get('data', {}).get('title') and not child['data'].get('stickied', False)
+        ]
+    
+    async def refill(self, subreddit):
+        """Fetch all listings concurrently and swap in a deduplicated pool."""
+        listings = await asyncio.gather(*(self.fetch_listing(subreddit, sort) for sort in MEME_SORTS))
+        posts = {}
+        for listing in listings:
+            for post in listing:
+                posts.setdefault(post.get('id') or post.get('permalink'), post)
+        
+        pool = self.pools.get(subreddit)
+        if posts or not pool or not pool[0]:
+            # Empty results are cached too, so a missing subreddit isn't refetched on every request
+            self.pools.set(subreddit, (list(posts.values()), time.monotonic()))
+        else:
+            # Every listing failed: keep serving the old posts and back off for MEME_EMPTY_TTL
+            self.pools.set(subreddit, (pool[0], time.monotonic() - MEME_POOL_TTL + MEME_EMPTY_TTL))
+        return self.pools.get(subreddit)[0]
+    
+    def is_stale(self, pool):
+        """Whether a (posts, fetched_at) pool is due for a refill."""
+        posts, fetched_at = pool
+        return time.monotonic() - fetched_at > (MEME_POOL_TTL if posts else MEME_EMPTY_TTL)
+    
+    def is_warm(self, subreddit):
+        """Whether the subreddit can be answered from memory (possibly with nothing)."""
+        pool = self.pools.get(subreddit.lower())
+        return pool is not None and (bool(pool[0]) or not self.is_stale(pool))
+    
+    def get_meme(self, subreddit, channel_id):
+        """Pick a random post from a loaded pool that the channel hasn't seen recently."""
+        subreddit = subreddit.lower()
+        self.last_used[subreddit] = time.monotonic()
+        pool = self.pools.get(subreddit, ([], 0))
+        if self.is_stale(pool) and subreddit not in self.flights:
+            task = asyncio.ensure_future(self.flights.do(subreddit, lambda: self.refill(subreddit)))
+            self.refills.add(task)
+            task.add_done_callback(self.refills.discard)
+        posts = pool[0]
+        if not posts:
+            return None
+        
+        seen = self.seen.get((channel_id, subreddit))
+        if seen is None:
+            seen = deque(maxlen=MEME_SEEN_PER_CHANNEL)
+            self.seen.set((channel_id, subreddit), seen)
+        
+        fresh = [post for post in posts if post.get('id') not in seen]
+        post = random.choice(fresh or posts)
+        seen.append(post.get('id'))
+        return post
+    
+    async def fetch_meme(self, subreddit, channel_id):
+        """Get a meme, loading the subreddit's pool first if it is cold."""
+        subreddit = subreddit.lower()
+        if not self.is_warm(subreddit):
+            await self.flights.do(subreddit, lambda: self.refill(subreddit))
+        return self.get_meme(subreddit, channel_id)
+    
+    async def refresh_stale(self):
+        """Refill pools that are stale and still in use; forget idle ones."""
+        now = time.monotonic()
+        for subreddit, last_used in list(self.last_used.items()):
+            if now - last_used > MEME_IDLE_SECONDS:
+                del self.last_used[subreddit]
+                self.pools.pop(subreddit)
+                continue
+            
+            pool = self.pools.get(subreddit)
+            if pool is None or self.is_stale(pool):
+                await self.flights.do(subreddit, lambda: self.refill(subreddit))
@@ -0,0 +1,237 @@
+"""
+In-process metrics: latency histograms, counters, event-loop lag and Prometheus text output.
+"""
+
+import asyncio
+import bisect
+import functools
+import time
+
+# Upper bounds in seconds; the last bucket catches everything slower
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in (capped at the max)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Registry of labelled histograms and counters."""
+
+    def __init__(self):
+        self.histograms = {}  # name -> {labels: Histogram}
+        self.counters = {}  # name -> {labels: int}
+        self.label_names = {}  # name -> tuple of label names
+        self.help = {}
+
+    def describe(self, name, help_text, label_names=()):
+        """Set the help text and label names used when rendering a metric."""
+        self.help[name] = help_text
+        self.label_names[name] = tuple(label_names)
+
+    def observe(self, name, value, labels=()):
+        """Record a value (usually seconds) in a histogram."""
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, labels=(), amount=1):
+        """Increment a counter."""
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def timer(self, name, labels=()):
+        """Context manager that observes the elapsed time of its block."""
+        return _Timer(self, name, labels)
+
+    def format_labels(self, name, labels, extra=None):
+        pairs = list(zip(self.label_names.get(name, ()), labels))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in pairs) + '}'
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{self.format_labels(name, labels)} {value}")
+
+        for name, series in sorted(self.histograms.items()):
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    lines.append(f"{name}_bucket{self.format_labels(name, labels, ('le', le))} {cumulative}")
+                lines.append(f"{name}_sum{self.format_labels(name, labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self.format_labels(name, labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task.
+
+    Any lag beyond a few milliseconds means something is blocking the loop.
+    """
+
+    def __init__(self, metrics, interval=0.5):
+        self.metrics = metrics
+        self.interval = interval
+        self.last = 0.0
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, time.perf_counter() - start - self.interval)
+            self.metrics.observe('event_loop_lag_seconds', self.last)
+
+
+def timed_listener(metrics, event_name, func):
+    """Wrap an event listener so every call is timed and errors are counted.
+
+    Exceptions are re-raised, so discord.py still reports them through on_error.
+    """
+    labels = (event_name, func.__qualname__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            metrics.inc('event_errors_total', labels)
+            raise
+        finally:
+            metrics.observe('event_handler_seconds', time.perf_counter() - start, labels)
+
+    return wrapper
+
+
+class TimedListenersMixin:
+    """Bot mixin that times listeners registered with @bot.event, bot.listen() and cogs.
+
+    Only the public registration methods are wrapped; the wrapper for each
+    listener is remembered so remove_listener (used when a cog unloads) still
+    finds it.
+    """
+
+    listener_metrics = None  # defaults to the shared registry
+
+    def timed(self, func, name):
+        registry = self.listener_metrics or metrics
+        wrappers = self.__dict__.setdefault('timed_listeners', {})
+        if (name, func) not in wrappers:
+            wrappers[(name, func)] = timed_listener(registry, name, func)
+        return wrappers[(name, func)]
+
+    def event(self, coro):
+        return super().event(self.timed(coro, coro.__name__))
+
+    def add_listener(self, func, name=None):
+        name = name if isinstance(name, str) else func.__name__
+        super().add_listener(self.timed(func, name), name)
+
+    def remove_listener(self, func, name=None):
+        name = name if isinstance(name, str) else func.__name__
+        wrapper = self.__dict__.get('timed_listeners', {}).pop((name, func), func)
+        super().remove_listener(wrapper, name)
+
+
+async def start_metrics_server(metrics, port, host='127.0.0.1'):
+    """Serve /metrics in Prometheus text format on a local port. Returns the aiohttp runner."""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=metrics.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# Shared registry for the whole bot
+metrics = Metrics()
+metrics.describe('event_handler_seconds', 'Time spent in gateway event listeners.', ('event', 'listener'))
+metrics.describe('event_errors_total', 'Exceptions raised by event listeners.', ('event', 'listener'))
+metrics.describe('command_seconds', 'Time spent running prefix commands.', ('command',))
+metrics.describe('command_errors_total', 'Prefix command errors.', ('command', 'error'))
+metrics.describe('message_stage_seconds', 'Time spent in each on_message pipeline stage.', ('stage',))
+metrics.describe('event_loop_lag_seconds', 'Delay between when a sleeping task should wake and when it does.')
@@ -0,0 +1,143 @@
+"""
+NewsAPI lookups with caching and deduplication, shared by the news commands.
+"""
+
+import hashlib
+import re
+from urllib.parse import urlsplit
+
+from utils.cache import SingleFlight, TTLCache
+
+HEADLINES_TTL = 300  # Top headlines only change every few minutes
+SEARCH_TTL = 900
+NEWS_PAGE_SIZE = 20  # Always fetch a full page so every !news limit shares one cache entry
+NEWS_COUNTRY = 'us'  # Can be changed to other countries
+
+CATEGORY_MAP = {
+    'tech': 'technology',
+    'technology': 'technology',
+    'business': 'business',
+    'sports': 'sports',
+    'health': 'health',
+    'science': 'science',
+    'entertainment': 'entertainment',
+    'general': 'general'
+}
+
+
+def article_keys(article):
+    """Return (url key, title hash) identifying an article across syndicated copies.
+
+    Either is None when the article has no URL or title to compare.
+    """
+    parts = urlsplit(article.get('url') or '')
+    url_key = f"{parts.netloc.lower().removeprefix('www.')}{parts.path.rstrip('/')}" or None
+
+    # Syndicated titles differ only by the " - Source Name" suffix NewsAPI appends
+    title = (article.get('title') or '').lower()
+    source = ((article.get('source') or {}).get('name') or '').lower()
+    if source and title.endswith(f" - {source}"):
+        title = title[:-len(source) - 3]
+    title = re.sub(r'[^a-z0-9]+', ' ', title).strip()
+    title_hash = hashlib.blake2b(title.encode(), digest_size=8).digest() if title else None
+    return url_key, title_hash
+
+
+def dedupe_articles(articles):
+    """Drop removed articles and collapse duplicates by URL or normalized title."""
+    seen_urls = set()
+    seen_titles = set()
+    unique = []
+    for article in articles:
+        if article.get('title') in (None, '[Removed]'):
+            continue
+        url_key, title_hash = article_keys(article)
+        if (url_key and url_key in seen_urls) or (title_hash and title_hash in seen_titles):
+            continue
+        if url_key:
+            seen_urls.add(url_key)
+        if title_hash:
+            seen_titles.add(title_hash)
+        unique.append(article)
+    return unique
+
+
+class NewsAPIError(Exception):
+    """Raised when NewsAPI returns a non-200 response."""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+
+
+class NewsService:
+    """NewsAPI lookups with TTL caches, single-flight fetches and deduplicated results."""
+
+    def __init__(self, api_key, api_url):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.headlines = TTLCache(HEADLINES_TTL, maxsize=64)  # (category, country, page size) -> articles
+        self.searches = TTLCache(SEARCH_TTL, maxsize=256)  # normalized query -> articles
+        self.flights = SingleFlight()
+        self.session = None
+
+    def get_session(self):
+        """Get the shared HTTP session, creating it on first use."""
+        import aiohttp  # Deferred so the caching logic imports without the HTTP stack
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        return self.session
+
+    async def close(self):
+        """Close the HTTP session."""
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def request(self, path, params):
+        """GET a NewsAPI endpoint and return its deduplicated articles."""
+        headers = {'X-Api-Key': self.api_key}
+        async with self.get_session().get(f"{self.api_url}{path}", headers=headers, params=params) as response:
+            if response.status != 200:
+                try:
+                    message = (await response.json(content_type=None)).get('message')
+                except (ValueError, AttributeError):
+                    message = None
+                raise NewsAPIError(response.status, message)
+            data = await response.json()
+        return dedupe_articles(data.get('articles', []))
+
+    async def get_headlines(self, category, country=NEWS_COUNTRY):
+        """Get top headlines for a category."""
+        key = (category, country, NEWS_PAGE_SIZE)
+        articles = self.headlines.get(key)
+        if articles is None:
+            articles = await self.flights.do(('top', key), lambda: self.fetch_headlines(key))
+        return articles
+
+    async def fetch_headlines(self, key):
+        category, country, page_size = key
+        articles = await self.request('/top-headlines', {
+            'category': category,
+            'country': country,
+            'pageSize': page_size
+        })
+        self.headlines.set(key, articles)
+        return articles
+
+    async def search(self, query):
+        """Search recent articles for a query."""
+        key = re.sub(r'\s+', ' ', query.strip().lower())
+        articles = self.searches.get(key)
+        if articles is None:
+            articles = await self.flights.do(('search', key), lambda: self.fetch_search(key, query))
+        return articles
+
+    async def fetch_search(self, key, query):
+        articles = await self.request('/everything', {
+            'q': query,
+            'sortBy': 'publishedAt',
+            'pageSize': NEWS_PAGE_SIZE,
+            'language': 'en'
+        })
+        self.searches.set(key, articles)
+        return articles
@@ -0,0 +1,52 @@
+"""
+Per-guild command prefixes cached in memory.
+"""
+
+# Longest prefix a guild may set
+MAX_PREFIX_LENGTH = 5
+
+
+class PrefixCache:
+    """Resolves command prefixes without a database call per message.
+
+    Custom prefixes are loaded from server_settings in one query at startup and
+    written through on change. Guilds without one use the default prefix.
+    """
+
+    def __init__(self, db, default):
+        self.db = db
+        self.default = default
+        self.prefixes = {}  # guild_id -> custom prefix
+
+    def load(self):
+        """Load every custom prefix in bulk."""
+        self.prefixes = self.db.get_guild_prefixes()
+        return len(self.prefixes)
+
+    def get(self, guild_id):
+        return self.prefixes.get(guild_id, self.default)
+
+    def set(self, guild_id, prefix):
+        """Store a guild's prefix; setting the default clears the custom one."""
+        # NULL means "follow BOT_PREFIX", so changing the default later still applies
+        custom = None if prefix == self.default else prefix
+        self.db.set_guild_prefix(guild_id, custom)
+        self.invalidate(guild_id)
+        if custom is not None:
+            self.prefixes[guild_id] = custom
+
+    def invalidate(self, guild_id):
+        """Drop a cached prefix, e.g. after the row was changed elsewhere."""
+        self.prefixes.pop(guild_id, None)
+
+    def resolve(self, message):
+        """Prefix for the guild a message was sent in (the default in DMs)."""
+        return self.get(message.guild.id) if message.guild else self.default
+
+    def is_command(self, message):
+        """Whether a message starts with its guild's prefix."""
+        return message.content.startswith(self.resolve(message))
+
+    def __call__(self, bot, message):
+        # Used directly as the bot's command_prefix
+        return self.resolve(message)
@@ -0,0 +1,74 @@
+"""
+Incrementally maintained member status counts per guild.
+"""
+
+from collections import Counter
+
+STATUSES = ('online', 'idle', 'dnd', 'offline')
+
+
+def status_key(member):
+    """Bucket a member's status; invisible members appear offline to everyone else."""
+    status = str(member.status)
+    return status if status in STATUSES else 'offline'
+
+
+class PresenceCounter:
+    """Per-guild online/idle/dnd/offline and bot counts.
+
+    A guild is counted in one pass the first time it is asked for, then kept
+    current from presence and member events so lookups are O(1). Events missed
+    while disconnected would skew the counts, so they are dropped (and rebuilt
+    on the next lookup) whenever the gateway reconnects or they go negative.
+    """
+
+    def __init__(self):
+        self.guilds = {}  # guild_id -> Counter of statuses and 'bots'
+
+    def get(self, guild):
+        """Get counts for a guild, building them on first use."""
+        counts = self.guilds.get(guild.id)
+        if counts is None:
+            counts = Counter({key: 0 for key in STATUSES + ('bots',)})
+            for member in guild.members:
+                counts[status_key(member)] += 1
+                counts['bots'] += member.bot
+            # Only trust the counts once the member list is complete
+            if getattr(guild, 'chunked', True):
+                self.guilds[guild.id] = counts
+        return counts
+
+    def update(self, guild_id, before, after):
+        """Move a member between status buckets."""
+        counts = self.guilds.get(guild_id)
+        if counts is not None:
+            old, new = status_key(before), status_key(after)
+            if old != new:
+                counts[old] -= 1
+                counts[new] += 1
+                self._check(guild_id, counts)
+
+    def add(self, guild_id, member, delta=1):
+        """Count a member joining (or leaving, with delta=-1)."""
+        counts = self.guilds.get(guild_id)
+        if counts is not None:
+            counts[status_key(member)] += delta
+            counts['bots'] += delta * member.bot
+            self._check(guild_id, counts)
+
+    def remove(self, guild_id, member):
+        """Stop counting a member who left."""
+        self.add(guild_id, member, -1)
+
+    def forget(self, guild_id):
+        """Drop a guild's counts."""
+        self.guilds.pop(guild_id, None)
+
+    def clear(self):
+        """Drop every guild's counts, e.g. after a reconnect."""
+        self.guilds.clear()
+
+    def _check(self, guild_id, counts):
+        # A negative count means an event was missed; rebuild from the member list
+        if min(counts.values()) < 0:
+            self.forget(guild_id)
@@ -0,0 +1,111 @@
+"""
+Incremental extension reloading with state handoff between cog instances.
+
+A cog can define `export_state()` returning any object and `import_state(state)`
+to receive it on the freshly loaded instance, so live state such as music
+queues survives a reload.
+"""
+
+import asyncio
+import hashlib
+import time
+from pathlib import Path
+
+
+def fingerprint(path, previous=None):
+    """Return (mtime_ns, size, sha1) for a file, reusing `previous` if mtime and size match."""
+    stat = path.stat()
+    if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+        return previous
+    return stat.st_mtime_ns, stat.st_size, hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+class CogReloader:
+    """Tracks cog file fingerprints and reloads only extensions whose source changed."""
+
+    def __init__(self, bot, directory='cogs'):
+        self.bot = bot
+        self.directory = Path(directory)
+        self.package = self.directory.name
+        self.fingerprints = {}  # extension name -> fingerprint at last (re)load
+
+    def discover(self):
+        """Map extension names to files for every module in the cogs directory."""
+        return {
+            f'{self.package}.{path.stem}': path
+            for path in sorted(self.directory.glob('*.py')) if path.name != '__init__.py'
+        }
+
+    def record(self, name, path):
+        self.fingerprints[name] = fingerprint(path)
+
+    def record_loaded(self):
+        """Fingerprint every loaded extension; call after startup loading."""
+        for name, path in self.discover().items():
+            if name in self.bot.extensions:
+                self.record(name, path)
+
+    def plan(self):
+        """Return (changed, added, removed) extension names."""
+        files = self.discover()
+        changed, added = [], []
+        for name, path in files.items():
+            if name not in self.bot.extensions:
+                added.append(name)
+                continue
+            previous = self.fingerprints.get(name)
+            current = fingerprint(path, previous)
+            if previous is None or current[2] != previous[2]:
+                changed.append(name)
+            else:
+                # Touched but identical: remember the new mtime so it isn't hashed again
+                self.fingerprints[name] = current
+        prefix = f'{self.package}.'
+        removed = [name for name in self.bot.extensions if name.startswith(prefix) and name not in files]
+        return changed, added, removed
+
+    def cogs_of(self, name):
+        return [cog for cog in self.bot.cogs.values() if type(cog).__module__ == name]
+
+    async def reload(self, name):
+        """Reload one extension, handing each cog's exported state to its replacement."""
+        states = {
+            cog.qualified_name: cog.export_state()
+            for cog in self.cogs_of(name) if hasattr(cog, 'export_state')
+        }
+        try:
+            await self.bot.reload_extension(name)
+        finally:
+            # On failure discord.py rolls back to the old module, which gets the state instead
+            for cog_name, state in states.items():
+                cog = self.bot.get_cog(cog_name)
+                if cog is not None and hasattr(cog, 'import_state'):
+                    cog.import_state(state)
+        self.record(name, self.discover()[name])
+
+    async def load_all(self):
+        """Load every discovered extension concurrently.
+
+        Returns a dict of extension name -> seconds taken, or the exception that
+        stopped it loading; one broken cog doesn't keep the others from loading.
+        """
+        async def load_timed(name):
+            start = time.perf_counter()
+            try:
+                await self.bot.load_extension(name)
+            except Exception as e:
+                return e
+            return time.perf_counter() - start
+
+        names = list(self.discover())
+        results = await asyncio.gather(*(load_timed(name) for name in names))
+        self.record_loaded()
+        return dict(zip(names, results))
+
+    async def load(self, name):
+        await self.bot.load_extension(name)
+        self.record(name, self.discover()[name])
+
+    async def unload(self, name):
+        await self.bot.unload_extension(name)
+        self.fingerprints.pop(name, None)
@@ -0,0 +1,151 @@
+"""
+Conversational replies: message routing, AI-reply heuristics and positive-word auto-replies.
+"""
+
+import random
+
+# Auto-reply templates: positive words mapped to contextual responses
+WORD_RESPONSES = {
+    # Excitement words
+    'wow': ['Wow {mention}! 😲', 'Amazing {mention}! ✨', 'That\'s awesome {mention}! 🎉'],
+    'woah': ['Woah {mention}! 😲', 'Wow {mention}! ✨'],
+    'whoa': ['Whoa {mention}! 😲', 'Amazing {mention}! ✨'],
+    'amazing': ['Amazing {mention}! ✨', 'You\'re amazing too {mention}! 🌟'],
+    'awesome': ['Awesome {mention}! 🔥', 'You\'re awesome too {mention}! 😎'],
+    'fantastic': ['Fantastic {mention}! 🌈', 'That\'s fantastic {mention}! 🎊'],
+    'incredible': ['Incredible {mention}! 🔥', 'That\'s incredible {mention}! 🌟'],
+    'brilliant': ['Brilliant {mention}! 💡', 'That\'s brilliant {mention}! 🌟'],
+    'wonderful': ['Wonderful {mention}! 🌈', 'That\'s wonderful {mention}! ✨'],
+    'super': ['Super {mention}! 🚀', 'That\'s super {mention}! ✨'],
+    'sweet': ['Sweet {mention}! 🍬', 'That\'s sweet {mention}! 😊'],
+    'epic': ['Epic {mention}! 🎮', 'That\'s epic {mention}! 🔥'],
+    'legendary': ['Legendary {mention}! 💎', 'That\'s legendary {mention}! 🌟'],
+    'marvelous': ['Marvelous {mention}! ✨', 'That\'s marvelous {mention}! 🌟'],
+    'magnificent': ['Magnificent {mention}! 👑', 'That\'s magnificent {mention}! 🌟'],
+
+    # Praise words
+    'great': ['Great {mention}! 👍', 'That\'s great {mention}! 🎊'],
+    'good': ['That\'s good {mention}! 👍', 'Good {mention}! 😊'],
+    'nice': ['Nice {mention}! 😊', 'That\'s nice {mention}! ✨'],
+    'cool': ['Cool {mention}! 😎', 'That\'s cool {mention}! ✨'],
+    'excellent': ['Excellent {mention}! 🎯', 'Great job {mention}! 🌟'],
+    'perfect': ['Perfect {mention}! ✅', 'That\'s perfect {mention}! ✨'],
+    'outstanding': ['Outstanding {mention}! 🏆', 'That\'s outstanding {mention}! 🌟'],
+    'remarkable': ['Remarkable {mention}! ✨', 'That\'s remarkable {mention}! 🌟'],
+    'splendid': ['Splendid {mention}! 🌟', 'That\'s splendid {mention}! ✨'],
+    'terrific': ['Terrific {mention}! 🎉', 'That\'s terrific {mention}! 🌟'],
+    'fabulous': ['Fabulous {mention}! ✨', 'That\'s fabulous {mention}! 🌈'],
+    'phenomenal': ['Phenomenal {mention}! 🔥', 'That\'s phenomenal {mention}! 🌟'],
+    'spectacular': ['Spectacular {mention}! 🎆', 'That\'s spectacular {mention}! ✨'],
+
+    # Achievement words
+    'congrats': ['Congratulations {mention}! 🎉🎊', 'Well done {mention}! 👏', 'Congrats {mention}! 🏆'],
+    'congratulations': ['Congratulations {mention}! 🎉🎊', 'Amazing achievement {mention}! 🏆'],
+    'bravo': ['Bravo {mention}! 👏', 'Well done {mention}! 🎉'],
+    'kudos': ['Kudos {mention}! 👏', 'Great job {mention}! 🌟'],
+
+    # Appreciation words
+    'thanks': ['You\'re welcome {mention}! 😊', 'Happy to help {mention}! 🙌', 'Any time {mention}! 💙'],
+    'thank': ['You\'re welcome {mention}! 😊', 'Happy to help {mention}! 🙌'],
+    'appreciate': ['You\'re welcome {mention}! 😊', 'Happy to help {mention}! 🙌'],
+
+    # Agreement words
+    'yeah': ['Yeah {mention}! 👍', 'Right on {mention}! ✨'],
+    'yes': ['Great {mention}! 👍', 'Awesome {mention}! 😊'],
+    'yay': ['Yay {mention}! 🎉', 'That\'s great {mention}! 🌟'],
+    'yep': ['Yep {mention}! 👍', 'Right on {mention}! ✨'],
+    'yup': ['Yup {mention}! 👍', 'Exactly {mention}! 🎯'],
+    'okay': ['Okay {mention}! 👍', 'Sounds good {mention}! 😊'],
+    'ok': ['Okay {mention}! 👍', 'Sounds good {mention}! 😊'],
+
+    # Fun words
+    'fun': ['Glad you\'re having fun {mention}! 🎮', 'Fun is the best {mention}! 🎈'],
+    'enjoy': ['Glad you\'re enjoying {mention}! 🎉', 'Enjoy {mention}! 🎈'],
+    'enjoying': ['Glad you\'re enjoying {mention}! 🎉', 'That\'s great {mention}! 🎈'],
+    'loved': ['Glad you loved it {mention}! ❤️', 'That\'s wonderful {mention}! 💙'],
+    'love': ['Love it too {mention}! ❤️', 'That\'s awesome {mention}! 💙'],
+    'loving': ['Glad you\'re loving it {mention}! ❤️', 'That\'s great {mention}! 💙'],
+
+    # Surprise words (including common misspellings)
+    'surprise': ['Surprise! {mention}! 🎁', 'Wow {mention}! That\'s surprising! 😲'],
+    'surprised': ['Surprised {mention}? 😲', 'That\'s surprising {mention}! ✨'],
+    'surprising': ['That\'s surprising {mention}! 😲', 'Amazing {mention}! ✨'],
+    'shocked': ['Shocked {mention}? 😲', 'That\'s shocking {mention}! ⚡'],
+    'shocking': ['That\'s shocking {mention}! ⚡', 'Wow {mention}! 😲'],
+    'shoked': ['Shocked {mention}? 😲', 'That\'s shocking {mention}! ⚡'],  # Common misspelling
+    'shokd': ['Shocked {mention}? 😲', 'That\'s shocking {mention}! ⚡'],  # Common misspelling
+
+    # Emotion words
+    'happy': ['Glad you\'re happy {mention}! 😊', 'Happiness is great {mention}! 🌈'],
+    'happiness': ['Happiness is wonderful {mention}! 😊', 'That\'s great {mention}! 🌈'],
+    'joy': ['Joy is amazing {mention}! 😊', 'Glad you feel joy {mention}! 🌈'],
+    'joyful': ['Joyful {mention}! 😊', 'That\'s wonderful {mention}! 🌈'],
+    'excited': ['Excited {mention}? 🎉', 'That\'s exciting {mention}! ✨'],
+    'exciting': ['That\'s exciting {mention}! 🎉', 'Great {mention}! ✨'],
+    'thrilled': ['Thrilled {mention}? 🎉', 'That\'s thrilling {mention}! ✨'],
+    'thrilling': ['That\'s thrilling {mention}! 🎉', 'Great {mention}! ✨'],
+    'proud': ['Proud of you {mention}! 👏', 'That\'s something to be proud of {mention}! 🌟'],
+    'pleased': ['Pleased {mention}? 😊', 'That\'s great {mention}! ✨'],
+    'delighted': ['Delighted {mention}? 😊', 'That\'s wonderful {mention}! 🌟'],
+    'glad': ['Glad to hear {mention}! 😊', 'That\'s great {mention}! ✨'],
+    'ecstatic': ['Ecstatic {mention}? 🎉', 'That\'s amazing {mention}! ✨'],
+    'overjoyed': ['Overjoyed {mention}? 🎉', 'That\'s wonderful {mention}! 🌟'],
+
+    # Lucky words
+    'lucky': ['Lucky {mention}! 🍀', 'That\'s lucky {mention}! ✨'],
+    'luck': ['Good luck {mention}! 🍀', 'That\'s lucky {mention}! ✨'],
+    'fortune': ['Fortune {mention}! 🍀', 'That\'s fortunate {mention}! ✨'],
+}
+
+# Longer words are more specific, so they are matched first
+WORD_PRIORITY = sorted(WORD_RESPONSES, key=len, reverse=True)
+
+# Negative words that should NOT trigger responses
+NEGATIVE_WORDS = frozenset({
+    'sad', 'angry', 'bad', 'terrible', 'awful', 'horrible', 'disappointed',
+    'upset', 'mad', 'hate', 'hated', 'depressed', 'lonely', 'tired', 'exhausted',
+    'bored', 'annoyed', 'frustrated', 'worried', 'scared', 'afraid', 'fear'
+})
+
+QUESTION_WORDS = frozenset({'who', 'what', 'when', 'where', 'why', 'how'})
+QUESTION_PHRASES = ('tell me about', 'explain', 'what is', 'who is')
+EMOTION_WORDS = ('angry', 'happy', 'sad', 'excited', 'bored', 'tired')
+PRAISE_WORDS = ('fabulous', 'amazing', 'great', 'awesome')
+
+
+def route_message(content, prefix):
+    """Route a message: 'command' when it used a prefix, 'chat' for other text, None to ignore it."""
+    if prefix is not None:
+        return 'command'
+    return 'chat' if content.strip() else None
+
+
+def needs_ai_response(content, content_lower, tokens):
+    """Check if a message needs an AI response (questions, emotional expressions, or statements)."""
+    return (
+        # Questions
+        not QUESTION_WORDS.isdisjoint(tokens)
+        or '?' in content
+        or any(phrase in content_lower for phrase in QUESTION_PHRASES)
+
+        # Emotional expressions
+        or any(word in content_lower for word in EMOTION_WORDS)
+        or content_lower.startswith(('i am ', 'i\'m ', 'i feel '))
+
+        # General statements that might need a response
+        or (len(tokens) > 3 and not content.endswith(('.', '!', '?')))  # Longer statements without punctuation
+        or any(word in content_lower for word in PRAISE_WORDS)
+    )
+
+
+def choose_reply(words, mention):
+    """Pick an auto-reply for a message's words, or None.
+
+    Messages with negative words get no reply; longer (more specific) words win.
+    """
+    if not NEGATIVE_WORDS.isdisjoint(words):
+        return None
+    matched_word = next((word for word in WORD_PRIORITY if word in words), None)
+    if matched_word is None:
+        return None
+    return random.choice(WORD_RESPONSES[matched_word]).format(mention=mention)
@@ -0,0 +1,31 @@
+"""
+Shard configuration and guild ownership for multi-process deployments.
+"""
+
+
+def parse_shard_ids(spec):
+    """Parse a shard list like "0-3,8" into sorted ids; empty means all shards."""
+    ids = set()
+    for part in (spec or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        ids.update(range(int(start), int(end or start) + 1))
+    return sorted(ids) or None
+
+
+def shard_for(guild_id, shard_count):
+    """Shard that receives a guild's events (DMs, guild id 0, go to shard 0)."""
+    return (guild_id >> 22) % shard_count
+
+
+def owns_guild(bot, guild_id):
+    """Whether this process runs the shard for `guild_id`.
+    
+    Background tasks that read shared tables (alerts, digests, reminders) use
+    this so each guild is handled by exactly one process.
+    """
+    shard_ids = getattr(bot, 'shard_ids', None)
+    if not shard_ids or not bot.shard_count:
+        return True
+    return shard_for(guild_id or 0, bot.shard_count) in shard_ids
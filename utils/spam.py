@@ -0,0 +1,104 @@
+"""
+Spam detection with per-user sliding windows.
+"""
+
+import sys
+from array import array
+
+# Placeholder for empty ring slots; always falls outside any time window
+EMPTY = float('-inf')
+
+
+class UserWindow:
+    """Recent activity for one user, kept in fixed-size ring buffers.
+
+    Rings are typed arrays with a write cursor, so each slot costs 8 bytes
+    rather than a boxed float or tuple.
+    """
+
+    __slots__ = ('times', 'hash_times', 'hashes', 'mention_times', 'mentions', 'pos', 'last_seen')
+
+    def __init__(self, max_messages, history):
+        self.times = array('d', [EMPTY] * max_messages)
+        self.hash_times = array('d', [EMPTY] * history)
+        self.hashes = array('q', [0] * history)
+        self.mention_times = array('d', [EMPTY] * history)
+        self.mentions = array('q', [0] * history)
+        self.pos = [0, 0, 0]  # write cursors for times, hashes, mentions
+        self.last_seen = EMPTY
+
+
+class SpamDetector:
+    """Flags message floods, repeated content and mass mentions.
+
+    Each check touches at most `history` slots per user, so the cost per
+    message is constant regardless of how many users are tracked.
+    """
+
+    def __init__(self, max_messages=6, rate_window=5.0, max_duplicates=3,
+                 duplicate_window=30.0, max_mentions=8, mention_window=10.0, history=8):
+        self.max_messages = max_messages
+        self.rate_window = rate_window
+        self.max_duplicates = max_duplicates
+        self.duplicate_window = duplicate_window
+        self.max_mentions = max_mentions
+        self.mention_window = mention_window
+        self.history = history
+        self.windows = {}
+
+    def check(self, key, now, content, mention_count=0):
+        """Record a message and return a reason string if it trips a threshold."""
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = UserWindow(self.max_messages, self.history)
+        window.last_seen = now
+        pos = window.pos
+
+        # Message rate: after writing, the cursor points at the oldest of the last N timestamps
+        times = window.times
+        times[pos[0]] = now
+        pos[0] = (pos[0] + 1) % self.max_messages
+        if now - times[pos[0]] <= self.rate_window:
+            return f"Sending messages too quickly ({self.max_messages} in {self.rate_window:g}s)"
+
+        if content:
+            digest = hash(content.lower())
+            window.hash_times[pos[1]] = now
+            window.hashes[pos[1]] = digest
+            pos[1] = (pos[1] + 1) % self.history
+            cutoff = now - self.duplicate_window
+            repeats = sum(1 for t, h in zip(window.hash_times, window.hashes) if h == digest and t >= cutoff)
+            if repeats >= self.max_duplicates:
+                return f"Repeating the same message ({repeats} times)"
+
+        if mention_count:
+            window.mention_times[pos[2]] = now
+            window.mentions[pos[2]] = mention_count
+            pos[2] = (pos[2] + 1) % self.history
+            cutoff = now - self.mention_window
+            total = sum(c for t, c in zip(window.mention_times, window.mentions) if t >= cutoff)
+            if total >= self.max_mentions:
+                return f"Mass mentioning ({total} mentions in {self.mention_window:g}s)"
+
+        return None
+
+    def reset(self, key):
+        """Forget a user's history (e.g. after they have been actioned)."""
+        self.windows.pop(key, None)
+
+    def evict(self, older_than):
+        """Drop users whose last message is older than `older_than`."""
+        stale = [key for key, window in self.windows.items() if window.last_seen < older_than]
+        for key in stale:
+            del self.windows[key]
+        return len(stale)
+
+    def footprint(self):
+        """Approximate memory used by tracked windows, in bytes."""
+        total = sys.getsizeof(self.windows)
+        for key, window in self.windows.items():
+            total += sys.getsizeof(key) + sys.getsizeof(window) + sys.getsizeof(window.pos)
+            total += sum(sys.getsizeof(ring) for ring in (
+                window.times, window.hash_times, window.hashes, window.mention_times, window.mentions
+            ))
+        return total
@@ -0,0 +1,204 @@
+"""
+Persistent key-value documents with atomic writes and dirty tracking.
+
+A Store is a dict of top-level keys (e.g. guild id -> per-user stats). Changed
+keys are marked dirty and written on flush(): the JSON backend rewrites its
+file atomically, the SQLite backend writes only the dirty keys.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+DATA_DIR = Path('data')
+# Shard processes started with SHARD_IDS share one database; a JSON file would be
+# overwritten by whichever process flushed last
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite' if os.getenv('SHARD_IDS') else 'json').lower()
+
+
+def dumps(obj):
+    """Encode to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Decode JSON bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def atomic_write(path, data):
+    """Write bytes to `path` so readers (and crashes) only ever see the old or the new file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_json_file(path, default=None):
+    """Read a JSON file, returning `default` if it is missing or corrupt."""
+    try:
+        return loads(Path(path).read_bytes())
+    except (OSError, ValueError):
+        return {} if default is None else default
+
+
+class JSONFileBackend:
+    """One JSON file per store, rewritten atomically on every flush."""
+    
+    def __init__(self, directory=DATA_DIR):
+        self.directory = Path(directory)
+    
+    def path(self, name):
+        return self.directory / f'{name}.json'
+    
+    def load(self, name):
+        return read_json_file(self.path(name))
+    
+    def encode(self, data, dirty):
+        return dumps(data)
+    
+    def write(self, name, payload):
+        atomic_write(self.path(name), payload)
+    
+    def save(self, name, data, dirty):
+        self.write(name, self.encode(data, dirty))
+
+
+class SQLiteBackend:
+    """Stores each top-level key as a row, so a flush only writes what changed."""
+    
+    def __init__(self, db=None):
+        if db is None:
+            from database import Database
+            db = Database()
+        self.db = db
+    
+    def load(self, name):
+        return {key: loads(value) for key, value in self.db.kv_load(name).items()}
+    
+    def encode(self, data, dirty):
+        return (
+            {key: dumps(data[key]).decode('utf-8') for key in dirty if key in data},
+            [key for key in dirty if key not in data]
+        )
+    
+    def write(self, name, payload):
+        self.db.kv_save(name, *payload)
+    
+    def save(self, name, data, dirty):
+        self.write(name, self.encode(data, dirty))
+
+
+class Store:
+    """A dict-like document persisted through a backend with dirty-key tracking."""
+    
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+        self.data = backend.load(name)
+        self.dirty = set()
+    
+    def mark_dirty(self, key):
+        """Record that a top-level key was added, changed or deleted."""
+        self.dirty.add(key)
+    
+    def flush(self):
+        """Persist dirty keys. Returns the number of keys written."""
+        if not self.dirty:
+            return 0
+        dirty, self.dirty = self.dirty, set()
+        try:
+            self.backend.save(self.name, self.data, dirty)
+        except BaseException:
+            self.dirty |= dirty
+            raise
+        return len(dirty)
+    
+    async def flush_async(self):
+        """Like flush(), but the disk write runs in a worker thread.
+        
+        Dirty keys are encoded on the calling (event loop) thread first, so the
+        data can keep changing while the write is in progress.
+        """
+        if not self.dirty:
+            return 0
+        dirty, self.dirty = self.dirty, set()
+        try:
+            payload = self.backend.encode(self.data, dirty)
+            await asyncio.to_thread(self.backend.write, self.name, payload)
+        except BaseException:
+            self.dirty |= dirty
+            raise
+        return len(dirty)
+    
+    def __getitem__(self, key):
+        return self.data[key]
+    
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.dirty.add(key)
+    
+    def __delitem__(self, key):
+        del self.data[key]
+        self.dirty.add(key)
+    
+    def __contains__(self, key):
+        return key in self.data
+    
+    def __len__(self):
+        return len(self.data)
+    
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+    
+    def items(self):
+        return self.data.items()
+
+
+def open_store(name, backend=None, directory=DATA_DIR):
+    """Open a store with the configured backend (STORAGE_BACKEND=json|sqlite).
+    
+    The first time the SQLite backend opens a store, any existing JSON file of
+    the same name is imported into it.
+    """
+    if backend is None:
+        backend = SQLiteBackend() if STORAGE_BACKEND == 'sqlite' else JSONFileBackend(directory)
+    
+    store = Store(name, backend)
+    if isinstance(backend, SQLiteBackend) and not store.data:
+        # Shard processes start together and may all import the same file; the
+        # writes are idempotent upserts, so only the rename can race
+        legacy = JSONFileBackend(directory).path(name)
+        if legacy.exists():
+            store.data.update(read_json_file(legacy))
+            store.dirty.update(store.data)
+            store.flush()
+            try:
+                legacy.rename(legacy.with_suffix('.json.migrated'))
+            except FileNotFoundError:
+                pass  # Another process finished the import first
+        # Pick up rows another process imported after this store was loaded
+        store.data = backend.load(name)
+    return store
@@ -0,0 +1,181 @@
+"""
+OpenWeatherMap lookups with caching, shared by the weather commands.
+"""
+
+import asyncio
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from utils.cache import MISSING, LRUCache, SingleFlight, TTLCache
+
+WEATHER_TTL = 600  # OpenWeatherMap updates current conditions about every 10 minutes
+NOT_FOUND_TTL = 3600  # Unknown locations are remembered for longer
+WEATHER_CACHE_SIZE = 2048
+FORECAST_TTL = 1800  # 5 day / 3 hour forecasts change far less often than current conditions
+GEOCODE_TTL = 7 * 86400  # Coordinates for a place name are effectively static
+WEATHER_CONCURRENCY = 5  # Concurrent requests for multi-city lookups
+MAX_CITIES = 10
+
+
+def normalize_location(location):
+    """Normalize a location query so "New York , US" and "new york,us" share a cache entry."""
+    location = re.sub(r'\s+', ' ', location.strip().lower())
+    return re.sub(r'\s*,\s*', ',', location)
+
+
+class WeatherAPIError(Exception):
+    """Raised when OpenWeatherMap returns an unexpected non-200 response."""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+
+
+class WeatherService:
+    """OpenWeatherMap lookups with a TTL cache, negative caching and single-flight fetches."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.base_url = "http://api.openweathermap.org"
+        self.cache = TTLCache(WEATHER_TTL, maxsize=WEATHER_CACHE_SIZE)  # city id or location -> data, None if not found
+        self.city_ids = LRUCache(maxsize=WEATHER_CACHE_SIZE)  # normalized location -> city id
+        self.places = TTLCache(GEOCODE_TTL, maxsize=WEATHER_CACHE_SIZE)  # normalized location -> place, None if not found
+        self.forecasts = TTLCache(FORECAST_TTL, maxsize=256)  # (lat, lon) -> forecast data
+        self.flights = SingleFlight()
+        self.semaphore = asyncio.Semaphore(WEATHER_CONCURRENCY)
+        self.session = None
+
+    def get_session(self):
+        """Get the shared HTTP session, creating it on first use."""
+        import aiohttp  # Deferred so the caching logic imports without the HTTP stack
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        return self.session
+
+    async def close(self):
+        """Close the HTTP session."""
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def request(self, path, params):
+        """GET an OpenWeatherMap endpoint; returns None for 404."""
+        params = {**params, 'appid': self.api_key, 'units': 'metric'}
+        async with self.get_session().get(f"{self.base_url}{path}", params=params) as response:
+            if response.status == 200:
+                return await response.json()
+            if response.status == 404:
+                return None
+            try:
+                message = (await response.json(content_type=None)).get('message')
+            except (ValueError, AttributeError):
+                message = None
+            raise WeatherAPIError(response.status, message)
+
+    async def get_current(self, location):
+        """Get current weather for a location, or None if it does not exist."""
+        key = normalize_location(location)
+        city_id = self.city_ids.get(key)
+
+        cached = self.cache.get(city_id if city_id else key, MISSING)
+        if cached is not MISSING:
+            return cached
+
+        # Once a location has resolved, refresh it by id so spelling variants share one entry
+        params = {'id': city_id} if city_id else {'q': location}
+        return await self.flights.do(city_id or key, lambda: self.fetch_current(key, params))
+
+    async def fetch_current(self, key, params):
+        """Fetch current weather and populate the cache and location aliases."""
+        async with self.semaphore:
+            data = await self.request('/data/2.5/weather', params)
+        if data is None:
+            self.cache.set(key, None, ttl=NOT_FOUND_TTL)
+            return None
+
+        city_id = data.get('id')
+        if city_id:
+            self.city_ids.set(key, city_id)
+            self.city_ids.set(normalize_location(f"{data['name']},{data['sys'].get('country', '')}"), city_id)
+            self.cache.set(city_id, data)
+        else:
+            self.cache.set(key, data)
+        return data
+
+    async def get_many(self, locations):
+        """Get current weather for several locations concurrently.
+
+        Returns a list of (location, data or None, error or None) in input order.
+        """
+        results = await asyncio.gather(*(self.get_current(location) for location in locations), return_exceptions=True)
+        return [
+            (location, None, result) if isinstance(result, Exception) else (location, result, None)
+            for location, result in zip(locations, results)
+        ]
+
+    async def geocode(self, location):
+        """Resolve a location to a place dict with lat/lon, or None if it does not exist."""
+        key = normalize_location(location)
+        place = self.places.get(key, MISSING)
+        if place is not MISSING:
+            return place
+        return await self.flights.do(('geo', key), lambda: self.fetch_place(key, location))
+
+    async def fetch_place(self, key, location):
+        """Look up coordinates with the geocoding API and cache them."""
+        async with self.semaphore:
+            results = await self.request('/geo/1.0/direct', {'q': location, 'limit': 1})
+        place = None
+        if results:
+            result = results[0]
+            place = {
+                'name': result.get('name', location),
+                'country': result.get('country', ''),
+                'lat': round(result['lat'], 2),
+                'lon': round(result['lon'], 2)
+            }
+        self.places.set(key, place, ttl=None if place else NOT_FOUND_TTL)
+        return place
+
+    async def get_forecast(self, location):
+        """Get (place, forecast data) for a location, or (None, None) if it does not exist."""
+        place = await self.geocode(location)
+        if place is None:
+            return None, None
+
+        key = (place['lat'], place['lon'])
+        forecast = self.forecasts.get(key)
+        if forecast is None:
+            forecast = await self.flights.do(('forecast', key), lambda: self.fetch_forecast(key))
+        return place, forecast
+
+    async def fetch_forecast(self, key):
+        """Fetch the 5 day / 3 hour forecast for coordinates and cache it."""
+        lat, lon = key
+        async with self.semaphore:
+            forecast = await self.request('/data/2.5/forecast', {'lat': lat, 'lon': lon})
+        if forecast is not None:
+            self.forecasts.set(key, forecast)
+        return forecast
+
+
+def summarize_forecast(forecast, days=5):
+    """Collapse 3-hour forecast steps into per-day (date, low, high, description, icon) rows."""
+    offset = timedelta(seconds=forecast.get('city', {}).get('timezone', 0))
+    by_day = {}
+    for step in forecast.get('list', []):
+        day = (datetime.fromtimestamp(step['dt'], timezone.utc) + offset).date()
+        by_day.setdefault(day, []).append(step)
+
+    rows = []
+    for day, steps in sorted(by_day.items())[:days]:
+        conditions = Counter((s['weather'][0]['description'], s['weather'][0]['icon']) for s in steps)
+        (description, icon), _ = conditions.most_common(1)[0]
+        rows.append((
+            day,
+            min(s['main']['temp_min'] for s in steps),
+            max(s['main']['temp_max'] for s in steps),
+            description.title(),
+            icon
+        ))
+    return rows